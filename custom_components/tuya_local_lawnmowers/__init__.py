@@ -25,7 +25,10 @@ from .const import (
     DOMAIN,
 )
 from .device import async_delete_device, get_device_id, setup_device
+from .helpers.connection_profile import async_get_connection_profiles
 from .helpers.device_config import get_config
+from .helpers.startup import get_startup_queue
+from .helpers.state_snapshot import async_get_state_snapshots
 
 _LOGGER = logging.getLogger(__name__)
 NOT_FOUND = "Configuration file for %s not found"
@@ -640,14 +643,22 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
         get_device_id(entry.data),
     )
     config = {**entry.data, **entry.options, "name": entry.title}
+    await async_get_connection_profiles(hass)
+    await async_get_state_snapshots(hass)
+    device_id = get_device_id(entry.data)
     try:
-        device = await hass.async_add_executor_job(setup_device, hass, config)
-        await device.async_refresh()
+        # take turns with other entries, rather than all connecting at once
+        async with get_startup_queue(hass).turn(device_id, entry.title):
+            device = await hass.async_add_executor_job(setup_device, hass, config)
+            # with a saved state to show, the entities are set up straight
+            # away and the receive loop connects to the device in the background
+            if not device.stale:
+                await device.async_refresh()
 
     except Exception as e:
         raise ConfigEntryNotReady("tuya-local device not ready") from e
 
-    if not device.has_returned_state:
+    if not device.has_returned_state and not device.stale:
         raise ConfigEntryNotReady("tuya-local device offline")
 
     device_conf = await hass.async_add_executor_job(
@@ -695,6 +706,17 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     return True
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
+    device_id = get_device_id(entry.data)
+    _LOGGER.debug("Removing entry for device: %s", device_id)
+    # a device added again later starts without the old device's state,
+    # nor its protocol version, which may have changed since
+    snapshots = await async_get_state_snapshots(hass)
+    snapshots.remove(device_id)
+    profiles = await async_get_connection_profiles(hass)
+    profiles.remove(device_id)
+
+
 async def async_update_entry(hass: HomeAssistant, entry: ConfigEntry):
     _LOGGER.debug("Updating entry for device: %s", get_device_id(entry.data))
     await async_unload_entry(hass, entry)
@@ -31,16 +31,27 @@ from .const import (
     CONF_DEVICE_CID,
     CONF_DEVICE_ID,
     CONF_LOCAL_KEY,
+    CONF_MAX_POLL_INTERVAL,
+    CONF_MIN_POLL_INTERVAL,
+    CONF_NATIVE_TRANSPORT,
     CONF_POLL_ONLY,
     CONF_PROTOCOL_VERSION,
+    CONF_RENDER_WINDOW,
     CONF_TYPE,
     CONF_USER_CODE,
+    CONF_WRITE_FLUSH_WINDOW,
     DATA_STORE,
 )
 from .device import TuyaLocalDevice
 from .helpers.config import get_device_id
 from .helpers.device_config import get_config
 from .helpers.log import log_json
+from .helpers.poll_scheduler import (
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MIN_POLL_INTERVAL,
+)
+from .helpers.render_batch import DEFAULT_RENDER_WINDOW
+from .helpers.write_queue import DEFAULT_WRITE_FLUSH_WINDOW
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -525,6 +536,44 @@ class OptionsFlowHandler(OptionsFlow):
             vol.Required(
                 CONF_POLL_ONLY, default=config.get(CONF_POLL_ONLY, False)
             ): bool,
+            vol.Optional(
+                CONF_NATIVE_TRANSPORT,
+                description={
+                    "suggested_value": config.get(CONF_NATIVE_TRANSPORT, False)
+                },
+            ): bool,
+            vol.Optional(
+                CONF_MIN_POLL_INTERVAL,
+                description={
+                    "suggested_value": config.get(
+                        CONF_MIN_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL
+                    )
+                },
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=3600)),
+            vol.Optional(
+                CONF_MAX_POLL_INTERVAL,
+                description={
+                    "suggested_value": config.get(
+                        CONF_MAX_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL
+                    )
+                },
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=3600)),
+            vol.Optional(
+                CONF_WRITE_FLUSH_WINDOW,
+                description={
+                    "suggested_value": config.get(
+                        CONF_WRITE_FLUSH_WINDOW, DEFAULT_WRITE_FLUSH_WINDOW
+                    )
+                },
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=5000)),
+            vol.Optional(
+                CONF_RENDER_WINDOW,
+                description={
+                    "suggested_value": config.get(
+                        CONF_RENDER_WINDOW, DEFAULT_RENDER_WINDOW
+                    )
+                },
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=5000)),
         }
         cfg = await self.hass.async_add_executor_job(
             get_config,
@@ -552,6 +601,7 @@ def create_test_device(hass: HomeAssistant, config: dict):
         subdevice_id,
         hass,
         True,
+        config.get(CONF_NATIVE_TRANSPORT, False),
     )
 
     return device
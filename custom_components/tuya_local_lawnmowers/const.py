@@ -1,11 +1,19 @@
 DOMAIN = "tuya_local_lawnmowers"
 DATA_STORE = "store"
+DATA_CONNECTION_PROFILES = "connection_profiles"
+DATA_STATE_SNAPSHOTS = "state_snapshots"
+DATA_STARTUP_QUEUE = "startup_queue"
 
 CONF_DEVICE_ID = "device_id"
 CONF_LOCAL_KEY = "local_key"
 CONF_TYPE = "type"
 CONF_POLL_ONLY = "poll_only"
 CONF_DEVICE_CID = "device_cid"
+CONF_NATIVE_TRANSPORT = "native_transport"
+CONF_MIN_POLL_INTERVAL = "min_poll_interval"
+CONF_MAX_POLL_INTERVAL = "max_poll_interval"
+CONF_WRITE_FLUSH_WINDOW = "write_flush_window"
+CONF_RENDER_WINDOW = "render_window"
 CONF_PROTOCOL_VERSION = "protocol_version"
 API_PROTOCOL_VERSIONS = [3.3, 3.1, 3.2, 3.4, 3.5, 3.22]
 
@@ -3,9 +3,10 @@ API for Tuya Local Lawnmowers devices.
 """
 
 import asyncio
+import inspect
 import logging
 from asyncio.exceptions import CancelledError
-from threading import Lock
+from functools import partial
 from time import time
 
 import tinytuya
@@ -22,13 +23,43 @@ from .const import (
     CONF_DEVICE_CID,
     CONF_DEVICE_ID,
     CONF_LOCAL_KEY,
+    CONF_MAX_POLL_INTERVAL,
+    CONF_MIN_POLL_INTERVAL,
+    CONF_NATIVE_TRANSPORT,
     CONF_POLL_ONLY,
     CONF_PROTOCOL_VERSION,
+    CONF_RENDER_WINDOW,
+    CONF_WRITE_FLUSH_WINDOW,
+    DATA_CONNECTION_PROFILES,
+    DATA_STARTUP_QUEUE,
+    DATA_STATE_SNAPSHOTS,
     DOMAIN,
 )
+from .gateway import TuyaGatewayTransport
 from .helpers.config import get_device_id
-from .helpers.device_config import possible_matches
+from .helpers.device_config import possible_matches, scored_matches
 from .helpers.log import log_json
+from .helpers.poll_scheduler import (
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MIN_POLL_INTERVAL,
+    PollScheduler,
+)
+from .helpers.reconnect import (
+    BASE_RETRY_DELAY,
+    REACHABILITY_INTERVAL,
+    ReconnectSupervisor,
+    async_reachable,
+)
+from .helpers.render_batch import DEFAULT_RENDER_WINDOW, RenderBatch
+from .helpers.state_store import DecodeCache, VersionedDict
+from .helpers.write_queue import DEFAULT_WRITE_FLUSH_WINDOW, PendingUpdates
+from .io_worker import TuyaIOWorker
+from .probe import async_probe_protocol
+from .transport import (
+    HEARTBEAT_INTERVAL,
+    TuyaAsyncTransport,
+    supports_native_transport,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -49,6 +80,11 @@ class TuyaLocalDevice(object):
         dev_cid,
         hass: HomeAssistant,
         poll_only=False,
+        native_transport=False,
+        min_poll_interval=DEFAULT_MIN_POLL_INTERVAL,
+        max_poll_interval=DEFAULT_MAX_POLL_INTERVAL,
+        write_flush_window=DEFAULT_WRITE_FLUSH_WINDOW,
+        render_window=DEFAULT_RENDER_WINDOW,
     ):
         """
         Represents a Tuya-based device.
@@ -62,9 +98,30 @@ class TuyaLocalDevice(object):
             dev_cid (str): The sub device id.
             hass (HomeAssistant): The Home Assistant instance.
             poll_only (bool): True if the device should be polled only
+            native_transport (bool): True to talk to the device from the
+                event loop instead of through tinytuya's blocking socket.
+                Sub devices always share their gateway's connection this way.
+            min_poll_interval (number): Shortest time between polls, used
+                while the mower is active.
+            max_poll_interval (number): Longest time between polls, used
+                while the mower is resting.
+            write_flush_window (number): Milliseconds to collect writes from
+                all entities before sending them together.
+            render_window (number): Milliseconds to collect entities whose
+                state needs writing before writing them together.
         """
         self._name = name
         self._children = []
+        # entities by the dp ids they use, and the dps cleared when missing
+        # from a full poll
+        self._subscribers = {}
+        self._nonpersistent_dps = set()
+        # values sent at once, ahead of routine writes, by dp id
+        self._urgent_values = {}
+        # dps left out of the saved state
+        self._sensitive_dps = set()
+        self._transport = None
+        self._activity_dp = None
         self._force_dps = []
         self._product_ids = []
         self._running = False
@@ -73,6 +130,10 @@ class TuyaLocalDevice(object):
         self._api_protocol_version_index = None
         self._api_protocol_working = False
         self._api_working_protocol_failures = 0
+        # what worked last time, loaded before the device is set up
+        self._profiles = hass.data[DOMAIN].get(DATA_CONNECTION_PROFILES)
+        self._snapshots = hass.data[DOMAIN].get(DATA_STATE_SNAPSHOTS)
+        self._startup = hass.data[DOMAIN].get(DATA_STARTUP_QUEUE)
         self.dev_cid = dev_cid
         try:
             if dev_cid:
@@ -87,6 +148,16 @@ class TuyaLocalDevice(object):
                     cid=dev_cid,
                     parent=parent,
                 )
+                # Sub devices share one connection to their gateway, with a
+                # single reader routing updates to each of them, rather than
+                # taking turns reading from the parent's socket.
+                gateway_data = hass.data[DOMAIN][dev_id] if name != "Test" else {}
+                if not gateway_data.get("gateway") and supports_native_transport(
+                    parent
+                ):
+                    gateway_data["gateway"] = TuyaGatewayTransport(parent)
+                if gateway_data.get("gateway"):
+                    self._transport = gateway_data["gateway"].sub_device(self._api)
             else:
                 if hass.data[DOMAIN].get(dev_id) and name != "Test":
                     self._api = hass.data[DOMAIN][dev_id]["tuyadevice"]
@@ -109,11 +180,35 @@ class TuyaLocalDevice(object):
             # Retries cause problems for other children of the parent device
             self._api.parent.set_socketRetryLimit(1)
 
+        if native_transport and not dev_cid and supports_native_transport(self._api):
+            self._transport = TuyaAsyncTransport(self._api)
+        # everything done through tinytuya's socket goes through here
+        self._io = TuyaIOWorker(hass, self._api)
+
+        self._scheduler = PollScheduler(min_poll_interval, max_poll_interval)
+        self._supervisor = ReconnectSupervisor()
+        self._last_poll = 0
+        self._last_full_poll = 0
+        self._last_heartbeat = 0
+        self._flush_window = write_flush_window / 1000
+        self._flush = None
+        # entity states to write, once each however many frames change them
+        self._renders = RenderBatch(hass, render_window)
         self._refresh_task = None
         self._protocol_configured = protocol_version
         self._poll_only = poll_only
         self._temporary_poll = False
+        # the cached state with pending values over it, and the state
+        # version it was built from
+        self._view = {}
+        self._view_version = None
+        # dp values and the like decoded from the state, by state version
+        self.decode_cache = DecodeCache()
         self._reset_cached_state()
+        # show the state saved before a restart until the device answers
+        snapshot = self._snapshots.get(self.unique_id) if self._snapshots else None
+        if snapshot:
+            self._restore_state(snapshot)
 
         self._hass = hass
 
@@ -123,9 +218,7 @@ class TuyaLocalDevice(object):
         # you will be returned the old state.
         # The solution is to keep a temporary list of changed properties that
         # we can overlay onto the state while we wait for the board to update
-        # its switches.
-        self._FAKE_IT_TIMEOUT = 5
-        self._CACHE_TIMEOUT = 30
+        # its switches, which is what _pending_updates is for.
         # More attempts are needed in auto mode so we can cycle through all
         # the possibilities a couple of times
         self._AUTO_CONNECTION_ATTEMPTS = len(API_PROTOCOL_VERSIONS) * 2 + 1
@@ -133,7 +226,6 @@ class TuyaLocalDevice(object):
         # The number of failures from a working protocol before
         # retrying other protocols.
         self._AUTO_FAILURE_RESET_COUNT = 10
-        self._lock = Lock()
 
     @property
     def name(self):
@@ -153,12 +245,28 @@ class TuyaLocalDevice(object):
             "manufacturer": "Tuya",
         }
 
+    @property
+    def available(self):
+        """Return True if the device is answering, or about to be."""
+        return (self.has_returned_state or self._stale) and (
+            not self._supervisor.is_open
+        )
+
     @property
     def has_returned_state(self):
         """Return True if the device has returned some state."""
-        cached = self._get_cached_state()
+        if self._stale:
+            return False
+        # checked on every pass of the receive loop, so avoid copying the
+        # cached state as _get_cached_state does
+        cached = self._state
         return len(cached) > 1 or cached.get("updated_at", 0) > 0
 
+    @property
+    def stale(self):
+        """Return True while the state is the one saved before a restart."""
+        return self._stale
+
     @callback
     def actually_start(self, event=None):
         _LOGGER.debug("Starting monitor loop for %s", self.name)
@@ -167,7 +275,10 @@ class TuyaLocalDevice(object):
             EVENT_HOMEASSISTANT_STOP, self.async_stop
         )
         if not self._refresh_task:
-            self._refresh_task = self._hass.async_create_task(self.receive_loop())
+            # started along with all the other devices as Home Assistant
+            # finishes starting, so spread out their first connections
+            delay = self._startup.start_delay() if event and self._startup else 0
+            self._refresh_task = self._hass.async_create_task(self.receive_loop(delay))
 
     def start(self):
         if self._hass.is_stopping:
@@ -185,13 +296,16 @@ class TuyaLocalDevice(object):
     async def async_stop(self, event=None):
         _LOGGER.debug("Stopping monitor loop for %s", self.name)
         self._running = False
+        self._renders.cancel()
         self._children.clear()
+        self._subscribers.clear()
+        self._nonpersistent_dps.clear()
+        self._urgent_values.clear()
         self._force_dps.clear()
         if self._refresh_task:
-            self._api.set_socketPersistent(False)
-            if self._api.parent:
-                self._api.parent.set_socketPersistent(False)
+            self._set_persistent(False)
             await self._refresh_task
+        self._io.close()
         _LOGGER.debug("Monitor loop for %s stopped", self.name)
         self._refresh_task = None
 
@@ -202,28 +316,55 @@ class TuyaLocalDevice(object):
         should_poll = len(self._children) == 0 and not self._hass.is_running
 
         self._children.append(entity)
+        if entity._config.entity == "lawn_mower" and not self._activity_dp:
+            # the mower's activity decides how often it needs polling
+            self._activity_dp = entity._config.find_dps("activity")
+        self._subscribe(entity)
         for dp in entity._config.dps():
             if dp.force and dp.id not in self._force_dps:
                 self._force_dps.append(int(dp.id))
 
         if not self._running and not self._startup_listener:
             self.start()
-        if self.has_returned_state:
+        if self.has_returned_state or self._stale:
             entity.async_schedule_update_ha_state()
         elif should_poll:
             entity.async_schedule_update_ha_state(True)
 
+    def schedule_state_write(self, entities):
+        """Write the state of the entities with the next batch."""
+        self._renders.mark(entities)
+
+    def _subscribe(self, entity):
+        for dp in entity._config.dps():
+            subscribers = self._subscribers.setdefault(dp.id, [])
+            if entity not in subscribers:
+                subscribers.append(entity)
+            if not dp.persist:
+                self._nonpersistent_dps.add(dp.id)
+            if dp.urgent_values:
+                self._urgent_values.setdefault(dp.id, set()).update(dp.urgent_values)
+            if dp.sensitive:
+                self._sensitive_dps.add(dp.id)
+
     async def async_unregister_entity(self, entity):
         self._children.remove(entity)
+        self._renders.forget(entity)
+        for subscribers in self._subscribers.values():
+            if entity in subscribers:
+                subscribers.remove(entity)
         if not self._children:
             try:
                 await self.async_stop()
             except CancelledError:
                 pass
 
-    async def receive_loop(self):
+    async def receive_loop(self, delay=0):
         """Coroutine wrapper for async_receive generator."""
         try:
+            if delay:
+                _LOGGER.debug("%s receive loop starts in %.2fs", self.name, delay)
+                await asyncio.sleep(delay)
             async for poll in self.async_receive():
                 if isinstance(poll, dict):
                     _LOGGER.debug(
@@ -232,19 +373,7 @@ class TuyaLocalDevice(object):
                         log_json(poll),
                     )
                     full_poll = poll.pop("full_poll", False)
-                    self._cached_state = self._cached_state | poll
-                    self._cached_state["updated_at"] = time()
-                    self._remove_properties_from_pending_updates(poll)
-
-                    for entity in self._children:
-                        # let entities trigger off poll contents directly
-                        entity.on_receive(poll, full_poll)
-                        # clear non-persistant dps that were not in a full poll
-                        if full_poll:
-                            for dp in entity._config.dps():
-                                if not dp.persist and dp.id not in poll:
-                                    self._cached_state.pop(dp.id, None)
-                        entity.schedule_update_ha_state()
+                    self._handle_frame(poll, full_poll)
                 else:
                     _LOGGER.debug(
                         "%s received non data %s",
@@ -257,9 +386,44 @@ class TuyaLocalDevice(object):
             _LOGGER.exception(
                 "%s receive loop terminated by exception %s", self.name, t
             )
-            self._api.set_socketPersistent(False)
-            if self._api.parent:
-                self._api.parent.set_socketPersistent(False)
+            self._set_persistent(False)
+
+    def _handle_frame(self, poll, full_poll):
+        """Merge received dps into the state, and tell entities using them."""
+        had_state = self.has_returned_state
+        cached = self._cached_state
+        changed = {k for k, v in poll.items() if cached.get(k) != v}
+        self._scheduler.record_changes(len(changed))
+        self._cached_state = cached | poll
+        cached = self._cached_state
+        cached["updated_at"] = time()
+        self._stale = False
+        self._remove_properties_from_pending_updates(poll)
+        if full_poll:
+            # clear non-persistant dps that were not in a full poll
+            for dp_id in self._nonpersistent_dps.difference(poll):
+                if dp_id in cached:
+                    del cached[dp_id]
+                    changed.add(dp_id)
+        if self._activity_dp:
+            self._scheduler.set_activity(self._activity_dp.get_value(self))
+        self._record_snapshot()
+
+        # let entities trigger off poll contents directly, even when the
+        # values are repeats
+        received = {}
+        for dp_id in poll:
+            for entity in self._subscribers.get(dp_id, ()):
+                received[entity] = True
+        for entity in received:
+            entity.on_receive(poll, full_poll)
+
+        if not had_state:
+            # everything has become available
+            self._renders.mark(self._children)
+        else:
+            for dp_id in changed:
+                self._renders.mark(self._subscribers.get(dp_id, ()))
 
     @property
     def should_poll(self):
@@ -267,25 +431,44 @@ class TuyaLocalDevice(object):
 
     def pause(self):
         self._temporary_poll = True
-        self._api.set_socketPersistent(False)
-        if self._api.parent:
-            self._api.parent.set_socketPersistent(False)
+        self._set_persistent(False)
 
     def resume(self):
         self._temporary_poll = False
 
+    def _set_persistent(self, persist):
+        """
+        Keep the connection open between requests, or close it.
+
+        Returns a future to await the change by, or None if it is done.
+        """
+        if self._transport:
+            if not persist:
+                self._transport.close()
+            return None
+        # closing the socket under a receive would fail it, so wait for a turn
+        return self._io.submit(self._set_api_persistent, persist)
+
+    async def _async_set_persistent(self, persist):
+        future = self._set_persistent(persist)
+        if future:
+            await future
+
+    def _set_api_persistent(self, persist):
+        self._api.set_socketPersistent(persist)
+        if self._api.parent:
+            self._api.parent.set_socketPersistent(persist)
+
     async def async_receive(self):
         """Receive messages from a persistent connection asynchronously."""
         # If we didn't yet get any state from the device, we may need to
         # negotiate the protocol before making the connection persistent
         persist = not self.should_poll
-        # flag to alternate updatedps and status calls to ensure we get
-        # all dps updated
-        dps_updated = False
 
-        self._api.set_socketPersistent(persist)
-        if self._api.parent:
-            self._api.parent.set_socketPersistent(persist)
+        await self._async_set_persistent(persist)
+        # devices that have not answered yet, such as those showing a state
+        # saved before a restart, connect in turn with others starting up
+        starting = self._startup is not None and not self.has_returned_state
 
         while self._running:
             error_count = self._api_working_protocol_failures
@@ -302,42 +485,77 @@ class TuyaLocalDevice(object):
                     _LOGGER.debug(
                         "%s persistant connection set to %s", self.name, persist
                     )
-                    self._api.set_socketPersistent(persist)
-                    if self._api.parent:
-                        self._api.parent.set_socketPersistent(persist)
-
-                if now - last_cache > self._CACHE_TIMEOUT:
+                    await self._async_set_persistent(persist)
+
+                # updatedps replies arrive later as updates, so count from
+                # the request to avoid repeating it while waiting
+                last_poll = max(last_cache, self._last_poll)
+                poll_due = self._scheduler.poll_interval(now) - (now - last_poll)
+                if poll_due < 0:
+                    self._last_poll = now
+                    # updatedps is cheaper for the device, but only covers
+                    # the forced dps, so a full poll is still needed to get
+                    # all dps updated
                     if (
                         self._force_dps
-                        and not dps_updated
                         and self._api_protocol_working
+                        and now - self._last_full_poll
+                        < self._scheduler.full_poll_interval(now)
                     ):
                         poll = await self._retry_on_failed_connection(
-                            lambda: self._api.updatedps(self._force_dps),
+                            (
+                                partial(
+                                    self._transport.async_updatedps,
+                                    self._force_dps,
+                                )
+                                if self._transport
+                                else partial(self._api.updatedps, self._force_dps)
+                            ),
                             f"Failed to update device dps for {self.name}",
                         )
-                        dps_updated = True
                     else:
-                        poll = await self._retry_on_failed_connection(
-                            lambda: self._api.status(),
+                        fetch = partial(
+                            self._retry_on_failed_connection,
+                            (
+                                self._transport.async_status
+                                if self._transport
+                                else self._api.status
+                            ),
                             f"Failed to fetch device status for {self.name}",
                         )
-                        dps_updated = False
+                        if starting:
+                            starting = False
+                            async with self._startup.turn(self.unique_id, self.name):
+                                poll = await fetch()
+                        else:
+                            poll = await fetch()
+                        self._last_full_poll = now
                         full_poll = True
-                elif persist:
-                    await self._hass.async_add_executor_job(
-                        self._api.heartbeat,
-                        True,
-                    )
-                    poll = await self._hass.async_add_executor_job(
-                        self._api.receive,
+                    if self._transport and not persist:
+                        self._transport.close()
+                elif persist and self._transport:
+                    # wakes as soon as the device pushes an update, or when
+                    # a heartbeat or the next poll is due
+                    poll = await self._transport.async_receive(
+                        min(poll_due, HEARTBEAT_INTERVAL)
                     )
+                elif persist:
+                    if now - self._last_heartbeat >= HEARTBEAT_INTERVAL:
+                        await self._io.async_call(self._api.heartbeat, True)
+                        self._last_heartbeat = now
+                    # waits until the device reports, the socket times out
+                    # or a command needs the socket
+                    poll = await self._io.async_receive()
                 else:
-                    await asyncio.sleep(5)
+                    # wait until the next poll is due, but check back
+                    # regularly in case the schedule changes
+                    await asyncio.sleep(min(poll_due, self._scheduler.min_interval))
                     poll = None
 
+                failed = False
                 if poll:
                     if "Error" in poll:
+                        failed = True
                         # increment the error count if not done already
                         if error_count == self._api_working_protocol_failures:
                             self._api_working_protocol_failures += 1
@@ -359,16 +577,24 @@ class TuyaLocalDevice(object):
                         if "dps" in poll:
                             poll = poll["dps"]
                         poll["full_poll"] = full_poll
+                        self._record_connection_success()
                         yield poll
 
-                await asyncio.sleep(0.1 if self.has_returned_state else 5)
+                if failed:
+                    # a refused or dropped connection is reported straight
+                    # back, so count it as a failed attempt and back off
+                    # rather than reading again at once
+                    self._record_connection_failure()
+                    await self._async_wait_for_retry()
+                elif not self.has_returned_state:
+                    # give the device time before the next attempt, which
+                    # may be with a different protocol version
+                    await self._async_wait_for_retry()
 
             except CancelledError:
                 self._running = False
                 # Close the persistent connection when exiting the loop
-                self._api.set_socketPersistent(False)
-                if self._api.parent:
-                    self._api.parent.set_socketPersistent(False)
+                self._set_persistent(False)
                 raise
             except Exception as t:
                 _LOGGER.exception(
@@ -377,20 +603,27 @@ class TuyaLocalDevice(object):
                     type(t).__name__,
                     t,
                 )
-                self._api.set_socketPersistent(False)
-                if self._api.parent:
-                    self._api.parent.set_socketPersistent(False)
-                await asyncio.sleep(5)
+                await self._async_set_persistent(False)
+                self._record_connection_failure()
+                await self._async_wait_for_retry()
 
         # Close the persistent connection when exiting the loop
-        self._api.set_socketPersistent(False)
-        if self._api.parent:
-            self._api.parent.set_socketPersistent(False)
+        await self._async_set_persistent(False)
 
     def set_detected_product_id(self, product_id):
         self._product_ids.append(product_id)
 
     async def async_possible_types(self):
+        cached_state = await self._async_detection_state()
+        return await self._hass.async_add_executor_job(
+            _collect_possible_matches,
+            cached_state,
+            self._product_ids,
+        )
+
+    async def _async_detection_state(self):
+        """Return the state to detect the device type from, polling for it
+        if none has been received yet."""
         cached_state = self._get_cached_state()
         if len(cached_state) <= 1:
             # in case of device22 devices, we need to poll them with a dp
@@ -413,20 +646,18 @@ class TuyaLocalDevice(object):
             )
             await self.async_refresh()
             cached_state = self._get_cached_state()
-
-        return await self._hass.async_add_executor_job(
-            _collect_possible_matches,
-            cached_state,
-            self._product_ids,
-        )
+        return cached_state
 
     async def async_inferred_type(self):
         best_match = None
         best_quality = 0
-        cached_state = self._get_cached_state()
-        possible = await self.async_possible_types()
-        for config in possible:
-            quality = config.match_quality(cached_state, self._product_ids)
+        cached_state = await self._async_detection_state()
+        scored = await self._hass.async_add_executor_job(
+            scored_matches,
+            cached_state,
+            self._product_ids,
+        )
+        for config, quality in scored:
             _LOGGER.info(
                 "%s considering %s with quality %s",
                 self.name,
@@ -450,13 +681,20 @@ class TuyaLocalDevice(object):
         _LOGGER.debug("Refreshing device state for %s", self.name)
         if not self._running:
             await self._retry_on_failed_connection(
-                lambda: self._refresh_cached_state(),
+                self._async_refresh_cached_state,
                 f"Failed to refresh device state for {self.name}.",
             )
 
     def get_property(self, dps_id):
-        cached_state = self._get_cached_state()
-        return cached_state.get(dps_id)
+        return self._state_view().get(dps_id)
+
+    @property
+    def state_version(self):
+        """A number that increases whenever the device state changes."""
+        return max(
+            self._cached_state.version,
+            self._pending_updates.expire().version,
+        )
 
     async def async_set_property(self, dps_id, value):
         await self.async_set_properties({dps_id: value})
@@ -472,28 +710,79 @@ class TuyaLocalDevice(object):
         """
         self._cached_state[dps_id] = value
 
+    @property
+    def _cached_state(self):
+        return self._state
+
+    @_cached_state.setter
+    def _cached_state(self, state):
+        self._state = (
+            state if isinstance(state, VersionedDict) else VersionedDict(state)
+        )
+
+    @property
+    def _pending_updates(self):
+        return self._pending
+
+    @_pending_updates.setter
+    def _pending_updates(self, updates):
+        self._pending = (
+            updates if isinstance(updates, PendingUpdates) else PendingUpdates(updates)
+        )
+
     def _reset_cached_state(self):
         self._cached_state = {"updated_at": 0}
-        self._pending_updates = {}
+        self._pending_updates = PendingUpdates()
         self._last_connection = 0
+        self._stale = False
+
+    def _restore_state(self, snapshot):
+        """Show a saved state until the device reports its own."""
+        # an old updated_at makes the first poll due at once
+        self._cached_state = snapshot["dps"] | {"updated_at": 0}
+        self._stale = True
+        _LOGGER.debug(
+            "%s restored state saved at %s",
+            self.name,
+            snapshot.get("saved_at"),
+        )
+
+    def _record_snapshot(self):
+        if self._snapshots:
+            self._snapshots.record(
+                self.unique_id,
+                self._cached_state,
+                self._sensitive_dps | self._nonpersistent_dps,
+            )
+
+    async def _async_refresh_cached_state(self):
+        if not self._transport:
+            new_state = await self._io.async_call(self._api.status)
+            return self._handle_refreshed_state(new_state)
+        try:
+            new_state = await self._transport.async_status()
+        finally:
+            # like tinytuya's non-persistent mode, do not hold the connection
+            # open until the receive loop takes over
+            self._transport.close()
+        return self._handle_refreshed_state(new_state)
 
-    def _refresh_cached_state(self):
-        new_state = self._api.status()
+    def _handle_refreshed_state(self, new_state):
         if new_state and "Err" not in new_state:
             self._cached_state = self._cached_state | new_state.get("dps", {})
             self._cached_state["updated_at"] = time()
-            for entity in self._children:
-                for dp in entity._config.dps():
-                    # Clear non-persistant dps that were not in the poll
-                    if not dp.persist and dp.id not in new_state.get("dps", {}):
-                        self._cached_state.pop(dp.id, None)
-                entity.schedule_update_ha_state()
+            # Clear non-persistant dps that were not in the poll
+            for dp_id in self._nonpersistent_dps.difference(new_state.get("dps", {})):
+                self._cached_state.pop(dp_id, None)
+            self._stale = False
+            self._record_snapshot()
+            self._renders.mark(self._children)
         _LOGGER.debug(
             "%s refreshed device state: %s",
             self.name,
             log_json(new_state),
         )
-        if "Err" in new_state:
+        if new_state and "Err" in new_state:
             if self._api_working_protocol_failures == 1:
                 _LOGGER.warning(
                     "%s protocol error %s: %s",
@@ -514,53 +803,68 @@ class TuyaLocalDevice(object):
         )
         return new_state
 
-    async def async_set_properties(self, properties):
+    async def async_set_properties(self, properties, urgent=False):
+        """
+        Set the values of dps on the device.
+
+        Args:
+            properties (dict): The new values, by dp id.
+            urgent (bool): True to send at once, ahead of routine writes
+                waiting to be merged.  Values marked urgent in the config,
+                such as pausing the mower, always are.
+        """
         if len(properties) == 0:
             return
 
         self._add_properties_to_pending_updates(properties)
-        await self._debounce_sending_updates()
+        if urgent or any(
+            str(v) in self._urgent_values.get(str(k), ()) for k, v in properties.items()
+        ):
+            await self._send_pending_updates(properties)
+        else:
+            await self._debounce_sending_updates()
 
     def _add_properties_to_pending_updates(self, properties):
-        now = time()
-
-        pending_updates = self._get_pending_updates()
-        for key, value in properties.items():
-            pending_updates[key] = {
-                "value": value,
-                "updated_at": now,
-                "sent": False,
-            }
+        self._pending_updates.add(properties)
 
         _LOGGER.debug(
             "%s new pending updates: %s",
             self.name,
-            log_json(pending_updates),
+            log_json(self._pending_updates),
         )
 
     def _remove_properties_from_pending_updates(self, data):
-        self._pending_updates = {
-            key: value
-            for key, value in self._pending_updates.items()
-            if key not in data or not value["sent"] or data[key] != value["value"]
-        }
+        self._pending_updates.confirm(data)
 
     async def _debounce_sending_updates(self):
-        now = time()
-        since = now - self._last_connection
-        # set this now to avoid a race condition, it will be updated later
-        # when the data is actally sent
-        self._last_connection = now
-        # Only delay a second if there was recently another command.
-        # Otherwise delay 1ms, to keep things simple by reusing the
-        # same send mechanism.
-        waittime = 1 if since < 1.1 and self.should_poll else 0.001
-
+        # Writes from all entities arriving before the flush share a single
+        # message, and their callers all wait for it to be sent
+        if self._flush is None or self._flush.done():
+            self._flush = asyncio.ensure_future(self._async_flush_after_window())
+        await asyncio.shield(self._flush)
+
+    async def _async_flush_after_window(self):
+        since = time() - self._last_connection
+        # Devices that are polled need more time between commands
+        waittime = (
+            max(self._flush_window, 1)
+            if since < 1.1 and self.should_poll
+            else self._flush_window
+        )
         await asyncio.sleep(waittime)
+        # writes from now on start a new flush
+        self._flush = None
         await self._send_pending_updates()
 
-    async def _send_pending_updates(self):
+    async def _send_pending_updates(self, properties=None):
+        """Send the given pending properties, or all unsent ones."""
         pending_properties = self._get_unsent_properties()
+        if properties is not None:
+            pending_properties = {
+                k: v for k, v in pending_properties.items() if k in properties
+            }
+        if not pending_properties:
+            return
 
         _LOGGER.debug(
             "%s sending dps update: %s",
@@ -569,30 +873,70 @@ class TuyaLocalDevice(object):
         )
 
         await self._retry_on_failed_connection(
-            lambda: self._set_values(pending_properties),
+            partial(self._async_set_values, pending_properties),
             "Failed to update device state.",
         )
 
-    def _set_values(self, properties):
-        try:
-            self._lock.acquire()
-            self._api.set_multiple_values(properties, nowait=True)
-            self._cached_state["updated_at"] = 0
-            now = time()
-            self._last_connection = now
-            pending_updates = self._get_pending_updates()
-            for key in properties.keys():
-                pending_updates[key]["updated_at"] = now
-                pending_updates[key]["sent"] = True
-        finally:
-            self._lock.release()
+    async def _async_set_values(self, properties):
+        # marked before waiting for the connection, so that a flush in the
+        # meantime does not send them again
+        self._mark_properties_sent(properties)
+        if self._transport:
+            await self._transport.async_set_values(properties)
+        else:
+            await self._io.async_call(
+                partial(self._api.set_multiple_values, properties, nowait=True)
+            )
+
+    def _mark_properties_sent(self, properties):
+        self._cached_state["updated_at"] = 0
+        now = time()
+        self._last_connection = now
+        self._pending_updates.mark_sent(properties, now)
+
+    async def _async_wait_for_retry(self):
+        """Wait until the next connection attempt is due."""
+        if not self._supervisor.is_open:
+            await asyncio.sleep(self._supervisor.retry_delay() or BASE_RETRY_DELAY)
+            return
+        # While the device is offline, check cheaply whether it is back
+        # rather than going through a full connection attempt
+        api = self._api.parent or self._api
+        while self._running and not self._supervisor.allow_attempt():
+            await asyncio.sleep(
+                min(self._supervisor.retry_delay(), REACHABILITY_INTERVAL)
+            )
+            if await async_reachable(api.address, api.port):
+                _LOGGER.debug("%s is reachable again", self.name)
+                self._supervisor.reachable()
+
+    def _record_connection_failure(self):
+        if self._supervisor.record_failure():
+            _LOGGER.warning(
+                "%s is not responding, retrying in %ds",
+                self.name,
+                self._supervisor.retry_delay(),
+            )
+            self._renders.mark(self._children)
+
+    def _record_connection_success(self):
+        if self._supervisor.record_success():
+            _LOGGER.info("%s is responding again", self.name)
+            self._renders.mark(self._children)
 
     async def _retry_on_failed_connection(self, func, error_message):
+        if not self._supervisor.allow_attempt():
+            _LOGGER.debug("%s is offline, not trying to connect", self.name)
+            return None
         if self._api_protocol_version_index is None:
             await self._rotate_api_protocol_version()
         auto = (self._protocol_configured == "auto") and (
             not self._api_protocol_working
         )
+        # Sub devices are left to rotate, as probing would open extra
+        # connections to a gateway that its other sub devices are using
+        if auto and not self.dev_cid and await self._probe_api_protocol_version():
+            auto = False
         connections = (
             self._AUTO_CONNECTION_ATTEMPTS
             if auto
@@ -602,11 +946,25 @@ class TuyaLocalDevice(object):
         for i in range(connections):
             try:
                 if not self._hass.is_stopping:
-                    retval = await self._hass.async_add_executor_job(func)
+                    if inspect.iscoroutinefunction(func):
+                        retval = await func()
+                    else:
+                        retval = await self._io.async_call(func)
                     if isinstance(retval, dict) and "Error" in retval:
                         raise AttributeError(retval["Error"])
                     self._api_protocol_working = True
                     self._api_working_protocol_failures = 0
+                    self._scheduler.record_success()
+                    self._record_connection_success()
+                    if self._profiles:
+                        version = API_PROTOCOL_VERSIONS[
+                            self._api_protocol_version_index
+                        ]
+                        self._profiles.record_success(
+                            self.unique_id,
+                            version,
+                            version == 3.22 and self._api.dev_type == "device22",
+                        )
                     return retval
             except Exception as e:
                 _LOGGER.debug(
@@ -619,14 +977,19 @@ class TuyaLocalDevice(object):
 
                 if i + 1 == connections:
                     self._reset_cached_state()
+                    self._scheduler.record_failure()
+                    self._record_connection_failure()
+                    if self._profiles:
+                        self._profiles.record_failure(self.unique_id)
                     self._api_working_protocol_failures += 1
                     if (
                         self._api_working_protocol_failures
                         > self._AUTO_FAILURE_RESET_COUNT
                     ):
                         self._api_protocol_working = False
-                        for entity in self._children:
-                            entity.async_schedule_update_ha_state()
+                        # start again from the version in the profile
+                        self._api_protocol_version_index = None
+                        self._renders.mark(self._children)
                     if self._api_working_protocol_failures == 1:
                         _LOGGER.error(error_message)
                     else:
@@ -635,43 +998,32 @@ class TuyaLocalDevice(object):
                 if not self._api_protocol_working:
                     await self._rotate_api_protocol_version()
 
+    def _state_view(self):
+        """Return the state with pending values, rebuilt only after changes."""
+        version = self.state_version
+        if version != self._view_version:
+            self._view = {**self._cached_state, **self._get_pending_properties()}
+            self._view_version = version
+        return self._view
+
     def _get_cached_state(self):
-        cached_state = self._cached_state.copy()
-        return {**cached_state, **self._get_pending_properties()}
+        # a copy, as callers may keep it or change it
+        return self._state_view().copy()
 
     def _get_pending_properties(self):
-        return {
-            key: property["value"]
-            for key, property in self._get_pending_updates().items()
-        }
+        return self._pending_updates.pending_values()
 
     def _get_unsent_properties(self):
-        return {
-            key: info["value"]
-            for key, info in self._get_pending_updates().items()
-            if not info["sent"]
-        }
-
-    def _get_pending_updates(self):
-        now = time()
-        # sort pending updates according to their API identifier
-        pending_updates_sorted = sorted(
-            self._pending_updates.items(), key=lambda x: int(x[0])
-        )
-        self._pending_updates = {
-            key: value
-            for key, value in pending_updates_sorted
-            if not value["sent"]
-            or now - value.get("updated_at", 0) < self._FAKE_IT_TIMEOUT
-        }
-        return self._pending_updates
+        return self._pending_updates.unsent()
 
     async def _rotate_api_protocol_version(self):
         if self._api_protocol_version_index is None:
+            version = self._protocol_configured
+            if version == "auto" and self._profiles:
+                # start with the version that worked last time
+                version = self._profiles.preferred_version(self.unique_id)
             try:
-                self._api_protocol_version_index = API_PROTOCOL_VERSIONS.index(
-                    self._protocol_configured
-                )
+                self._api_protocol_version_index = API_PROTOCOL_VERSIONS.index(version)
             except ValueError:
                 self._api_protocol_version_index = 0
 
@@ -682,7 +1034,27 @@ class TuyaLocalDevice(object):
         if self._api_protocol_version_index >= len(API_PROTOCOL_VERSIONS):
             self._api_protocol_version_index = 0
 
-        new_version = API_PROTOCOL_VERSIONS[self._api_protocol_version_index]
+        await self._set_api_protocol_version(
+            API_PROTOCOL_VERSIONS[self._api_protocol_version_index]
+        )
+
+    async def _probe_api_protocol_version(self):
+        """Try all protocol versions at once, returning True if one worked."""
+        index = self._api_protocol_version_index
+        # the current version, which may come from the profile, goes first
+        versions = API_PROTOCOL_VERSIONS[index:] + API_PROTOCOL_VERSIONS[:index]
+        version = await async_probe_protocol(self._hass, self._api, versions)
+        if version is None:
+            _LOGGER.debug("No protocol version found by probing %s", self.name)
+            return False
+        self._api_protocol_version_index = API_PROTOCOL_VERSIONS.index(version)
+        await self._set_api_protocol_version(version)
+        # the device has answered in this version, so a failure of the
+        # request that follows is not a reason to rotate away from it
+        self._api_protocol_working = True
+        return True
+
+    async def _set_api_protocol_version(self, new_version):
         _LOGGER.debug(
             "Setting protocol version for %s to %0.1f",
             self.name,
@@ -695,15 +1067,10 @@ class TuyaLocalDevice(object):
         else:
             self._api.disabledetect = True
 
-        await self._hass.async_add_executor_job(
-            self._api.set_version,
-            new_version,
-        )
+        # setting 3.2 queries the device, so it takes a turn on the socket
+        await self._io.async_call(self._api.set_version, new_version)
         if self._api.parent:
-            await self._hass.async_add_executor_job(
-                self._api.parent.set_version,
-                new_version,
-            )
+            await self._io.async_call(self._api.parent.set_version, new_version)
 
     @staticmethod
     def get_key_for_value(obj, value, fallback=None):
@@ -726,6 +1093,11 @@ def setup_device(hass: HomeAssistant, config: dict):
         config.get(CONF_DEVICE_CID),
         hass,
         config[CONF_POLL_ONLY],
+        config.get(CONF_NATIVE_TRANSPORT, False),
+        config.get(CONF_MIN_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL),
+        config.get(CONF_MAX_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL),
+        config.get(CONF_WRITE_FLUSH_WINDOW, DEFAULT_WRITE_FLUSH_WINDOW),
+        config.get(CONF_RENDER_WINDOW, DEFAULT_RENDER_WINDOW),
     )
     hass.data[DOMAIN][get_device_id(config)] = {
         "device": device,
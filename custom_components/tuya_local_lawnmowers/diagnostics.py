@@ -54,9 +54,9 @@ def _async_get_diagnostics(
         "device_id": REDACTED,
         "device_cid": REDACTED if entry.data.get(CONF_DEVICE_CID, "") != "" else "",
         "local_key": REDACTED,
-        "host": REDACTED
-        if hostname != "" and hostname.casefold() != "auto"
-        else hostname,
+        "host": (
+            REDACTED if hostname != "" and hostname.casefold() != "auto" else hostname
+        ),
         "protocol_version": entry.data[CONF_PROTOCOL_VERSION],
         "tinytuya_version": tinytuya_version,
     }
@@ -114,7 +114,19 @@ def _async_device_as_dict(
         "cached_state": redact_dps(device, device._cached_state),
         "pending_state": redact_dps(device, device._pending_updates),
         "connected": device._running,
+        "stale": device.stale,
+        "startup": (
+            device._startup.timings(device.unique_id) if device._startup else None
+        ),
         "force_dps": device._force_dps,
+        "poll_schedule": device._scheduler.as_dict(),
+        "reconnect": device._supervisor.as_dict(),
+        "io": device._io.as_dict(),
+        "decode_cache": device.decode_cache.as_dict(),
+        "state_writes": device._renders.as_dict(),
+        "connection_profile": (
+            device._profiles.get(device.unique_id) if device._profiles else None
+        ),
     }
 
     device_registry = dr.async_get(hass)
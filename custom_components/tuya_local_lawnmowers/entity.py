@@ -3,6 +3,9 @@ Common functionality for Tuya Local Lawnmowers entities
 """
 
 import logging
+from functools import lru_cache
+from hashlib import sha256
+from time import monotonic
 
 from homeassistant.const import (
     CONCENTRATION_MICROGRAMS_PER_CUBIC_METER,
@@ -11,15 +14,31 @@ from homeassistant.const import (
 )
 from homeassistant.helpers.entity import EntityCategory
 
+from .helpers.throttle import Throttle
+
 _LOGGER = logging.getLogger(__name__)
 
 # These attributes should not be included in the extra state attributes
 BLACKLISTED_ATTRIBUTES = ["state", "available"]
+# Recorded string attributes longer than this are replaced by a digest of
+# their value, which is still in full in the device diagnostics
+MAX_RECORDED_LENGTH = 255
+
+
+@lru_cache(maxsize=64)
+def _digest(value):
+    """Return a short digest of a long attribute value."""
+    return "sha256:" + sha256(value.encode("utf-8")).hexdigest()[:16]
 
 
 class TuyaLocalEntity:
     """Common functions for all entity types."""
 
+    # Attributes kept out of the recorder.  Home Assistant reads these per
+    # entity class, so each platform lists the names of the unrecorded dps
+    # its configs use.
+    _unrecorded_attributes = frozenset()
+
     def _init_begin(self, device, config):
         self._device = device
         self._config = config
@@ -28,6 +47,10 @@ class TuyaLocalEntity:
             config.translation_key or config.translation_only_key
         )
         self._attr_translation_placeholders = config.translation_placeholders
+        self._throttle = Throttle.from_config(config)
+        # the dp whose value the throttle holds back, set by the platform
+        self._throttled_dps = None
+        self._release = None
 
         return {c.name: c for c in config.dps()}
 
@@ -42,7 +65,7 @@ class TuyaLocalEntity:
 
     @property
     def available(self):
-        return self._device.has_returned_state and self._config.available(self._device)
+        return self._device.available and self._config.available(self._device)
 
     @property
     def has_entity_name(self):
@@ -101,10 +124,55 @@ class TuyaLocalEntity:
         attr = {}
         for a in self._attr_dps:
             value = a.get_value(self._device)
+            payload = a.decoded_payload(self._device)
+            if payload is not None and payload.records is not None:
+                # expose the records rather than the payload they came in
+                value = list(payload.records)
+            elif (
+                isinstance(value, str)
+                and len(value) > MAX_RECORDED_LENGTH
+                and not a.unrecorded
+            ):
+                value = _digest(value)
             if value is not None or not a.optional:
                 attr[a.name] = value
+        if self._device.stale:
+            # the values were saved before a restart, and may be out of date
+            attr["stale"] = True
         return attr
 
+    def _throttled(self, value):
+        """Return the value to show, holding back changes too small or soon."""
+        if self._throttle is None:
+            return value
+        return self._throttle.shown(value)
+
+    def prepare_state_write(self):
+        """Pass the latest value through the throttle before writing state."""
+        # done once per write rather than in the state properties, which are
+        # read more than once for each write and by diagnostics
+        if self._throttle is not None and self._throttled_dps is not None:
+            self._throttle.filter(
+                self._throttled_dps.get_value(self._device), monotonic()
+            )
+            self._schedule_release()
+
+    def _schedule_release(self):
+        """Show the last value held back once things have quietened down."""
+        due = self._throttle.release_at()
+        if due is not None and self._release is None and self.hass:
+            self._release = self.hass.loop.call_later(
+                max(due - monotonic(), 0), self._release_throttle
+            )
+
+    def _release_throttle(self):
+        self._release = None
+        if self._throttle.release(monotonic()):
+            self._device.schedule_state_write([self])
+        else:
+            # newer values arrived since, so wait for them to settle
+            self._schedule_release()
+
     @property
     def entity_registry_enabled_default(self):
         """Disable deprecated entities on new installations"""
@@ -120,6 +188,9 @@ class TuyaLocalEntity:
             _LOGGER.warning(self._config.deprecation_message)
 
     async def async_will_remove_from_hass(self):
+        if self._release:
+            self._release.cancel()
+            self._release = None
         await self._device.async_unregister_entity(self)
 
     def on_receive(self, dps, full_poll):
@@ -0,0 +1,147 @@
+"""
+Shared connection to a Tuya gateway for its sub devices.
+"""
+
+import asyncio
+import logging
+
+from tinytuya.core import command_types as CT
+
+from .transport import HEARTBEAT_INTERVAL, TuyaAsyncTransport, UpdateQueue
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _result_cid(result):
+    """Return the sub device id a decoded message is for."""
+    cid = result.get("cid")
+    if not cid and isinstance(result.get("data"), dict):
+        cid = result["data"].get("cid")
+    return cid
+
+
+class TuyaGatewayTransport(TuyaAsyncTransport):
+    # A sub device that does not answer must not disconnect its siblings.
+    # Messages are framed, so a late reply does not upset the stream.
+    _close_on_timeout = False
+
+    def __init__(self, api, timeout=5):
+        """
+        Represents a connection to a gateway, shared by its sub devices.
+
+        The connection has a single reader, which routes updates to the
+        sub device they are for, and requests from all sub devices are
+        sent one at a time.
+
+        Args:
+            api (tinytuya.Device): The gateway device.
+            timeout (number): Seconds to wait for connections and replies.
+        """
+        super().__init__(api, timeout)
+        self._children = {}
+
+    def sub_device(self, api):
+        """Return the transport for a sub device of this gateway."""
+        child = self._children.get(api.cid)
+        if child is None:
+            child = TuyaSubDeviceTransport(self, api)
+            self._children[api.cid] = child
+        return child
+
+    def _deliver(self, result):
+        cid = _result_cid(result)
+        child = self._children.get(cid)
+        if child:
+            child._updates.put(result)
+        else:
+            _LOGGER.debug(
+                "%s discarding update for unknown sub device %s",
+                self._api.id,
+                cid,
+            )
+
+    def _wake(self, item=None):
+        for child in self._children.values():
+            child._updates.wake(item)
+
+    def _release(self):
+        """Close the connection once no sub device is using it."""
+        if not any(child._active for child in self._children.values()):
+            self.close()
+
+
+class TuyaSubDeviceTransport(object):
+    def __init__(self, gateway, api):
+        """
+        Represents a sub device's share of its gateway's connection.
+
+        Args:
+            gateway (TuyaGatewayTransport): The shared gateway connection.
+            api (tinytuya.Device): The sub device, used to build requests.
+        """
+        self._gateway = gateway
+        self._api = api
+        self._updates = UpdateQueue()
+        self._active = False
+
+    @property
+    def connected(self):
+        return self._active and self._gateway.connected
+
+    async def async_connect(self):
+        self._active = True
+        # other sub devices may be connecting for a request at the same time
+        async with self._gateway._request_lock:
+            await self._gateway.async_connect()
+
+    async def async_status(self):
+        """Request the status of all dps."""
+        self._active = True
+        return await self._gateway._async_request(CT.DP_QUERY, api=self._api)
+
+    async def async_updatedps(self, index):
+        """Ask the device to report the given dps, which arrive as updates."""
+        self._active = True
+        await self._gateway._async_send(CT.UPDATEDPS, index, api=self._api)
+
+    async def async_heartbeat(self):
+        await self._gateway.async_heartbeat()
+
+    async def async_keepalive(self):
+        # Every idle sub device asks, but the gateway only needs a heartbeat
+        # when nothing at all has been sent to it for a while.
+        await self._gateway.async_keepalive()
+
+    async def async_set_values(self, values):
+        """Send new values for dps, without waiting for the device to act."""
+        self._active = True
+        await self._gateway._async_send(
+            CT.CONTROL,
+            {str(k): v for k, v in values.items()},
+            api=self._api,
+        )
+
+    async def async_receive(self, timeout=HEARTBEAT_INTERVAL):
+        """
+        Wait for the next update for this sub device.
+
+        Args:
+            timeout (number): Seconds to wait.  If nothing arrives, a
+                heartbeat is sent if one is due.
+
+        Returns the decoded message, or None if nothing arrived in time or
+        the connection was closed locally.
+        """
+        if self._updates.empty():
+            await self.async_connect()
+        try:
+            return await self._updates.async_get(timeout)
+        except asyncio.TimeoutError:
+            await self.async_keepalive()
+            return None
+
+    def close(self):
+        """Stop using the gateway connection, waking any reader."""
+        self._active = False
+        self._updates.wake()
+        self._gateway._release()
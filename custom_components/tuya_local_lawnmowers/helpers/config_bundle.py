@@ -0,0 +1,108 @@
+"""
+Precompiled bundle of the Tuya Local Lawnmowers device configs.
+
+Parsing YAML is the slowest part of loading a device config, which shows on
+low powered hosts at startup.  The bundle holds every config already parsed,
+as JSON, along with a hash of the YAML it was built from.  A config is only
+taken from the bundle while the hash of its YAML still matches, so an edited
+or newly added config is parsed from YAML as before.
+
+Build or check the bundle with util/config_bundle.py.
+"""
+
+import json
+import logging
+from hashlib import sha256
+from os.path import join
+
+_LOGGER = logging.getLogger(__name__)
+
+BUNDLE_FILE = "bundle.json"
+# Increase when the layout of the bundle changes, so older bundles are ignored
+BUNDLE_SCHEMA = 1
+
+
+def source_hash(source):
+    """Return the hash of the YAML source of a config, given as bytes."""
+    return sha256(source).hexdigest()
+
+
+def bundle_hash(configs):
+    """Return the hash of the whole bundle, from the hashes of its configs."""
+    combined = sha256()
+    for fname in sorted(configs):
+        combined.update(f"{fname}:{configs[fname]['hash']}\n".encode())
+    return combined.hexdigest()
+
+
+def build_bundle(sources, parse):
+    """
+    Build a bundle.
+
+    Args:
+        sources (dict): YAML source of each config as bytes, by file name.
+        parse (callable): Returns the parsed config from a file name.
+
+    Returns the bundle, and the names of configs left out because they do
+    not survive conversion to JSON unchanged.
+    """
+    configs = {}
+    skipped = []
+    for fname in sorted(sources):
+        parsed = parse(fname)
+        try:
+            config = json.loads(json.dumps(parsed))
+        except (TypeError, ValueError):
+            config = None
+        if config != parsed:
+            skipped.append(fname)
+            continue
+        configs[fname] = {"hash": source_hash(sources[fname]), "config": config}
+    return {
+        "schema": BUNDLE_SCHEMA,
+        "hash": bundle_hash(configs),
+        "configs": configs,
+    }, skipped
+
+
+def load_bundle(config_dir):
+    """Return the configs in the bundle by file name, or {} if unusable."""
+    try:
+        with open(join(config_dir, BUNDLE_FILE), encoding="utf-8") as f:
+            bundle = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        _LOGGER.warning("Ignoring unreadable device config bundle: %s", e)
+        return {}
+    if not isinstance(bundle, dict) or bundle.get("schema") != BUNDLE_SCHEMA:
+        _LOGGER.debug("Ignoring device config bundle with a different schema")
+        return {}
+    configs = bundle.get("configs", {})
+    if bundle.get("hash") != bundle_hash(configs):
+        _LOGGER.warning("Ignoring corrupt device config bundle")
+        return {}
+    return configs
+
+
+def check_bundle(bundle, sources):
+    """
+    Compare a bundle with the YAML sources, returning a list of problems.
+
+    An empty list means every config would be taken from the bundle.
+    """
+    problems = []
+    configs = bundle.get("configs", {})
+    if bundle.get("schema") != BUNDLE_SCHEMA:
+        problems.append(f"schema {bundle.get('schema')} is not {BUNDLE_SCHEMA}")
+    if bundle.get("hash") != bundle_hash(configs):
+        problems.append("bundle hash does not match its contents")
+    for fname in sorted(sources):
+        entry = configs.get(fname)
+        if entry is None:
+            problems.append(f"{fname} is missing")
+        elif entry["hash"] != source_hash(sources[fname]):
+            problems.append(f"{fname} has changed")
+    for fname in sorted(set(configs) - set(sources)):
+        problems.append(f"{fname} no longer exists")
+    return problems
@@ -0,0 +1,111 @@
+"""
+Persisted connection profiles for Tuya Local Lawnmowers devices.
+
+A profile records what it took to talk to a device last time, so that a
+device configured with "auto" protocol version can start with the version
+that worked instead of working through all of them again after every
+restart or reload.
+"""
+
+import asyncio
+from time import time
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from ..const import API_PROTOCOL_VERSIONS, DATA_CONNECTION_PROFILES, DOMAIN
+
+STORAGE_KEY = f"{DOMAIN}.connection_profiles"
+STORAGE_VERSION = 1
+# Seconds to wait before writing changes, so a burst of them is written once
+SAVE_DELAY = 30
+
+
+class ConnectionProfiles(object):
+    def __init__(self, hass: HomeAssistant):
+        """
+        Connection profiles of all devices, keyed by device id.
+
+        Args:
+            hass (HomeAssistant): The Home Assistant instance.
+        """
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._profiles = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    async def async_load(self):
+        async with self._load_lock:
+            if not self._loaded:
+                self._profiles = await self._store.async_load() or {}
+                self._loaded = True
+
+    def _save(self):
+        self._store.async_delay_save(lambda: self._profiles, SAVE_DELAY)
+
+    def get(self, device_id):
+        """Return the profile of a device, or None if it has none."""
+        return self._profiles.get(device_id)
+
+    def preferred_version(self, device_id):
+        """Return the protocol version that last worked for a device."""
+        profile = self.get(device_id)
+        if not profile:
+            return None
+        version = profile.get("version")
+        if version == 3.22 and not profile.get("device22"):
+            # detection was enabled but not needed, and it is known to
+            # misdetect some genuine 3.3 devices
+            version = 3.3
+        return version if version in API_PROTOCOL_VERSIONS else None
+
+    def record_success(self, device_id, version, device22):
+        """
+        Record that a device answered.
+
+        Args:
+            device_id (str): The device id.
+            version (number): The protocol version, from API_PROTOCOL_VERSIONS.
+            device22 (bool): True if 3.22 detection found a device22 device.
+        """
+        profile = self._profiles.setdefault(device_id, {"failures": 0})
+        changed = (
+            profile.get("version") != version
+            or profile.get("device22") != device22
+            or profile["failures"]
+        )
+        profile.update(
+            {
+                "version": version,
+                "device22": device22,
+                "failures": 0,
+                "last_success": time(),
+            }
+        )
+        # last_success alone is not worth a write, it is saved along with
+        # the next change
+        if changed:
+            self._save()
+
+    def record_failure(self, device_id):
+        """Record that a device did not answer after all retries."""
+        profile = self._profiles.setdefault(device_id, {"failures": 0})
+        profile["failures"] += 1
+        profile["last_failure"] = time()
+        self._save()
+
+    def remove(self, device_id):
+        """Forget the profile of a device that has been removed."""
+        if self._profiles.pop(device_id, None) is not None:
+            self._save()
+
+
+async def async_get_connection_profiles(hass: HomeAssistant):
+    """Return the connection profiles, loading them on first use."""
+    data = hass.data.setdefault(DOMAIN, {})
+    profiles = data.get(DATA_CONNECTION_PROFILES)
+    if profiles is None:
+        # entries set up at the same time must share the same instance
+        profiles = data[DATA_CONNECTION_PROFILES] = ConnectionProfiles(hass)
+    await profiles.async_load()
+    return profiles
@@ -8,16 +8,59 @@ from collections.abc import Sequence
 from datetime import datetime
 from fnmatch import fnmatch
 from numbers import Number
-from os import scandir
-from os.path import dirname, exists, join, splitext
+from os import scandir, stat
+from os.path import dirname, join, splitext
+from threading import Lock
 
 from homeassistant.util import slugify
 from homeassistant.util.yaml import load_yaml
 
 import custom_components.tuya_local_lawnmowers.devices as config_dir
 
+from .config_bundle import load_bundle, source_hash
+from .mapping_table import MappingTable
+from .payload import decode_payload
+from .state_store import DecodeCache
+
 _LOGGER = logging.getLogger(__name__)
 
+# Parsed configs by file name, shared by all entries, each with the
+# modification time of its file so that an edited config is read again.
+_config_cache = {}
+# configs are loaded from executor threads
+_config_cache_lock = Lock()
+# Precompiled configs by file name, loaded on first use
+_bundle = None
+# The config file names, with the modification time of their directory
+_available = (None, [])
+# The detection index, with the configs it was built from
+_detection_index = (None, None)
+
+
+# Python types of the values of each type of dp
+_DP_TYPES = {
+    "boolean": bool,
+    "integer": int,
+    "string": str,
+    "float": float,
+    "bitfield": int,
+    "json": str,
+    "base64": str,
+    "utf16b64": str,
+    "hex": str,
+    "unixtime": int,
+}
+
+
+# Dp types whose values are long enough to keep out of the recorder
+_LONG_TYPES = ("base64", "hex", "json", "utf16b64")
+
+# Decoders of the dp types that carry bytes in a string
+_BLOB_DECODERS = {
+    "hex": bytes.fromhex,
+    "base64": b64decode,
+}
+
 
 def _typematch(vtype, value):
     # Workaround annoying legacy of bool being a subclass of int in Python
@@ -95,18 +138,43 @@ def to_signed(val, bits):
     return val
 
 
+class _ReadOnly:
+    """
+    Base for entity and dp configs, which are shared by every device using
+    the same config, from the event loop and executor threads alike, so
+    must not change once built.  Results that depend on a device are
+    returned to the caller rather than kept.
+    """
+
+    __slots__ = ("_built",)
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_built", False):
+            raise AttributeError(f"{type(self).__name__} is read only")
+        object.__setattr__(self, name, value)
+
+
 class TuyaDeviceConfig:
     """Representation of a device config for Tuya Local Lawnmowers devices."""
 
-    def __init__(self, fname):
+    def __init__(self, fname, config=None):
         """Initialize the device config.
         Args:
-            fname (string): The filename of the yaml config to load."""
+            fname (string): The filename of the yaml config to load.
+            config (dict): The config already parsed from fname, if any."""
         _CONFIG_DIR = dirname(config_dir.__file__)
         self._fname = fname
         filename = join(_CONFIG_DIR, fname)
-        self._config = load_yaml(filename)
+        self._config = load_yaml(filename) if config is None else config
         self._reported_deprecated_primary = False
+        entities = self._config.get("entities")
+        if entities:
+            self._entities = tuple(TuyaEntityConfig(self, e) for e in entities)
+        else:
+            self._entities = (self.primary_entity,) + tuple(
+                TuyaEntityConfig(self, e)
+                for e in self._config.get("secondary_entities", {})
+            )
         _LOGGER.debug("Loaded device config %s", fname)
 
     @property
@@ -151,13 +219,7 @@ class TuyaDeviceConfig:
 
     def all_entities(self):
         """Iterate through all entities for this device."""
-        entities = self._config.get("entities")
-        if not entities:
-            yield self.primary_entity
-            entities = self._config.get("secondary_entities", {})
-
-        for e in entities:
-            yield TuyaEntityConfig(self, e)
+        return iter(self._entities)
 
     def matches(self, dps, product_ids):
         """Determine whether this config matches the provided dps map or
@@ -254,12 +316,24 @@ class TuyaDeviceConfig:
         return product_match or round((total - len(keys)) * 100 / total)
 
 
-class TuyaEntityConfig:
+class TuyaEntityConfig(_ReadOnly):
     """Representation of an entity config for a supported entity."""
 
+    # Entity configs are built once per device config and shared by every
+    # device using it, so they are kept small and what is derived from the
+    # config is worked out once.
+    __slots__ = ("_device", "_config", "_dps", "_dps_by_name", "config_id")
+
     def __init__(self, device, config):
         self._device = device
         self._config = config
+        self._dps = tuple(TuyaDpsConfig(self, d) for d in config.get("dps", ()))
+        self._dps_by_name = {}
+        for d in self._dps:
+            self._dps_by_name.setdefault(d.name, d)
+        # The identifier for this entity in the config
+        self.config_id = self._make_config_id()
+        self._built = True
 
     @property
     def name(self):
@@ -305,14 +379,27 @@ class TuyaEntityConfig:
             f"deprecated and should be replaced by {replacement}."
         )
 
+    @property
+    def deadband(self):
+        """The smallest change in value worth showing."""
+        return self._config.get("deadband")
+
+    @property
+    def min_interval(self):
+        """The shortest time in seconds between changes of value shown."""
+        return self._config.get("min_interval")
+
+    @property
+    def thresholds(self):
+        """Values whose crossing is shown despite deadband and min_interval."""
+        return self._config.get("thresholds", [])
+
     @property
     def entity(self):
         """The entity type of this entity."""
         return self._config["entity"]
 
-    @property
-    def config_id(self):
-        """The identifier for this entity in the config."""
+    def _make_config_id(self):
         if self.translation_key:
             slug = f"{self.entity}_{self.translation_key}"
             for key, value in self.translation_placeholders.items():
@@ -354,15 +441,11 @@ class TuyaEntityConfig:
 
     def dps(self):
         """Iterate through the list of dps for this entity."""
-        for d in self._config["dps"]:
-            yield TuyaDpsConfig(self, d)
+        return iter(self._dps)
 
     def find_dps(self, name):
         """Find a dps with the specified name."""
-        for d in self.dps():
-            if d.name == name:
-                return d
-        return None
+        return self._dps_by_name.get(name)
 
     def available(self, device):
         """Return whether this entity should be available, with state as given."""
@@ -387,62 +470,88 @@ class TuyaEntityConfig:
         return not hidden and not self.deprecated
 
 
-class TuyaDpsConfig:
+class TuyaDpsConfig(_ReadOnly):
     """Representation of a dps config."""
 
+    __slots__ = (
+        "_entity",
+        "_config",
+        "id",
+        "type",
+        "rawtype",
+        "name",
+        "optional",
+        "persist",
+        "force",
+        "sensitive",
+        "format",
+        "mask",
+        "_mask_shift",
+        "_mask_bits",
+        "_mask_signed",
+        "endianness",
+        "readonly",
+        "hidden",
+        "unit",
+        "state_class",
+        "suggested_display_precision",
+        "decoder",
+        "unrecorded",
+        "urgent_values",
+        "_mapping_table",
+    )
+
     def __init__(self, entity, config):
         self._entity = entity
         self._config = config
-        self.stringify = False
-
-    @property
-    def id(self):
-        return str(self._config["id"])
-
-    @property
-    def type(self):
-        t = self._config["type"]
-        types = {
-            "boolean": bool,
-            "integer": int,
-            "string": str,
-            "float": float,
-            "bitfield": int,
-            "json": str,
-            "base64": str,
-            "utf16b64": str,
-            "hex": str,
-            "unixtime": int,
-        }
-        return types.get(t)
-
-    @property
-    def rawtype(self):
-        return self._config["type"]
-
-    @property
-    def name(self):
-        return self._config["name"]
-
-    @property
-    def optional(self):
-        return self._config.get("optional", False)
-
-    @property
-    def persist(self):
-        return self._config.get("persist", True)
-
-    @property
-    def force(self):
-        return self._config.get("force", False)
-
-    @property
-    def sensitive(self):
-        return self._config.get("sensitive", False)
+        self.id = str(config["id"])
+        self.rawtype = config.get("type")
+        self.type = _DP_TYPES.get(self.rawtype)
+        self.name = config.get("name")
+        self.optional = config.get("optional", False)
+        self.persist = config.get("persist", True)
+        self.force = config.get("force", False)
+        self.sensitive = config.get("sensitive", False)
+        self.format = self._parse_format(config.get("format"))
+        mask = config.get("mask")
+        self.mask = int(mask, 16) if mask else None
+        if self.mask:
+            # the mask picks out _mask_bits bits, from bit _mask_shift
+            self._mask_shift = (self.mask & -self.mask).bit_length() - 1
+            self._mask_bits = self.mask.bit_count()
+        else:
+            self._mask_shift = self._mask_bits = 0
+        self._mask_signed = config.get("mask_signed", False)
+        self.endianness = config.get("endianness", "big")
+        self.readonly = config.get("readonly", False)
+        self.hidden = config.get("hidden", False)
+        self.unit = config.get("unit")
+        # The state class of this measurement
+        self.state_class = config.get("class")
+        self.suggested_display_precision = config.get("precision")
+        # The name of the decoder for a structured payload, if any
+        self.decoder = config.get("decoder")
+        # Whether to keep the dp out of the attributes the recorder stores
+        self.unrecorded = config.get(
+            "unrecorded",
+            self.sensitive
+            or bool(self.decoder)
+            or (self.rawtype in _LONG_TYPES and not self.mask),
+        )
+        # Values that are sent at once, ahead of routine writes
+        self.urgent_values = frozenset(
+            str(m.get("dps_val"))
+            for m in config.get("mapping", [])
+            if m.get("urgent", False)
+        )
+        self._mapping_table = MappingTable(
+            config.get("mapping", []),
+            self.rawtype == "bitfield",
+        )
+        self._built = True
 
-    @property
-    def format(self):
-        fmt = self._config.get("format")
+    @staticmethod
+    def _parse_format(fmt):
         if fmt:
             unpack_fmt = ">"
             ranges = []
@@ -466,63 +575,74 @@ class TuyaDpsConfig:
 
         return None
 
-    @property
-    def mask(self):
-        mask = self._config.get("mask")
-        if mask:
-            return int(mask, 16)
-
-    @property
-    def endianness(self):
-        endianness = self._config.get("endianness", "big")
-        return endianness
+    def _memoised(self, device, compute, *args):
+        """
+        Return compute(device, *args), reusing the result from earlier in
+        the same state of the device.
+        """
+        cache = getattr(device, "decode_cache", None)
+        if not isinstance(cache, DecodeCache):
+            return compute(device, *args)
+        return cache.get(
+            device.state_version,
+            (self, compute, *args),
+            compute,
+            device,
+            *args,
+        )
 
     def get_value(self, device):
         """Return the value of the dps from the given device."""
-        mask = self.mask
-        bytevalue = self.decoded_value(device)
-        if mask and isinstance(bytevalue, bytes):
-            value = int.from_bytes(bytevalue, self.endianness)
-            scale = mask & (1 + ~mask)
-            raw_result = (value & mask) // scale
-
-            # Insert signed interpretation here
-            if self._config.get("mask_signed", False):
-                # Count how many bits are set in the mask
-                bit_count = mask.bit_count()
-                raw_result = to_signed(raw_result, bit_count)
-
-            return self._map_from_dps(raw_result, device)
-        else:
-            return self._map_from_dps(device.get_property(self.id), device)
+        return self._memoised(device, self._get_value)
+
+    def _get_value(self, device):
+        if self.mask:
+            bytevalue = self.decoded_value(device)
+            if isinstance(bytevalue, bytes):
+                value = int.from_bytes(bytevalue, self.endianness)
+                raw_result = (value & self.mask) >> self._mask_shift
+                if self._mask_signed:
+                    raw_result = to_signed(raw_result, self._mask_bits)
+                return self._map_from_dps(raw_result, device)
+        return self._map_from_dps(device.get_property(self.id), device)
 
     def decoded_value(self, device):
         v = self._map_from_dps(device.get_property(self.id), device)
-        if self.rawtype == "hex" and isinstance(v, str):
-            try:
-                return bytes.fromhex(v)
-            except ValueError:
-                _LOGGER.warning(
-                    "%s sent invalid hex '%s' for %s",
-                    device.name,
-                    v,
-                    self.name,
-                )
-                return None
+        if self.rawtype in _BLOB_DECODERS and isinstance(v, str):
+            cache = getattr(device, "decode_cache", None)
+            if not isinstance(cache, DecodeCache):
+                return self._decode_blob(device, v)
+            # dps packed into the same blob share one decoding of it
+            return cache.get(
+                device.state_version,
+                (self.rawtype, v),
+                self._decode_blob,
+                device,
+                v,
+            )
+        return v
 
-        elif self.rawtype == "base64" and isinstance(v, str):
-            try:
-                return b64decode(v)
-            except ValueError:
-                _LOGGER.warning(
-                    "%s sent invalid base64 '%s' for %s",
-                    device.name,
-                    v,
-                    self.name,
-                )
-                return None
-        else:
-            return v
+    def _decode_blob(self, device, v):
+        try:
+            return _BLOB_DECODERS[self.rawtype](v)
+        except ValueError:
+            _LOGGER.warning(
+                "%s sent invalid %s '%s' for %s",
+                device.name,
+                self.rawtype,
+                v,
+                self.name,
+            )
+            return None
+
+    def decoded_payload(self, device):
+        """Return the Payload decoded from the dps, or None if it is empty."""
+        if not self.decoder:
+            return None
+        raw = device.get_property(self.id)
+        if not isinstance(raw, str) or not raw:
+            return None
+        return decode_payload(self.decoder, raw)
 
     def encode_value(self, v):
         if self.rawtype == "hex":
@@ -571,6 +691,10 @@ class TuyaDpsConfig:
 
     def values(self, device):
         """Return the possible values a dps can take."""
+        # a copy, as the memoised list is shared by every caller
+        return list(self._memoised(device, self._values))
+
+    def _values(self, device):
         if "mapping" not in self._config.keys():
             return []
         val = []
@@ -626,6 +750,10 @@ class TuyaDpsConfig:
 
     def range(self, device, scaled=True):
         """Return the range for this dps if configured."""
+        # a (min, max) tuple, so safe to share with every caller
+        return self._memoised(device, self._range, scaled)
+
+    def _range(self, device, scaled):
         scale = self.scale(device) if scaled else 1
         mapping = self._find_map_for_dps(device.get_property(self.id), device)
         r = self._config.get("range")
@@ -641,6 +769,12 @@ class TuyaDpsConfig:
             return None
 
     def scale(self, device):
+        if not self._mapping_table.mapping:
+            # only a mapping can scale
+            return 1
+        return self._memoised(device, self._scale)
+
+    def _scale(self, device):
         scale = 1
         mapping = self._find_map_for_dps(device.get_property(self.id), device)
         if mapping:
@@ -659,10 +793,6 @@ class TuyaDpsConfig:
                 precision += 1
             return precision
 
-    @property
-    def suggested_display_precision(self):
-        return self._config.get("precision")
-
     def step(self, device, scaled=True):
         step = 1
         scale = self.scale(device) if scaled else 1
@@ -682,10 +812,6 @@ class TuyaDpsConfig:
             )
         return step / scale if scaled else step
 
-    @property
-    def readonly(self):
-        return self._config.get("readonly", False)
-
     def invalid_for(self, value, device):
         mapping = self._find_map_for_value(value, device)
         if mapping:
@@ -694,31 +820,37 @@ class TuyaDpsConfig:
                 return cond.get("invalid", False)
         return False
 
-    @property
-    def hidden(self):
-        return self._config.get("hidden", False)
-
-    @property
-    def unit(self):
-        return self._config.get("unit")
-
-    @property
-    def state_class(self):
-        """The state class of this measurement."""
-        return self._config.get("class")
-
     def _find_map_for_dps(self, value, device):
-        default = None
-        for m in self._config.get("mapping", {}):
-            if not self.mapping_available(m, device) and "conditions" not in m:
-                continue
-            if "dps_val" not in m:
-                default = m
-            elif self._match(m["dps_val"], value):
+        table = self._mapping_table
+        mapping = table.mapping
+        for i in table.dps_candidates(value):
+            m = mapping[i]
+            if ("conditions" in m or self.mapping_available(m, device)) and self._match(
+                m["dps_val"], value
+            ):
+                return m
+        # the last mapping without a dps_val is the default
+        for i in reversed(table.dps_defaults):
+            m = mapping[i]
+            if "conditions" in m or self.mapping_available(m, device):
                 return m
-        return default
+        return None
 
-    def _correct_type(self, result):
+    def _sent_as_string(self, device):
+        """
+        Return whether the device sends the value of this dp as a string
+        although it is not a string type, so values set are sent as strings.
+        """
+        val = device.get_property(self.id)
+        if val is not None and self.type is not str and isinstance(val, str):
+            try:
+                self.type(val)
+                return True
+            except ValueError:
+                return False
+        return False
+
+    def _correct_type(self, result, device):
         """Convert value to the correct type for this dp."""
         if self.type is int:
             _LOGGER.debug("Rounding %s", self.name)
@@ -732,7 +864,7 @@ class TuyaDpsConfig:
             if self.rawtype == "utf16b64":
                 result = b64encode(result.encode("utf-16-be")).decode("utf-8")
 
-        if self.stringify:
+        if self._sent_as_string(device):
             result = str(result)
 
         return result
@@ -741,11 +873,8 @@ class TuyaDpsConfig:
         if val is not None and self.type is not str and isinstance(val, str):
             try:
                 val = self.type(val)
-                self.stringify = True
             except ValueError:
-                self.stringify = False
-        else:
-            self.stringify = False
+                pass
 
         # decode utf-16 base64 strings first, so normal strings can be matched
         if self.rawtype == "utf16b64" and isinstance(val, str):
@@ -833,61 +962,57 @@ class TuyaDpsConfig:
         return result
 
     def _find_map_for_value(self, value, device):
-        default = None
-        nearest = None
-        distance = float("inf")
-        for m in self._config.get("mapping", {}):
-            # no reverse mapping of hidden values
-            ignore = m.get("hidden", False) or not self.mapping_available(m, device)
-
-            if "dps_val" not in m and not ignore:
-                default = m
-            # The following avoids further matching on the above case
-            # and in the null mapping case, which is intended to be
-            # a one-way map to prevent the entity showing as unavailable
-            # when no value is being reported by the device.
-            if m.get("dps_val") is None:
-                ignore = True
-
-            if "value" in m and str(m["value"]) == str(value) and not ignore:
-                return m
-            if (
-                "value" in m
-                and isinstance(m["value"], Number)
-                and isinstance(value, Number)
-                and not ignore
-            ):
-                d = abs(m["value"] - value)
-                if d < distance:
-                    distance = d
-                    nearest = m
+        table = self._mapping_table
+        mapping = table.mapping
+        for i in table.value_candidates(value):
+            if self._selected_by_value(mapping[i], value, device):
+                return mapping[i]
+        for group in table.nearest(value):
+            for i in group:
+                if self.mapping_available(mapping[i], device):
+                    return mapping[i]
+        for i in reversed(table.value_defaults):
+            if self.mapping_available(mapping[i], device):
+                return mapping[i]
+        return None
 
-            if "value" not in m and "value_mirror" in m and not ignore:
-                r_dps = self._entity.find_dps(m["value_mirror"])
-                if r_dps and str(r_dps.get_value(device)) == str(value):
-                    return m
+    def _selected_by_value(self, m, value, device):
+        """Return whether setting value selects mapping m."""
+        # no reverse mapping of hidden values
+        ignore = m.get("hidden", False) or not self.mapping_available(m, device)
+        # The null mapping case is intended to be a one-way map to prevent
+        # the entity showing as unavailable when no value is being reported
+        # by the device, and the case without a dps_val is only a default.
+        if m.get("dps_val") is None:
+            ignore = True
+
+        if "value" in m and str(m["value"]) == str(value) and not ignore:
+            return True
 
-            for c in m.get("conditions", {}):
-                if c.get("hidden", False) or not self.mapping_available(c, device):
-                    continue
-                if "value" in c and str(c["value"]) == str(value):
-                    c_dp = self._entity.find_dps(m.get("constraint", self.name))
-                    # only consider the condition a match if we can change
-                    # the dp to match, or it already matches
-                    if (c_dp and c_dp.id != self.id and not c_dp.readonly) or (
-                        _equal_or_in(
-                            device.get_property(c_dp.id),
-                            c.get("dps_val"),
-                        )
-                    ):
-                        return m
-                if "value" not in c and "value_mirror" in c:
-                    r_dps = self._entity.find_dps(c["value_mirror"])
-                    if r_dps and str(r_dps.get_value(device)) == str(value):
-                        return m
-        if nearest:
-            return nearest
-        return default
+        if "value" not in m and "value_mirror" in m and not ignore:
+            r_dps = self._entity.find_dps(m["value_mirror"])
+            if r_dps and str(r_dps.get_value(device)) == str(value):
+                return True
+
+        for c in m.get("conditions", {}):
+            if c.get("hidden", False) or not self.mapping_available(c, device):
+                continue
+            if "value" in c and str(c["value"]) == str(value):
+                c_dp = self._entity.find_dps(m.get("constraint", self.name))
+                # only consider the condition a match if we can change
+                # the dp to match, or it already matches
+                if (c_dp and c_dp.id != self.id and not c_dp.readonly) or (
+                    _equal_or_in(
+                        device.get_property(c_dp.id),
+                        c.get("dps_val"),
+                    )
+                ):
+                    return True
+            if "value" not in c and "value_mirror" in c:
+                r_dps = self._entity.find_dps(c["value_mirror"])
+                if r_dps and str(r_dps.get_value(device)) == str(value):
+                    return True
+        return False
 
     def _active_condition(self, mapping, device, value=None):
         constraint = mapping.get("constraint", self.name)
@@ -905,24 +1030,32 @@ class TuyaDpsConfig:
                     else device.get_property(c_dps.id)
                 )
             )
-            for cond in conditions:
-                if not self.mapping_available(cond, device):
-                    continue
-                if c_val is not None and (_equal_or_in(c_val, cond.get("dps_val"))):
-                    c_match = cond
-                # Case where matching None, need extra checks to ensure we
-                # are not just defaulting and it is really a match
-                elif (
-                    c_val is None
-                    and c_dps is not None
-                    and "dps_val" in cond
-                    and cond.get("dps_val") is None
-                ):
-                    c_match = cond
-                # when changing, another condition may become active
-                # return that if it exists over a current condition
-                if value is not None and value == cond.get("value"):
-                    return cond
+            table = self._mapping_table.conditions(mapping)
+            # when changing, another condition may become active
+            # return that if it exists over a current condition
+            if value is not None:
+                for k in table.value_candidates(value):
+                    cond = conditions[k]
+                    if value == cond.get("value") and self.mapping_available(
+                        cond, device
+                    ):
+                        return cond
+
+            # otherwise the last available condition matching the constraint
+            if c_val is not None:
+                for k in reversed(table.candidates(c_val)):
+                    cond = conditions[k]
+                    if _equal_or_in(
+                        c_val, cond.get("dps_val")
+                    ) and self.mapping_available(cond, device):
+                        return cond
+            # Case where matching None, need extra checks to ensure we
+            # are not just defaulting and it is really a match
+            elif c_dps is not None:
+                for k in reversed(table.none_conds):
+                    cond = conditions[k]
+                    if self.mapping_available(cond, device):
+                        return cond
 
         return c_match
 
@@ -1058,12 +1191,12 @@ class TuyaDpsConfig:
             length = int(len(hex_mask) / 2)
             # Convert to int
             endianness = self.endianness
-            mask_scale = mask & (1 + ~mask)
             current_value = int.from_bytes(self.decoded_value(device), endianness)
+            mask_scale = 1 << self._mask_shift
             result = (current_value & ~mask) | (mask & int(result * mask_scale))
             result = self.encode_value(result.to_bytes(length, endianness))
 
-        dps_map[self.id] = self._correct_type(result)
+        dps_map[self.id] = self._correct_type(result, device)
         return dps_map
 
     def icon_rule(self, device):
@@ -1081,37 +1214,216 @@ class TuyaDpsConfig:
         return {"priority": priority, "icon": icon}
 
 
+def _bits(bitset):
+    """Iterate through the positions of the set bits in bitset."""
+    while bitset:
+        low = bitset & -bitset
+        yield low.bit_length() - 1
+        bitset ^= low
+
+
+class DetectionIndex:
+    """Index of device configs for detecting the type of a device."""
+
+    def __init__(self, configs):
+        """
+        Build the index.
+        Args:
+            configs (iterable): The TuyaDeviceConfigs to detect between.
+
+        Sets of configs are held as bitsets, with bit n standing for the
+        nth config, so that candidates for a device come from a few set
+        operations however many configs there are.
+        """
+        self.configs = ()
+        # product id -> configs listing it
+        self._products = {}
+        # dp id -> {type: configs declaring the dp with that type}
+        self._dp_types = {}
+        # dp id -> configs requiring the dp
+        self._required = {}
+        # per config, the ids of its dps and of its required dps
+        self._declared = []
+        self._required_ids = []
+
+        indexed = []
+        for cfg in configs:
+            try:
+                dps = list(cfg._get_all_dps())
+                products = [
+                    p.get("id", "MISSING_ID!?!")
+                    for p in cfg._config.get("products", [])
+                ]
+                declared = frozenset(dp.id for dp in dps)
+                required = frozenset(dp.id for dp in dps if not dp.optional)
+                types = {(dp.id, dp.type) for dp in dps}
+            except (AttributeError, KeyError, TypeError):
+                _LOGGER.error("Parse error in %s", cfg.config)
+                continue
+            bit = 1 << len(indexed)
+            indexed.append(cfg)
+            for product_id in products:
+                self._products[product_id] = self._products.get(product_id, 0) | bit
+            for dp_id, dp_type in types:
+                by_type = self._dp_types.setdefault(dp_id, {})
+                by_type[dp_type] = by_type.get(dp_type, 0) | bit
+            for dp_id in required:
+                self._required[dp_id] = self._required.get(dp_id, 0) | bit
+            self._declared.append(declared)
+            self._required_ids.append(required)
+        self.configs = tuple(indexed)
+        self._all = (1 << len(indexed)) - 1
+
+    def _product_bits(self, product_ids):
+        bitset = 0
+        for product_id in product_ids or []:
+            bitset |= self._products.get(product_id, 0)
+        return bitset
+
+    def _candidate_bits(self, dps, product_bits):
+        """Return the configs that TuyaDeviceConfig.matches would accept."""
+        mistyped = 0
+        for dp_id, value in dps.items():
+            for dp_type, bitset in self._dp_types.get(dp_id, {}).items():
+                try:
+                    if _typematch(dp_type, value):
+                        continue
+                except TypeError:
+                    for i in _bits(bitset & ~mistyped):
+                        _LOGGER.error("Parse error in %s", self.configs[i].config)
+                mistyped |= bitset
+
+        incomplete = 0
+        for dp_id, bitset in self._required.items():
+            if dp_id not in dps:
+                incomplete |= bitset
+
+        for i in _bits(product_bits & mistyped):
+            _LOGGER.warning(
+                "Product matches %s but dps mismatched",
+                self.configs[i].name,
+            )
+        return self._all & ~mistyped & (product_bits | ~incomplete)
+
+    def matches(self, dps, product_ids=None):
+        """Return the configs matching the dps map or product ids."""
+        candidates = self._candidate_bits(dps, self._product_bits(product_ids))
+        return [self.configs[i] for i in _bits(candidates)]
+
+    def scored_matches(self, dps, product_ids=None):
+        """
+        Return the configs matching the dps map or product ids, each paired
+        with the quality TuyaDeviceConfig.match_quality would give it.
+        """
+        product_bits = self._product_bits(product_ids)
+        candidates = self._candidate_bits(dps, product_bits)
+        keys = dps.keys() - {"updated_at"}
+        total = len(keys)
+        scored = []
+        for i in _bits(candidates):
+            product_match = 101 if product_bits >> i & 1 else 0
+            if total < 1 or product_match:
+                quality = product_match
+            elif not self._required_ids[i] <= keys:
+                quality = 0
+            else:
+                quality = round(len(self._declared[i] & keys) * 100 / total)
+            scored.append((self.configs[i], quality))
+        return scored
+
+
 def available_configs():
     """List the available config files."""
+    global _available
     _CONFIG_DIR = dirname(config_dir.__file__)
+    # adding or removing a file changes the directory's modification time
+    mtime = stat(_CONFIG_DIR).st_mtime_ns
+    if _available[0] != mtime:
+        _available = (
+            mtime,
+            [
+                direntry.name
+                for direntry in scandir(_CONFIG_DIR)
+                if direntry.is_file() and fnmatch(direntry.name, "*.yaml")
+            ],
+        )
+    yield from _available[1]
 
-    for direntry in scandir(_CONFIG_DIR):
-        if direntry.is_file() and fnmatch(direntry.name, "*.yaml"):
-            yield direntry.name
+
+def detection_index():
+    """
+    Return the detection index of the available configs, building it again
+    only when a config has been added, removed or changed.
+    """
+    global _detection_index
+    configs = tuple(load_config(cfg) for cfg in available_configs())
+    with _config_cache_lock:
+        index, indexed = _detection_index
+        if indexed != configs:
+            index = DetectionIndex(configs)
+            _detection_index = (index, configs)
+        return index
 
 
 def possible_matches(dps, product_ids=None):
     """Return possible matching configs for a given set of
     dps values and product_ids."""
-    for cfg in available_configs():
-        parsed = TuyaDeviceConfig(cfg)
-        try:
-            if parsed.matches(dps, product_ids):
-                yield parsed
-        except TypeError:
-            _LOGGER.error("Parse error in %s", cfg)
+    yield from detection_index().matches(dps, product_ids)
 
 
-def get_config(conf_type):
+def scored_matches(dps, product_ids=None):
+    """Return possible matching configs for a given set of dps values and
+    product_ids, each paired with its match quality."""
+    return detection_index().scored_matches(dps, product_ids)
+
+
+def load_config(fname):
     """
-    Return a config to use with config_type.
+    Return the config in a file, parsing it only if it is not cached or has
+    changed since it was cached.
     """
+    global _bundle
     _CONFIG_DIR = dirname(config_dir.__file__)
-    fname = conf_type + ".yaml"
     fpath = join(_CONFIG_DIR, fname)
-    if exists(fpath):
-        return TuyaDeviceConfig(fname)
-    else:
+    mtime = stat(fpath).st_mtime_ns
+    with _config_cache_lock:
+        cached = _config_cache.get(fname)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        if _bundle is None:
+            _bundle = load_bundle(_CONFIG_DIR)
+        parsed = TuyaDeviceConfig(fname, _bundled_config(fpath, fname))
+        _config_cache[fname] = (mtime, parsed)
+        return parsed
+
+
+def _bundled_config(fpath, fname):
+    """Return the config from the bundle if it was built from this file."""
+    bundled = _bundle.get(fname)
+    if bundled:
+        with open(fpath, "rb") as f:
+            if source_hash(f.read()) == bundled["hash"]:
+                return bundled["config"]
+        _LOGGER.debug("%s has changed since the config bundle was built", fname)
+    return None
+
+
+def clear_config_cache():
+    """Forget all parsed configs, so they are parsed again when next used."""
+    global _bundle, _detection_index
+    with _config_cache_lock:
+        _config_cache.clear()
+        _bundle = None
+        _detection_index = (None, None)
+
+
+def get_config(conf_type):
+    """
+    Return a config to use with config_type.
+    """
+    try:
+        return load_config(conf_type + ".yaml")
+    except FileNotFoundError:
         return config_for_legacy_use(conf_type)
 
 
@@ -1123,7 +1435,7 @@ def config_for_legacy_use(conf_type):
     the legacy class during the transition period.
     """
     for cfg in available_configs():
-        parsed = TuyaDeviceConfig(cfg)
+        parsed = load_config(cfg)
         if parsed.legacy_type == conf_type:
             return parsed
 
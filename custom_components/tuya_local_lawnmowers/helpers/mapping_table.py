@@ -0,0 +1,233 @@
+"""
+Lookup tables compiled from the value mappings of Tuya Local Lawnmowers dps.
+
+Mappings are searched on every read of a mapped dp, and conditions on every
+read of a mapped dp whose mapping has them.  The tables here narrow those
+searches down to the few entries that could possibly match a value, in the
+order the full search would have met them.  They only narrow the search:
+callers still test each candidate the way the full search would, so entries
+a table cannot index, such as unhashable values, are always offered as
+candidates.
+"""
+
+from bisect import bisect_left
+from collections.abc import Sequence
+from math import inf
+from numbers import Number, Real
+
+
+def _add(table, key, index):
+    """Add index to the entries of key, returning False if key is unusable."""
+    try:
+        entries = table.setdefault(key, [])
+    except TypeError:
+        return False
+    if not entries or entries[-1] != index:
+        entries.append(index)
+    return True
+
+
+def _merge(*indexes):
+    """Merge sequences of indexes into one ascending list without repeats."""
+    return sorted(set().union(*indexes))
+
+
+class MappingTable:
+    """Lookup tables for the mapping of a dp."""
+
+    __slots__ = (
+        "mapping",
+        "_by_dps_val",
+        "_masks",
+        "dps_defaults",
+        "_by_value",
+        "_mirrors",
+        "value_defaults",
+        "_numbers",
+        "_keys",
+        "_conditions",
+    )
+
+    def __init__(self, mapping, bitfield=False):
+        """
+        Compile the tables.
+        Args:
+            mapping (list): The mapping of the dp from its config.
+            bitfield (bool): Whether the dp is a bitfield, whose dps_vals are
+                matched as masks.
+        """
+        self.mapping = mapping
+        # str(dps_val) -> mappings with that dps_val
+        self._by_dps_val = {}
+        # (index, mask) of bitfield mappings
+        self._masks = []
+        # mappings without a dps_val, used when nothing else matches
+        self.dps_defaults = []
+        # str(value) -> mappings with that value, directly or in a condition
+        self._by_value = {}
+        # mappings that can only be matched through the value of another dp
+        self._mirrors = []
+        self.value_defaults = []
+        # (value, index) of mappings with a numeric value
+        self._numbers = []
+        # id(mapping) -> ConditionTable, for the mappings with conditions
+        self._conditions = {}
+
+        sortable = True
+        for i, m in enumerate(mapping):
+            hidden = m.get("hidden", False)
+            if "dps_val" not in m:
+                self.dps_defaults.append(i)
+                if not hidden:
+                    self.value_defaults.append(i)
+            elif bitfield and m["dps_val"]:
+                try:
+                    self._masks.append((i, int(m["dps_val"])))
+                except (TypeError, ValueError):
+                    # can never match
+                    pass
+            else:
+                _add(self._by_dps_val, str(m["dps_val"]), i)
+
+            if "value" in m:
+                if not hidden and m.get("dps_val") is not None:
+                    _add(self._by_value, str(m["value"]), i)
+                    v = m["value"]
+                    if isinstance(v, Number) and v == v:
+                        self._numbers.append((v, i))
+                        sortable = sortable and isinstance(v, Real)
+            elif "value_mirror" in m:
+                self._mirrors.append(i)
+
+            if m.get("conditions"):
+                self._conditions[id(m)] = ConditionTable(m["conditions"])
+            for c in m.get("conditions", {}):
+                if c.get("hidden", False):
+                    continue
+                if "value" in c:
+                    _add(self._by_value, str(c["value"]), i)
+                elif "value_mirror" in c:
+                    self._mirrors.append(i)
+
+        self._mirrors = _merge(self._mirrors)
+        if sortable:
+            self._numbers.sort()
+            self._keys = [v for v, _ in self._numbers]
+        else:
+            self._keys = None
+
+    def dps_candidates(self, value):
+        """Return the mappings that may match a value from the device."""
+        found = self._by_dps_val.get(str(value), ())
+        if self._masks:
+            try:
+                v = int(value)
+            except (TypeError, ValueError):
+                return found
+            masked = [i for i, mask in self._masks if v & mask]
+            if masked:
+                return _merge(found, masked)
+        return found
+
+    def value_candidates(self, value):
+        """Return the mappings that may be selected by setting a value."""
+        found = self._by_value.get(str(value), ())
+        if self._mirrors:
+            return _merge(found, self._mirrors)
+        return found
+
+    def nearest(self, value):
+        """
+        Iterate through the numeric mappings nearest to value, in groups of
+        equal distance from it, each group in mapping order.
+        """
+        if not isinstance(value, Number) or not self._numbers:
+            return
+        if self._keys is None or not isinstance(value, Real):
+            distances = {}
+            for v, i in self._numbers:
+                d = abs(v - value)
+                if d < inf:
+                    distances.setdefault(d, []).append(i)
+            for d in sorted(distances):
+                yield distances[d]
+            return
+
+        numbers = self._numbers
+        left = bisect_left(self._keys, value) - 1
+        right = left + 1
+        while True:
+            d_left = abs(numbers[left][0] - value) if left >= 0 else inf
+            d_right = abs(numbers[right][0] - value) if right < len(numbers) else inf
+            d = min(d_left, d_right)
+            if not d < inf:
+                return
+            group = []
+            while left >= 0 and abs(numbers[left][0] - value) == d:
+                group.append(numbers[left][1])
+                left -= 1
+            while right < len(numbers) and abs(numbers[right][0] - value) == d:
+                group.append(numbers[right][1])
+                right += 1
+            yield sorted(group)
+
+    def conditions(self, mapping):
+        """Return the ConditionTable for the conditions of a mapping."""
+        table = self._conditions.get(id(mapping))
+        if table is None:
+            # a mapping from elsewhere, so build a table to use just this once
+            table = ConditionTable(mapping.get("conditions", []))
+        return table
+
+
+class ConditionTable:
+    """Lookup tables for the conditions of a mapping."""
+
+    __slots__ = ("_by_dps_val", "_irregular", "none_conds", "_by_value", "_all")
+
+    def __init__(self, conditions):
+        # dps_val -> conditions matching it
+        self._by_dps_val = {}
+        # conditions whose dps_val cannot be indexed
+        self._irregular = []
+        # conditions that match a dp without a value
+        self.none_conds = []
+        # value -> conditions with that value
+        self._by_value = {}
+        self._all = range(len(conditions))
+
+        indexed_values = True
+        for k, c in enumerate(conditions):
+            dps_val = c.get("dps_val")
+            if "dps_val" in c and dps_val is None:
+                self.none_conds.append(k)
+            if isinstance(dps_val, (list, tuple)):
+                if not all([_add(self._by_dps_val, v, k) for v in dps_val]):
+                    self._irregular.append(k)
+            elif isinstance(dps_val, Sequence) and not isinstance(dps_val, str):
+                self._irregular.append(k)
+            elif not _add(self._by_dps_val, dps_val, k):
+                self._irregular.append(k)
+            if "value" in c:
+                indexed_values = _add(self._by_value, c["value"], k) and indexed_values
+        if not indexed_values:
+            self._by_value = None
+
+    def candidates(self, dps_val):
+        """Return the conditions that may match a value of the constraint."""
+        try:
+            found = self._by_dps_val.get(dps_val, ())
+        except TypeError:
+            return self._all
+        if self._irregular:
+            return _merge(found, self._irregular)
+        return found
+
+    def value_candidates(self, value):
+        """Return the conditions that may have a value."""
+        if self._by_value is None:
+            return self._all
+        try:
+            return self._by_value.get(value, ())
+        except TypeError:
+            return self._all
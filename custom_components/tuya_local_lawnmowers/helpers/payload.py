@@ -0,0 +1,198 @@
+"""
+Decoders for the structured payloads carried by Tuya Local Lawnmowers dps.
+
+Mowers report their schedule, work log and zones as strings holding a JSON
+document, sometimes wrapped in base64, which can run to a few kilobytes and
+rarely change.  The decoders here turn such a string into a tuple of records,
+one per schedule slot, work session or zone.
+
+Decoding is keyed on the raw string alone, so a payload is decoded the first
+time it is read and not again until the device sends a different one, however
+many entities or devices read it in between.  Records are shared between
+readers and must not be modified.
+"""
+
+import json
+import logging
+from base64 import b64decode
+from datetime import datetime
+from functools import lru_cache
+
+_LOGGER = logging.getLogger(__name__)
+
+# Different payloads kept decoded, across all devices
+_CACHE_SIZE = 64
+
+# Keys that may hold the start and end of a work session
+_START_KEYS = ("start", "startTime", "start_time", "begin", "beginTime")
+_END_KEYS = ("end", "endTime", "end_time", "stop", "stopTime")
+
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class Payload:
+    """The records decoded from a payload."""
+
+    __slots__ = ("records", "attribute", "raw")
+
+    def __init__(self, records, attribute, raw=None):
+        """
+        Args:
+            records (tuple): the decoded records, or None if the payload
+                could not be decoded.
+            attribute (str): the name to expose the records under.
+            raw (str): the payload, kept only when it could not be decoded.
+        """
+        self.records = records
+        self.attribute = attribute
+        self.raw = raw
+
+    @property
+    def summary(self):
+        """Return the number of records, or None if there are none."""
+        return None if self.records is None else len(self.records)
+
+    @property
+    def attributes(self):
+        """Return the state attributes describing the payload."""
+        if self.records is None:
+            return {"raw": self.raw}
+        return {self.attribute: list(self.records)}
+
+
+def _parse(raw):
+    """Return the document in a JSON payload, which may be base64 encoded."""
+    try:
+        return json.loads(raw)
+    except ValueError:
+        pass
+    try:
+        return json.loads(b64decode(raw, validate=True).decode("utf-8"))
+    except ValueError:
+        raise ValueError("neither JSON nor base64 encoded JSON") from None
+
+
+def _as_record(item):
+    return dict(item) if isinstance(item, dict) else {"value": item}
+
+
+def _records(doc, index_key=None):
+    """
+    Split a document into records.
+
+    A list gives a record per item, and an object of several equally long
+    lists, as used for parallel arrays of settings, a record per position,
+    numbered under index_key if given.  An object holding a single list gives
+    the records of that list, and any other document is a record of its own.
+    """
+    if isinstance(doc, list):
+        return tuple(_as_record(item) for item in doc)
+    if isinstance(doc, dict) and doc:
+        lists = [v for v in doc.values() if isinstance(v, list)]
+        lengths = {len(v) for v in lists}
+        if len(lists) == len(doc) > 1 and len(lengths) == 1:
+            records = []
+            for n in range(lengths.pop()):
+                record = {index_key: n + 1} if index_key else {}
+                record.update((k, v[n]) for k, v in doc.items())
+                records.append(record)
+            return tuple(records)
+        if len(lists) == 1:
+            return tuple(_as_record(item) for item in lists[0])
+    return (_as_record(doc),)
+
+
+def _first(record, keys):
+    for key in keys:
+        if key in record:
+            return record[key]
+    return None
+
+
+def _time_of_day(value):
+    """Return the seconds since midnight of an H:MM[:SS] string, or None."""
+    try:
+        parts = [int(p) for p in value.split(":")]
+    except (AttributeError, ValueError):
+        return None
+    if len(parts) not in (2, 3):
+        return None
+    hours, minutes, seconds = parts + [0] * (3 - len(parts))
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def _timestamp(value):
+    """Return a number or ISO 8601 date and time in seconds, or None."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _duration(start, end):
+    """Return the seconds from start to end, or None if unknown."""
+    s = _time_of_day(start)
+    e = _time_of_day(end)
+    if s is not None and e is not None:
+        # a session may run past midnight
+        return (e - s) % _SECONDS_PER_DAY
+    s = _timestamp(start)
+    e = _timestamp(end)
+    if s is None or e is None or e < s:
+        return None
+    return e - s
+
+
+def _schedule(doc):
+    return _records(doc, "slot")
+
+
+def _work_log(doc):
+    sessions = []
+    for record in _records(doc, "session"):
+        start = _first(record, _START_KEYS)
+        end = _first(record, _END_KEYS)
+        if start is not None and "start" not in record:
+            record["start"] = start
+        if end is not None and "end" not in record:
+            record["end"] = end
+        duration = _duration(start, end)
+        if duration is not None and "duration" not in record:
+            record["duration"] = duration
+        sessions.append(record)
+    return tuple(sessions)
+
+
+def _zones(doc):
+    return _records(doc, "zone")
+
+
+# decoder name -> (attribute the records are exposed as, decoding function)
+DECODERS = {
+    "schedule": ("slots", _schedule),
+    "work_log": ("sessions", _work_log),
+    "zones": ("zones", _zones),
+}
+
+
+def attribute_names(decoder):
+    """Return the names of the attributes a decoder's payloads may have."""
+    return (DECODERS[decoder][0], "raw")
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def decode_payload(decoder, raw):
+    """
+    Return the Payload decoded from a raw string.
+    Args:
+        decoder (str): the name of the decoder, from DECODERS.
+        raw (str): the payload as received from the device.
+    """
+    attribute, decode = DECODERS[decoder]
+    try:
+        return Payload(decode(_parse(raw)), attribute)
+    except ValueError as e:
+        _LOGGER.debug("Could not decode %s payload: %s", decoder, e)
+        return Payload(None, attribute, raw)
@@ -0,0 +1,123 @@
+"""
+Adaptive polling schedule for Tuya Local Lawnmowers devices.
+"""
+
+from collections import deque
+from time import time
+
+# Activities during which the state of a mower changes quickly
+ACTIVE_ACTIVITIES = {"mowing", "fixed mowing", "returning"}
+# Activities during which a mower can be expected to sit still for hours
+RESTING_ACTIVITIES = {
+    "standby",
+    "charging",
+    "charging with queued task",
+    "docked",
+    "locked",
+}
+
+DEFAULT_MIN_POLL_INTERVAL = 10
+DEFAULT_MAX_POLL_INTERVAL = 300
+# Interval used when the activity is unknown or neither active nor resting,
+# matching the cache timeout that was used for all devices before.
+DEFAULT_POLL_INTERVAL = 30
+
+# Window over which changes reported by the device are counted
+CHANGE_WINDOW = 300
+# Number of consecutive failures after which backing off stops growing
+MAX_BACKOFF_FAILURES = 4
+
+
+class PollScheduler(object):
+    def __init__(
+        self,
+        min_interval=DEFAULT_MIN_POLL_INTERVAL,
+        max_interval=DEFAULT_MAX_POLL_INTERVAL,
+    ):
+        """
+        Decides how often a device is polled.
+
+        The interval is chosen from the mower's activity, shortened when
+        the device has recently been reporting changes and lengthened while
+        the connection to it is failing.
+
+        Args:
+            min_interval (number): Shortest time between polls in seconds.
+            max_interval (number): Longest time between polls in seconds.
+        """
+        self.min_interval = min(min_interval, max_interval)
+        self.max_interval = max(min_interval, max_interval)
+        self._activity = None
+        self._changes = deque()
+        self._failures = 0
+
+    def set_activity(self, activity):
+        self._activity = activity
+
+    def record_changes(self, count, now=None):
+        """Record that the device reported count changed dps."""
+        if count <= 0:
+            return
+        now = time() if now is None else now
+        self._changes.extend([now] * count)
+        self._expire_changes(now)
+
+    def record_success(self):
+        self._failures = 0
+
+    def record_failure(self):
+        self._failures += 1
+
+    def _expire_changes(self, now):
+        while self._changes and now - self._changes[0] > CHANGE_WINDOW:
+            self._changes.popleft()
+
+    def _clamp(self, interval):
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    @property
+    def mode(self):
+        if self._activity in ACTIVE_ACTIVITIES:
+            return "active"
+        if self._activity in RESTING_ACTIVITIES:
+            return "resting"
+        return "normal"
+
+    def change_rate(self, now=None):
+        """Return the number of changes per minute over the recent window."""
+        self._expire_changes(time() if now is None else now)
+        return len(self._changes) * 60 / CHANGE_WINDOW
+
+    def poll_interval(self, now=None):
+        """Return how long the device may stay quiet before it is polled."""
+        mode = self.mode
+        if mode == "active":
+            interval = self.min_interval
+        elif mode == "resting":
+            interval = self.max_interval
+        else:
+            interval = DEFAULT_POLL_INTERVAL
+        # A device reporting changes is likely to have more to report soon
+        interval = interval / (1 + self.change_rate(now))
+        # A device that is not answering will not answer sooner for being
+        # asked more often
+        interval = interval * 2 ** min(self._failures, MAX_BACKOFF_FAILURES)
+        return self._clamp(interval)
+
+    def full_poll_interval(self, now=None):
+        """Return how often to ask for all dps rather than the forced dps."""
+        return self._clamp(2 * self.poll_interval(now))
+
+    def as_dict(self):
+        """Describe the current schedule for diagnostics."""
+        now = time()
+        return {
+            "activity": self._activity,
+            "mode": self.mode,
+            "poll_interval": round(self.poll_interval(now), 1),
+            "full_poll_interval": round(self.full_poll_interval(now), 1),
+            "change_rate": round(self.change_rate(now), 2),
+            "failures": self._failures,
+            "min_interval": self.min_interval,
+            "max_interval": self.max_interval,
+        }
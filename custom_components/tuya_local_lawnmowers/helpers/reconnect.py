@@ -0,0 +1,135 @@
+"""
+Reconnection supervision for Tuya Local Lawnmowers devices.
+"""
+
+import asyncio
+import random
+from time import time
+
+# Circuit breaker states
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+# Delay before retrying after the first failure, doubling with each further
+# failure up to the maximum
+BASE_RETRY_DELAY = 5
+MAX_RETRY_DELAY = 600
+# Consecutive failures after which the device is treated as offline
+FAILURE_THRESHOLD = 3
+# Seconds between reachability checks while the device is offline
+REACHABILITY_INTERVAL = 30
+REACHABILITY_TIMEOUT = 2
+
+
+class ReconnectSupervisor(object):
+    def __init__(
+        self,
+        base_delay=BASE_RETRY_DELAY,
+        max_delay=MAX_RETRY_DELAY,
+        failure_threshold=FAILURE_THRESHOLD,
+    ):
+        """
+        Decides when to try connecting to a device again after failures.
+
+        Retries are spaced out exponentially, with random jitter so that
+        devices that failed together do not retry together.  After enough
+        consecutive failures the circuit breaker opens, and no attempts are
+        made until the retry delay has passed or the device is found to be
+        reachable again, when a single trial attempt is allowed (half open).
+
+        Args:
+            base_delay (number): Seconds to wait after the first failure.
+            max_delay (number): The longest wait between attempts.
+            failure_threshold (int): Consecutive failures that open the
+                circuit breaker.
+        """
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._threshold = failure_threshold
+        self._failures = 0
+        self._state = BREAKER_CLOSED
+        self._retry_at = 0
+        self._opened_at = None
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def is_open(self):
+        return self._state == BREAKER_OPEN
+
+    def backoff(self):
+        """Return the jittered delay before the next attempt."""
+        if not self._failures:
+            return 0
+        delay = min(
+            self._max_delay,
+            self._base_delay * 2 ** (self._failures - 1),
+        )
+        # keep at least half the delay, so retries stay spaced out
+        return random.uniform(delay / 2, delay)
+
+    def record_success(self):
+        """Record a successful exchange, returning True if the state changed."""
+        changed = self._state != BREAKER_CLOSED
+        self._failures = 0
+        self._state = BREAKER_CLOSED
+        self._opened_at = None
+        self._retry_at = 0
+        return changed
+
+    def record_failure(self, now=None):
+        """Record a failed attempt, returning True if the breaker opened."""
+        now = time() if now is None else now
+        self._failures += 1
+        self._retry_at = now + self.backoff()
+        if self._state != BREAKER_OPEN and (
+            self._state == BREAKER_HALF_OPEN or self._failures >= self._threshold
+        ):
+            self._state = BREAKER_OPEN
+            self._opened_at = now
+            return True
+        return False
+
+    def retry_delay(self, now=None):
+        """Return the seconds left before another attempt should be made."""
+        now = time() if now is None else now
+        return max(0, self._retry_at - now)
+
+    def allow_attempt(self, now=None):
+        """Return whether a connection attempt may be made now."""
+        if self._state == BREAKER_OPEN:
+            if self.retry_delay(now) > 0:
+                return False
+            self._state = BREAKER_HALF_OPEN
+        return True
+
+    def reachable(self):
+        """The device has been seen on the network, so try it now."""
+        if self._state == BREAKER_OPEN:
+            self._state = BREAKER_HALF_OPEN
+            self._retry_at = 0
+
+    def as_dict(self):
+        """Describe the current state for diagnostics."""
+        return {
+            "state": self._state,
+            "failures": self._failures,
+            "retry_in": round(self.retry_delay(), 1),
+            "opened_at": self._opened_at,
+        }
+
+
+async def async_reachable(address, port, timeout=REACHABILITY_TIMEOUT):
+    """Return whether a TCP connection can be made to a device."""
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(address, port),
+            timeout,
+        )
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
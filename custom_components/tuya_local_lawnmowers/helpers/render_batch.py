@@ -0,0 +1,110 @@
+"""
+Batched state writes for the entities of Tuya Local Lawnmowers devices.
+"""
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+# Milliseconds to collect entities needing a state write before writing
+# them, with 0 writing them on the next pass of the event loop
+DEFAULT_RENDER_WINDOW = 0
+
+
+def _rendered(entity):
+    """Return what Home Assistant would write as the state of an entity."""
+    if not entity.available:
+        return (False,)
+    return (
+        True,
+        entity.state,
+        entity.icon,
+        entity.capability_attributes,
+        entity.state_attributes,
+        entity.extra_state_attributes,
+    )
+
+
+class RenderBatch:
+    def __init__(self, hass, window=DEFAULT_RENDER_WINDOW):
+        """
+        Entities waiting for their state to be written to Home Assistant.
+
+        Entities marked while a batch is waiting join it, so a burst of
+        updates writes each entity once.  When the batch is written, the
+        state and attributes of each entity are compared with those it last
+        wrote, and entities that would write the same again are skipped.
+
+        Args:
+            hass (HomeAssistant): The Home Assistant instance.
+            window (number): Milliseconds to wait before writing a batch.
+        """
+        self._hass = hass
+        self._window = window / 1000
+        self._dirty = {}
+        self._written = {}
+        self._handle = None
+        # writes saved by joining an entity already waiting, or by finding
+        # nothing has changed
+        self.coalesced = 0
+        self.suppressed = 0
+        self.flushes = 0
+        self.writes = 0
+
+    def mark(self, entities):
+        """Write the state of the entities with the next batch."""
+        for entity in entities:
+            if entity in self._dirty:
+                self.coalesced += 1
+            else:
+                self._dirty[entity] = True
+        if self._dirty and self._handle is None:
+            loop = self._hass.loop
+            self._handle = (
+                loop.call_later(self._window, self.flush)
+                if self._window
+                else loop.call_soon(self.flush)
+            )
+
+    def flush(self):
+        """Write the states of the entities waiting, if they have changed."""
+        self._handle = None
+        dirty = self._dirty
+        self._dirty = {}
+        if dirty:
+            self.flushes += 1
+        for entity in dirty:
+            try:
+                entity.prepare_state_write()
+                rendered = _rendered(entity)
+                if self._written.get(entity) == rendered:
+                    self.suppressed += 1
+                    continue
+                entity.async_write_ha_state()
+                self._written[entity] = rendered
+                self.writes += 1
+            except Exception:
+                _LOGGER.exception("Failed to write the state of %s", entity)
+
+    def forget(self, entity):
+        """Drop an entity that is going away."""
+        self._dirty.pop(entity, None)
+        self._written.pop(entity, None)
+
+    def cancel(self):
+        """Drop the waiting batch."""
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+        self._dirty = {}
+
+    def as_dict(self):
+        """Describe the batching of state writes for diagnostics."""
+        return {
+            "window_ms": round(self._window * 1000),
+            "waiting": len(self._dirty),
+            "flushes": self.flushes,
+            "writes": self.writes,
+            "suppressed": self.suppressed,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,143 @@
+"""
+Staggered startup of Tuya Local Lawnmowers devices.
+
+When Home Assistant starts, every entry is set up at once, and every receive
+loop starts as soon as Home Assistant has started.  With dozens of devices
+that is a burst of handshakes and executor jobs all timing each other out.
+The startup queue lets a few devices connect at a time, those seen most
+recently first, and spreads the start of receive loops over a few seconds.
+"""
+
+import logging
+import random
+from contextlib import asynccontextmanager
+from heapq import heappop, heappush
+from itertools import count
+from time import monotonic
+
+from homeassistant.core import HomeAssistant, callback
+
+from ..const import DATA_CONNECTION_PROFILES, DATA_STARTUP_QUEUE, DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+# Devices connecting for their setup at the same time
+MAX_CONCURRENT_SETUPS = 4
+# Longest delay in seconds before a receive loop starts with Home Assistant
+MAX_START_JITTER = 2.0
+
+
+class StartupQueue(object):
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        limit=MAX_CONCURRENT_SETUPS,
+        jitter=MAX_START_JITTER,
+    ):
+        """
+        Turns for devices to connect while they are being set up,
+        or first connect after showing a saved state.
+
+        Args:
+            hass (HomeAssistant): The Home Assistant instance.
+            limit (int): Devices allowed to hold a turn at the same time.
+            jitter (number): Longest delay in seconds for start_delay.
+        """
+        self._hass = hass
+        self._limit = limit
+        self._jitter = jitter
+        self._active = 0
+        # (priority, arrival, future) of devices waiting for a turn
+        self._waiting = []
+        self._arrivals = count()
+        self._dispatch = None
+        # device id -> (seconds waited, seconds taken)
+        self._timings = {}
+
+    def _priority(self, device_id):
+        """Sort key putting the devices that answered most recently first."""
+        profiles = self._hass.data.get(DOMAIN, {}).get(DATA_CONNECTION_PROFILES)
+        profile = profiles.get(device_id) if profiles else None
+        last_success = profile.get("last_success") if profile else None
+        return -(last_success or 0)
+
+    async def _acquire(self, device_id):
+        future = self._hass.loop.create_future()
+        heappush(
+            self._waiting,
+            (self._priority(device_id), next(self._arrivals), future),
+        )
+        if not self._dispatch:
+            # devices arriving on the same pass of the loop are sorted
+            # together, rather than the first few taking the turns
+            self._dispatch = self._hass.loop.call_soon(self._hand_out)
+        try:
+            await future
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # the turn was handed over as the wait was cancelled
+                self._release()
+            raise
+
+    @callback
+    def _hand_out(self):
+        self._dispatch = None
+        while self._waiting and self._active < self._limit:
+            future = heappop(self._waiting)[2]
+            if not future.done():
+                self._active += 1
+                future.set_result(None)
+
+    def _release(self):
+        self._active -= 1
+        self._hand_out()
+
+    @asynccontextmanager
+    async def turn(self, device_id, name):
+        """
+        Wait for a turn to connect, and hold it until the block is done.
+
+        Args:
+            device_id (str): The device id, to look up when it last answered.
+            name (str): The device name, for logging.
+        """
+        queued = monotonic()
+        await self._acquire(device_id)
+        started = monotonic()
+        try:
+            yield
+        finally:
+            self._release()
+            done = monotonic()
+            self._timings[device_id] = (started - queued, done - started)
+            _LOGGER.debug(
+                "%s connected in %.2fs after waiting %.2fs for its turn",
+                name,
+                done - started,
+                started - queued,
+            )
+
+    def start_delay(self):
+        """Return a random delay in seconds for a receive loop to start."""
+        return random.uniform(0, self._jitter)
+
+    def timings(self, device_id):
+        """Return how long a device waited for its turn and took with it."""
+        waited, took = self._timings.get(device_id, (None, None))
+        return {"waited": waited, "took": took}
+
+    def as_dict(self):
+        return {
+            "limit": self._limit,
+            "active": self._active,
+            "waiting": sum(1 for w in self._waiting if not w[2].done()),
+        }
+
+
+def get_startup_queue(hass: HomeAssistant):
+    """Return the startup queue shared by all entries."""
+    data = hass.data.setdefault(DOMAIN, {})
+    queue = data.get(DATA_STARTUP_QUEUE)
+    if queue is None:
+        queue = data[DATA_STARTUP_QUEUE] = StartupQueue(hass)
+    return queue
@@ -0,0 +1,101 @@
+"""
+Persisted last known state of Tuya Local Lawnmowers devices.
+
+The state each device last reported is saved, so that after a restart its
+entities can show it straight away, marked as stale, instead of waiting for
+the device to answer.  A mower out of range when Home Assistant starts then
+no longer holds up the setup of its entry.
+"""
+
+import asyncio
+from time import time
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from ..const import DATA_STATE_SNAPSHOTS, DOMAIN
+
+STORAGE_KEY = f"{DOMAIN}.state_snapshots"
+STORAGE_VERSION = 1
+# Seconds between saves while devices are reporting changes.  Anything not
+# yet saved is written when Home Assistant stops.
+SAVE_DELAY = 300
+
+
+class StateSnapshots(object):
+    def __init__(self, hass: HomeAssistant):
+        """
+        The last known state of all devices, keyed by device id.
+
+        Args:
+            hass (HomeAssistant): The Home Assistant instance.
+        """
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._snapshots = {}
+        # device id -> (state, dp ids not to save), turned into snapshots
+        # when they are saved
+        self._live = {}
+        self._save_pending = False
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    async def async_load(self):
+        async with self._load_lock:
+            if not self._loaded:
+                self._snapshots = await self._store.async_load() or {}
+                self._loaded = True
+
+    def _data_to_save(self):
+        self._save_pending = False
+        for device_id, (state, excluded) in self._live.items():
+            self._snapshots[device_id] = {
+                "dps": {
+                    k: v
+                    for k, v in state.items()
+                    if k != "updated_at" and k not in excluded
+                },
+                "saved_at": state.get("updated_at") or time(),
+            }
+        self._live.clear()
+        return self._snapshots
+
+    def get(self, device_id):
+        """Return the snapshot of a device, or None if it has none."""
+        if device_id in self._live:
+            self._data_to_save()
+        return self._snapshots.get(device_id)
+
+    def record(self, device_id, state, excluded=()):
+        """
+        Record the state of a device, to be saved with the next save.
+
+        Args:
+            device_id (str): The device id.
+            state (dict): The dps of the device, by id.  The dict is read
+                when saving, so changes made to it until then are saved too.
+            excluded (set): Ids of dps not to save.
+        """
+        self._live[device_id] = (state, excluded)
+        if not self._save_pending:
+            # changes until the save are written along with it, rather than
+            # putting it off again
+            self._save_pending = True
+            self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    def remove(self, device_id):
+        """Forget the snapshot of a device that has been removed."""
+        self._live.pop(device_id, None)
+        if self._snapshots.pop(device_id, None) is not None:
+            self._save_pending = True
+            self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+
+async def async_get_state_snapshots(hass: HomeAssistant):
+    """Return the state snapshots, loading them on first use."""
+    data = hass.data.setdefault(DOMAIN, {})
+    snapshots = data.get(DATA_STATE_SNAPSHOTS)
+    if snapshots is None:
+        # entries set up at the same time must share the same instance
+        snapshots = data[DATA_STATE_SNAPSHOTS] = StateSnapshots(hass)
+    await snapshots.async_load()
+    return snapshots
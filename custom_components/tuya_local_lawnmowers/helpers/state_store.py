@@ -0,0 +1,108 @@
+"""
+Versioned state for Tuya Local Lawnmowers devices.
+"""
+
+from itertools import count
+
+# Versions are shared by all stores, so a change anywhere takes a number no
+# store has had before, and the highest version seen so far identifies the
+# state of several stores at once.
+_next_version = count(1).__next__
+
+
+class VersionedDict(dict):
+    def __init__(self, *args, **kwargs):
+        """
+        A dict that takes a new version every time it is changed.
+
+        The version lets views built from its contents be reused until the
+        next change, instead of being rebuilt on every read.
+        """
+        super().__init__(*args, **kwargs)
+        self.version = _next_version()
+
+    def _changed(self):
+        self.version = _next_version()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed()
+
+    def __ior__(self, other):
+        super().__ior__(other)
+        self._changed()
+        return self
+
+    def pop(self, key, *default):
+        if key in self:
+            self._changed()
+        return super().pop(key, *default)
+
+    def popitem(self):
+        item = super().popitem()
+        self._changed()
+        return item
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self._changed()
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._changed()
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+
+class DecodeCache:
+    def __init__(self):
+        """
+        Results worked out from the state of a device, such as decoded dp
+        values, kept until the state version changes.
+
+        Rendering the state of a device reads the same dps many times over,
+        through different entities and attributes, and each read runs
+        mapping and condition resolution again.
+        """
+        self._version = None
+        self._results = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, version, key, compute, *args):
+        """
+        Return the result for key at a state version, calling compute(*args)
+        for it only the first time.
+        """
+        if version != self._version:
+            self._results.clear()
+            self._version = version
+        try:
+            result = self._results[key]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            return result
+        self.misses += 1
+        result = compute(*args)
+        # the state may have moved on while computing, if pending
+        # updates expired in the meantime
+        if self._version == version:
+            self._results[key] = result
+        return result
+
+    def as_dict(self):
+        """Return the counters for diagnostics."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._results),
+        }
@@ -0,0 +1,103 @@
+"""
+Throttling of the values shown by chatty Tuya Local Lawnmowers entities.
+"""
+
+from numbers import Real
+
+# Seconds a value held back by the deadband waits for the next report,
+# when the entity has no min_interval, before it is shown anyway
+QUIET_PERIOD = 60
+
+_UNSET = object()
+
+
+def _number(value):
+    return isinstance(value, Real) and not isinstance(value, bool)
+
+
+class Throttle:
+    """The value shown by an entity, and the newer value held back."""
+
+    __slots__ = (
+        "deadband",
+        "min_interval",
+        "thresholds",
+        "_shown",
+        "_shown_at",
+        "_held",
+        "_held_at",
+    )
+
+    def __init__(self, deadband=None, min_interval=None, thresholds=()):
+        """
+        Args:
+            deadband (number): Smallest change in value worth showing.
+            min_interval (number): Shortest time in seconds between changes
+                of the value shown.
+            thresholds (list): Values whose crossing is always shown.
+        """
+        self.deadband = deadband
+        self.min_interval = min_interval
+        self.thresholds = tuple(thresholds)
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config):
+        """Return the Throttle an entity config asks for, or None."""
+        if config.deadband is None and config.min_interval is None:
+            return None
+        return cls(config.deadband, config.min_interval, config.thresholds)
+
+    def reset(self):
+        """Show the next value whatever it is."""
+        self._shown = _UNSET
+        self._shown_at = None
+        self._held = _UNSET
+        self._held_at = None
+
+    def shown(self, default=None):
+        """Return the value shown, or default if nothing has been shown yet."""
+        return default if self._shown is _UNSET else self._shown
+
+    def filter(self, value, now):
+        """Return the value to show, given the latest value at time now."""
+        if value == self._shown:
+            self._held = _UNSET
+        elif self._worth_showing(value, now):
+            self._shown = value
+            self._shown_at = now
+            self._held = _UNSET
+        elif value != self._held:
+            self._held = value
+            self._held_at = now
+        return self._shown
+
+    def _worth_showing(self, value, now):
+        shown = self._shown
+        if not (_number(value) and _number(shown)):
+            return True
+        for t in self.thresholds:
+            if (shown < t) != (value < t):
+                return True
+        if self.min_interval and now - self._shown_at < self.min_interval:
+            return False
+        return not (self.deadband and abs(value - shown) < self.deadband)
+
+    def release_at(self):
+        """Return when the value held back is due to be shown, or None."""
+        if self._held is _UNSET:
+            return None
+        due = self._shown_at + (self.min_interval or 0)
+        if self.deadband and abs(self._held - self._shown) < self.deadband:
+            due = max(due, self._held_at + (self.min_interval or QUIET_PERIOD))
+        return due
+
+    def release(self, now):
+        """Show the value held back if it is due, returning whether it was."""
+        due = self.release_at()
+        if due is None or now < due:
+            return False
+        self._shown = self._held
+        self._shown_at = now
+        self._held = _UNSET
+        return True
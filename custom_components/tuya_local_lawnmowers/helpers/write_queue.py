@@ -0,0 +1,100 @@
+"""
+Values written to Tuya Local Lawnmowers devices, waiting to be confirmed.
+"""
+
+import heapq
+from time import time
+
+from .state_store import VersionedDict
+
+# Milliseconds to merge writes from all entities into a single message
+DEFAULT_WRITE_FLUSH_WINDOW = 100
+# Seconds a sent value overrides the cached state, while waiting for the
+# device to report it
+PENDING_UPDATE_TIMEOUT = 5
+
+
+class PendingUpdates(VersionedDict):
+    def __init__(self, updates=None, timeout=PENDING_UPDATE_TIMEOUT):
+        """
+        Values written to a device, by dp id.
+
+        Each entry is a dict of the "value", whether it has been "sent" and
+        when it was last "updated_at".  Entries that have not been sent are
+        kept until they are, sent entries until the device reports the value
+        or the timeout passes.  Expiry times are kept in a heap, so checking
+        for expired entries does not need to look at them all.
+
+        Args:
+            updates (dict): Initial entries.
+            timeout (number): Seconds to keep sent entries.
+        """
+        super().__init__()
+        self._timeout = timeout
+        self._expiry = []
+        for key, info in (updates or {}).items():
+            self[key] = info
+
+    def __setitem__(self, key, info):
+        super().__setitem__(key, info)
+        if info["sent"]:
+            self._schedule_expiry(key, info)
+
+    def _schedule_expiry(self, key, info):
+        heapq.heappush(
+            self._expiry,
+            (info.get("updated_at", 0) + self._timeout, key),
+        )
+
+    def add(self, properties, now=None):
+        """Add values to be sent."""
+        now = time() if now is None else now
+        for key, value in properties.items():
+            self[key] = {"value": value, "updated_at": now, "sent": False}
+
+    def mark_sent(self, properties, now=None):
+        """Record that the given values have been sent."""
+        now = time() if now is None else now
+        for key, value in properties.items():
+            info = self.get(key)
+            # a newer value written while sending still needs sending
+            if info and info["value"] == value:
+                info["updated_at"] = now
+                info["sent"] = True
+                self._schedule_expiry(key, info)
+
+    def expire(self, now=None):
+        """Drop sent entries that have timed out, returning self."""
+        if not self._expiry:
+            return self
+        now = time() if now is None else now
+        while self._expiry and self._expiry[0][0] <= now:
+            _, key = heapq.heappop(self._expiry)
+            info = self.get(key)
+            # the entry may have been replaced or resent since
+            if (
+                info
+                and info["sent"]
+                and info.get("updated_at", 0) + self._timeout <= now
+            ):
+                del self[key]
+        return self
+
+    def confirm(self, data):
+        """Drop sent entries whose value the device has reported."""
+        for key, value in data.items():
+            info = self.get(key)
+            if info and info["sent"] and info["value"] == value:
+                del self[key]
+
+    def pending_values(self):
+        """Return the values that override the cached state, by dp id."""
+        return {key: info["value"] for key, info in self.expire().items()}
+
+    def unsent(self):
+        """Return the values not yet sent, in dp order."""
+        return {
+            key: info["value"]
+            for key, info in sorted(self.expire().items(), key=lambda x: int(x[0]))
+            if not info["sent"]
+        }
@@ -0,0 +1,186 @@
+"""
+Single owner of the tinytuya connection to a device.
+
+tinytuya's socket is not safe to use from more than one thread, but polling,
+receiving, heartbeats and commands were each run as separate executor jobs,
+so a command could be written to the socket in the middle of a receive.
+Here every operation on the connection is queued, and one task runs them in
+turn.  A receive waiting for the device is cut short when anything else is
+queued, so commands do not wait for the socket timeout.
+"""
+
+import asyncio
+import select
+import socket
+from time import monotonic
+
+
+def _operation_name(func):
+    # partials are named after the function they wrap
+    func = getattr(func, "func", func)
+    return getattr(func, "__name__", type(func).__name__).lstrip("_")
+
+
+class _OperationStats(object):
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.wait = 0
+        self.max_wait = 0
+        self.run = 0
+        self.max_run = 0
+
+    def record(self, wait, run, error):
+        self.count += 1
+        self.errors += error
+        self.wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.run += run
+        self.max_run = max(self.max_run, run)
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_wait_ms": round(1000 * self.wait / self.count, 1),
+            "max_wait_ms": round(1000 * self.max_wait, 1),
+            "avg_run_ms": round(1000 * self.run / self.count, 1),
+            "max_run_ms": round(1000 * self.max_run, 1),
+        }
+
+
+class TuyaIOWorker(object):
+    def __init__(self, hass, api):
+        """
+        Runs the blocking calls on a tinytuya device one at a time.
+
+        Calls are queued and run on the executor by a single task, which
+        exits when the queue is empty and is started again by the next call.
+
+        Args:
+            hass (HomeAssistant): The Home Assistant instance.
+            api (tinytuya.Device): The device whose connection is owned.
+        """
+        self._hass = hass
+        self._api = api
+        self._queue = asyncio.Queue()
+        self._owner = None
+        self._max_depth = 0
+        self._stats = {}
+        # interrupts a receive when a call is queued, created on first use
+        self._wake_r = None
+        self._wake_w = None
+
+    @property
+    def queue_depth(self):
+        """The number of calls waiting for their turn."""
+        return self._queue.qsize()
+
+    def submit(self, func, *args):
+        """Queue a blocking call, returning a future for its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put_nowait((func, args, future, monotonic()))
+        self._max_depth = max(self._max_depth, self._queue.qsize())
+        if self._owner is None or self._owner.done():
+            self._owner = loop.create_task(self._async_run_queue())
+        else:
+            self._wake()
+        return future
+
+    async def async_call(self, func, *args):
+        """Run a blocking call, after the calls queued before it."""
+        return await self.submit(func, *args)
+
+    async def async_receive(self):
+        """Wait for the device to report something, returning None if not."""
+        return await self.async_call(self._receive)
+
+    async def _async_run_queue(self):
+        try:
+            while not self._queue.empty():
+                func, args, future, queued_at = self._queue.get_nowait()
+                if future.done():
+                    # the caller has stopped waiting
+                    continue
+                started = monotonic()
+                error = False
+                try:
+                    result = await self._hass.async_add_executor_job(func, *args)
+                except Exception as e:
+                    error = True
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    self._stats.setdefault(
+                        _operation_name(func), _OperationStats()
+                    ).record(started - queued_at, monotonic() - started, error)
+        except asyncio.CancelledError:
+            while not self._queue.empty():
+                self._queue.get_nowait()[2].cancel()
+            raise
+
+    def _wake(self):
+        if self._wake_w is not None:
+            try:
+                self._wake_w.send(b"\0")
+            except OSError:
+                # already full, so a wake up is on its way
+                pass
+
+    def _receive(self):
+        """Wait for the device or for another call, in the executor."""
+        sock = self._api.socket
+        if not isinstance(sock, socket.socket):
+            # not connected, receive() will make the connection
+            return self._api.receive()
+        if self._wake_r is None:
+            self._wake_r, self._wake_w = socket.socketpair()
+            self._wake_r.setblocking(False)
+            self._wake_w.setblocking(False)
+        try:
+            while self._wake_r.recv(256):
+                pass
+        except BlockingIOError:
+            pass
+        # anything queued before the wake up was cleared goes first
+        if not self._queue.empty():
+            return None
+        readable, _, _ = select.select(
+            [sock, self._wake_r],
+            [],
+            [],
+            self._api.connection_timeout,
+        )
+        if sock not in readable:
+            return None
+        # What arrived may only be the empty reply to a heartbeat, which
+        # tinytuya would follow by waiting for more, out of reach of a wake
+        # up.  Nothing else uses the socket, so its retries can be turned off
+        # for this one read.
+        retry = self._api.retry
+        self._api.retry = False
+        try:
+            return self._api.receive()
+        finally:
+            self._api.retry = retry
+
+    def close(self):
+        """Release the wake up socket, the device connection is left alone."""
+        for sock in (self._wake_r, self._wake_w):
+            if sock is not None:
+                sock.close()
+        self._wake_r = self._wake_w = None
+
+    def as_dict(self):
+        """Describe the queue and the time taken by each operation."""
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self._max_depth,
+            "operations": {
+                name: stats.as_dict() for name, stats in sorted(self._stats.items())
+            },
+        }
@@ -106,6 +106,8 @@ async def async_setup_entry(
 class TuyaLocalLawnMower(TuyaLocalEntity, LawnMowerEntity):
     """Representation of a Tuya Lawn Mower"""
 
+    _unrecorded_attributes = frozenset({"raw_activity", "password"})
+
     async def async_added_to_hass(self):
         await super().async_added_to_hass()
         platform = entity_platform.async_get_current_platform()
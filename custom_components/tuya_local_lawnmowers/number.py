@@ -50,6 +50,7 @@ class TuyaLocalNumber(TuyaLocalEntity, NumberEntity):
         self._unit_dps = dps_map.pop("unit", None)
         self._min_dps = dps_map.pop("minimum", None)
         self._max_dps = dps_map.pop("maximum", None)
+        self._throttled_dps = self._value_dps
         self._init_end(dps_map)
 
     @property
@@ -110,8 +111,11 @@ class TuyaLocalNumber(TuyaLocalEntity, NumberEntity):
     @property
     def native_value(self):
         """Return the current value of the number."""
-        return self._value_dps.get_value(self._device)
+        return self._throttled(self._value_dps.get_value(self._device))
 
     async def async_set_native_value(self, value):
         """Set the number."""
+        if self._throttle:
+            # show what was asked for as soon as the device reports it
+            self._throttle.reset()
         await self._value_dps.async_set_value(self._device, value)
@@ -0,0 +1,107 @@
+"""
+Concurrent protocol version probing for Tuya devices.
+
+Trying protocol versions one after another costs a full timeout for each
+version the device does not speak.  Probing several versions at once over
+short-lived connections finds the right one in about the time of a single
+attempt.
+"""
+
+import asyncio
+import logging
+
+import tinytuya
+
+from .transport import TuyaAsyncTransport
+
+_LOGGER = logging.getLogger(__name__)
+
+# Probes open at the same time.  Some devices only accept a few connections,
+# so this is kept well below the number of protocol versions.
+PROBE_FAN_OUT = 3
+# Seconds each probe waits for a connection or reply
+PROBE_TIMEOUT = 3
+
+
+def _is_valid_status(result):
+    return isinstance(result, dict) and "Error" not in result and "dps" in result
+
+
+async def async_probe_protocol(
+    hass,
+    api,
+    versions,
+    fan_out=PROBE_FAN_OUT,
+    timeout=PROBE_TIMEOUT,
+):
+    """
+    Find the most preferred protocol version in which a device answers.
+
+    Args:
+        hass (HomeAssistant): The Home Assistant instance.
+        api (tinytuya.Device): The device to probe.  Its id, address, port
+            and key are used, but its own connection is left alone.
+        versions (list): Versions to try, from API_PROTOCOL_VERSIONS, in
+            order of preference.
+        fan_out (int): The number of probes to run at the same time.
+        timeout (number): Seconds each probe waits for the device.
+
+    Returns the first version in the list that answered a status query, or
+    None if none did.  Some devices answer in more than one version, such as
+    3.3 devices also answering with device22 detection enabled, so an answer
+    is only taken once every version before it has failed.
+    """
+    semaphore = asyncio.Semaphore(fan_out)
+
+    async def probe(version):
+        async with semaphore:
+            probe_api = tinytuya.Device(
+                api.id,
+                api.address,
+                api.real_local_key.decode("latin1"),
+            )
+            probe_api.port = api.port
+            probe_api.set_socketRetryLimit(1)
+            # 3.22 is 3.3 with tinytuya's device22 detection enabled
+            probe_api.disabledetect = version != 3.22
+            # setting 3.2 queries the device for its dps, so it blocks
+            await hass.async_add_executor_job(
+                probe_api.set_version,
+                3.3 if version == 3.22 else version,
+            )
+            transport = TuyaAsyncTransport(probe_api, timeout)
+            try:
+                return version, await transport.async_status()
+            except Exception as e:
+                _LOGGER.debug(
+                    "Probe of %s in %s failed: %s %s",
+                    api.id,
+                    version,
+                    type(e).__name__,
+                    e,
+                )
+                return version, None
+            finally:
+                transport.close()
+
+    tasks = [asyncio.create_task(probe(v)) for v in versions]
+    # version -> whether it answered, as probes finish
+    answered = {}
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            version, result = await next_done
+            answered[version] = _is_valid_status(result)
+            if result is not None and not answered[version]:
+                _LOGGER.debug("Probe of %s in %s returned %s", api.id, version, result)
+            for version in versions:
+                if version not in answered:
+                    # a more preferred version may still answer
+                    break
+                if answered[version]:
+                    _LOGGER.debug("%s answered probe in version %s", api.id, version)
+                    return version
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return None
@@ -14,6 +14,7 @@ from .device import TuyaLocalDevice
 from .entity import TuyaLocalEntity, unit_from_ascii
 from .helpers.config import async_tuya_setup_platform
 from .helpers.device_config import TuyaEntityConfig
+from .helpers.payload import DECODERS, attribute_names
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -32,6 +33,11 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
 class TuyaLocalSensor(TuyaLocalEntity, SensorEntity):
     """Representation of a Tuya Sensor"""
 
+    # decoded payloads are kept in full in the device diagnostics
+    _unrecorded_attributes = frozenset(
+        name for decoder in DECODERS for name in attribute_names(decoder)
+    )
+
     def __init__(self, device: TuyaLocalDevice, config: TuyaEntityConfig):
         """
         Initialise the sensor.
@@ -47,6 +53,8 @@ class TuyaLocalSensor(TuyaLocalEntity, SensorEntity):
         self._unit_dps = dps_map.pop("unit", None)
 
         self._init_end(dps_map)
+        if not self._sensor_dps.decoder:
+            self._throttled_dps = self._sensor_dps
 
     @property
     def device_class(self):
@@ -73,7 +81,20 @@ class TuyaLocalSensor(TuyaLocalEntity, SensorEntity):
     @property
     def native_value(self):
         """Return the value reported by the sensor"""
-        return self._sensor_dps.get_value(self._device)
+        if self._sensor_dps.decoder:
+            payload = self._sensor_dps.decoded_payload(self._device)
+            return None if payload is None else payload.summary
+        return self._throttled(self._sensor_dps.get_value(self._device))
+
+    @property
+    def extra_state_attributes(self):
+        """Return the records of a decoded payload with the other attributes"""
+        attr = super().extra_state_attributes
+        if self._sensor_dps.decoder:
+            payload = self._sensor_dps.decoded_payload(self._device)
+            if payload is not None:
+                attr.update(payload.attributes)
+        return attr
 
     @property
     def native_unit_of_measurement(self):
@@ -0,0 +1,407 @@
+"""
+Asyncio native transport for Tuya local protocol devices.
+
+Messages are built and decoded by the tinytuya device object, which keeps
+track of the protocol version, session key and device22 quirks, but the
+socket itself is owned by the event loop, so waiting for the device to
+report does not tie up an executor thread.
+"""
+
+import asyncio
+import logging
+import struct
+from time import time
+
+import tinytuya
+from tinytuya.core import command_types as CT
+from tinytuya.core import header as H
+from tinytuya.core.error_helper import ERR_PAYLOAD, error_json
+from tinytuya.core.exceptions import DecodeError
+from tinytuya.core.message_helper import parse_header, unpack_message
+
+_LOGGER = logging.getLogger(__name__)
+
+# Idle time after which a heartbeat is sent to keep the connection open
+HEARTBEAT_INTERVAL = 10
+# Members of tinytuya.Device, not part of its public interface, that are
+# used to build and decode messages outside of its own socket handling
+NATIVE_API_MEMBERS = (
+    "_decode_payload",
+    "_encode_message",
+    "_negotiate_session_key_generate_step_1",
+    "_negotiate_session_key_generate_step_3",
+    "_negotiate_session_key_generate_finalize",
+    "real_local_key",
+)
+
+
+def supports_native_transport(api):
+    """
+    Return whether the tinytuya device can be used by the native transport.
+
+    Args:
+        api (tinytuya.Device): The device to check.
+
+    Other tinytuya versions may rename the members used here, in which case
+    the device is left to talk through tinytuya's own socket.
+    """
+    missing = [m for m in NATIVE_API_MEMBERS if not hasattr(api, m)]
+    if missing:
+        _LOGGER.warning(
+            "tinytuya %s lacks %s, not using the native transport",
+            getattr(tinytuya, "__version__", "unknown"),
+            ", ".join(missing),
+        )
+    return not missing
+
+
+class TuyaFrameReader(object):
+    """Splits a TCP byte stream into Tuya protocol messages."""
+
+    def __init__(self):
+        self._buffer = b""
+
+    def feed(self, data):
+        self._buffer += data
+
+    def next_message(self, hmac_key=None, no_retcode=False):
+        """
+        Return the next complete message from the buffer.
+
+        Args:
+            hmac_key (bytes): the key for protocol 3.4+ message integrity.
+            no_retcode (bool): True for messages sent to, not from, a device.
+
+        Returns None when more data is needed.  Garbage before a message
+        prefix and messages that cannot be unpacked are discarded.
+        """
+        prefix_len = len(H.PREFIX_55AA_BIN)
+        while True:
+            buf = self._buffer
+            offsets = [
+                o
+                for o in (buf.find(H.PREFIX_55AA_BIN), buf.find(H.PREFIX_6699_BIN))
+                if o >= 0
+            ]
+            if not offsets:
+                # keep what could be the start of a split prefix
+                self._buffer = buf[1 - prefix_len :]
+                return None
+            start = min(offsets)
+            if start:
+                _LOGGER.debug("Discarding %d bytes before message prefix", start)
+                buf = buf[start:]
+
+            fmt = (
+                H.MESSAGE_HEADER_FMT_6699
+                if buf.startswith(H.PREFIX_6699_BIN)
+                else H.MESSAGE_HEADER_FMT_55AA
+            )
+            if len(buf) < struct.calcsize(fmt):
+                self._buffer = buf
+                return None
+            try:
+                header = parse_header(buf)
+            except DecodeError as e:
+                _LOGGER.debug("Discarding corrupt message header: %s", e)
+                self._buffer = buf[1:]
+                continue
+
+            if len(buf) < header.total_length:
+                self._buffer = buf
+                return None
+            frame = buf[: header.total_length]
+            self._buffer = buf[header.total_length :]
+            try:
+                return unpack_message(
+                    frame,
+                    hmac_key=hmac_key,
+                    header=header,
+                    no_retcode=no_retcode,
+                )
+            except (DecodeError, TypeError, ValueError, struct.error) as e:
+                _LOGGER.debug("Discarding message that failed to unpack: %s", e)
+
+
+class UpdateQueue(object):
+    """Updates waiting to be picked up by a device's receive loop."""
+
+    def __init__(self):
+        self._queue = asyncio.Queue()
+        self._waiting = False
+
+    def empty(self):
+        return self._queue.empty()
+
+    def put(self, item):
+        self._queue.put_nowait(item)
+
+    def wake(self, item=None):
+        """Pass None or an exception to a waiting reader, if there is one."""
+        if self._waiting:
+            self._queue.put_nowait(item)
+
+    async def async_get(self, timeout):
+        """Return the next update, raising it if it is an exception."""
+        self._waiting = True
+        try:
+            item = await asyncio.wait_for(self._queue.get(), timeout)
+        finally:
+            self._waiting = False
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+
+class _TuyaConnection(asyncio.Protocol):
+    """Protocol instance for a single connection of a TuyaAsyncTransport."""
+
+    def __init__(self, owner):
+        self._owner = owner
+        self._reader = TuyaFrameReader()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self._reader.feed(data)
+        api = self._owner._api
+        while self._owner._connection is self:
+            hmac_key = api.local_key if api.version >= 3.4 else None
+            msg = self._reader.next_message(hmac_key)
+            if msg is None:
+                return
+            self._owner._dispatch(msg)
+
+    def connection_lost(self, exc):
+        if self._owner._connection is self:
+            self._owner._connection_lost(exc)
+
+
+class TuyaAsyncTransport(object):
+    # Replies are matched to requests by command, so after a timeout a late
+    # reply could be mistaken for the next one
+    _close_on_timeout = True
+
+    def __init__(self, api, timeout=5):
+        """
+        Represents an event loop owned connection to a Tuya device.
+
+        Args:
+            api (tinytuya.Device): The device used to encode and decode
+                messages.  Its address, port, key and version are used for
+                the connection, but its own socket is never opened.
+            timeout (number): Seconds to wait for connections and replies.
+        """
+        self._api = api
+        self._timeout = timeout
+        self._connection = None
+        self._version = None
+        self._request_lock = asyncio.Lock()
+        self._waiter = None
+        self._updates = UpdateQueue()
+        self._last_sent = 0
+
+    @property
+    def connected(self):
+        return (
+            self._connection is not None
+            and self._connection.transport is not None
+            and not self._connection.transport.is_closing()
+        )
+
+    def _connection_lost(self, exc):
+        self._connection = None
+        self._fail_waiter()
+        self._wake(exc or ConnectionError(f"Connection closed by {self._api.address}"))
+
+    def _fail_waiter(self):
+        if self._waiter and not self._waiter[1].done():
+            self._waiter[1].set_exception(
+                ConnectionError(f"Connection to {self._api.address} lost")
+            )
+
+    def _dispatch(self, msg):
+        if not msg.crc_good:
+            _LOGGER.debug("Discarding message %d with bad checksum", msg.cmd)
+            return
+        # 3.4+ devices may acknowledge a request before replying to it with
+        # the same command; like tinytuya, wait on for the one with data
+        if self._waiter and msg.cmd == self._waiter[0] and msg.payload:
+            future = self._waiter[1]
+            if not future.done():
+                future.set_result(msg)
+                return
+        if not msg.payload:
+            # heartbeat and command acknowledgements
+            return
+        result = self._decode(msg)
+        if result:
+            self._deliver(result)
+
+    def _deliver(self, result):
+        """Pass on an update that was not a reply to a request."""
+        self._updates.put(result)
+
+    def _wake(self, item=None):
+        """Wake any waiting reader with None or an exception."""
+        self._updates.wake(item)
+
+    def _decode(self, msg):
+        if not msg.payload:
+            return None
+        try:
+            return self._api._decode_payload(msg.payload)
+        except Exception:
+            _LOGGER.debug("Failed to decode payload %r", msg.payload, exc_info=True)
+            return error_json(ERR_PAYLOAD)
+
+    async def async_connect(self):
+        """Connect and negotiate a session, if not already connected."""
+        if self.connected and self._version == self._api.version:
+            return
+        self.close()
+        self._version = self._api.version
+        # A session key from a previous connection is no longer valid
+        self._api.local_key = self._api.real_local_key
+        connection = _TuyaConnection(self)
+        self._connection = connection
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(
+                loop.create_connection(
+                    lambda: connection, self._api.address, self._api.port
+                ),
+                self._timeout,
+            )
+        except BaseException:
+            if self._connection is connection:
+                self._connection = None
+            raise
+        if self._version >= 3.4:
+            try:
+                await self._async_negotiate_session_key()
+            except Exception:
+                self.close()
+                raise
+
+    async def _async_negotiate_session_key(self):
+        step1 = self._api._negotiate_session_key_generate_step_1()
+        rkey = await self._async_exchange(step1, CT.SESS_KEY_NEG_RESP)
+        step3 = self._api._negotiate_session_key_generate_step_3(rkey)
+        if not step3:
+            raise ConnectionError(
+                f"Session key negotiation with {self._api.address} failed"
+            )
+        self._write(step3)
+        self._api._negotiate_session_key_generate_finalize()
+
+    def _write(self, payload):
+        if not self.connected:
+            raise ConnectionError(f"Not connected to {self._api.address}")
+        self._connection.transport.write(self._api._encode_message(payload))
+        self._last_sent = time()
+
+    async def _async_exchange(self, payload, response_cmd):
+        """Send a message and wait for the reply with the given command."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiter = (response_cmd, future)
+        try:
+            self._write(payload)
+            return await asyncio.wait_for(future, self._timeout)
+        except ConnectionError:
+            self.close()
+            raise
+        except asyncio.TimeoutError:
+            if self._close_on_timeout:
+                self.close()
+            raise
+        finally:
+            self._waiter = None
+
+    async def _async_request(self, command, data=None, api=None):
+        """
+        Send a request and return the decoded reply.
+
+        Args:
+            command (int): The command type.
+            data: The data for the command.
+            api (tinytuya.Device): The device that the request is for, if
+                not the one owning the connection.
+        """
+        api = api or self._api
+        async with self._request_lock:
+            await self.async_connect()
+            payload = api.generate_payload(command, data)
+            dev_type = self._api.dev_type
+            msg = await self._async_exchange(payload, payload.cmd)
+            result = self._decode(msg)
+            if result is None and self._api.dev_type != dev_type:
+                _LOGGER.debug(
+                    "%s detected as %s, resending request",
+                    api.id,
+                    self._api.dev_type,
+                )
+                payload = api.generate_payload(command, data)
+                msg = await self._async_exchange(payload, payload.cmd)
+                result = self._decode(msg)
+            return result
+
+    async def _async_send(self, command, data=None, api=None):
+        """Send a request without waiting for a reply."""
+        api = api or self._api
+        async with self._request_lock:
+            await self.async_connect()
+            self._write(api.generate_payload(command, data))
+
+    async def async_status(self):
+        """Request the status of all dps."""
+        return await self._async_request(CT.DP_QUERY)
+
+    async def async_updatedps(self, index):
+        """Ask the device to report the given dps, which arrive as updates."""
+        await self._async_send(CT.UPDATEDPS, index)
+
+    async def async_heartbeat(self):
+        await self._async_send(CT.HEART_BEAT)
+
+    async def async_keepalive(self):
+        """Send a heartbeat if nothing has been sent for a while."""
+        if time() - self._last_sent >= HEARTBEAT_INTERVAL:
+            await self.async_heartbeat()
+
+    async def async_set_values(self, values):
+        """Send new values for dps, without waiting for the device to act."""
+        await self._async_send(CT.CONTROL, {str(k): v for k, v in values.items()})
+
+    async def async_receive(self, timeout=HEARTBEAT_INTERVAL):
+        """
+        Wait for the next update pushed by the device.
+
+        Args:
+            timeout (number): Seconds to wait.  If nothing arrives, a
+                heartbeat is sent if one is due.
+
+        Returns the decoded message, or None if nothing arrived in time or
+        the connection was closed locally.
+        """
+        if self._updates.empty():
+            # requests from entities may be connecting at the same time
+            async with self._request_lock:
+                await self.async_connect()
+        try:
+            return await self._updates.async_get(timeout)
+        except asyncio.TimeoutError:
+            await self.async_keepalive()
+            return None
+
+    def close(self):
+        """Close the connection, waking any reader without an error."""
+        connection = self._connection
+        if connection:
+            self._connection = None
+            self._fail_waiter()
+            if connection.transport:
+                connection.transport.close()
+            self._wake()
@@ -42,6 +42,7 @@ class TuyaDeviceTestCase(IsolatedAsyncioTestCase):
         cfg = TuyaDeviceConfig(config_file)
         self.conf_type = cfg.legacy_type
         type(self.mock_device).has_returned_state = PropertyMock(return_value=True)
+        type(self.mock_device).stale = PropertyMock(return_value=False)
         type(self.mock_device).unique_id = PropertyMock(return_value=str(uuid4()))
         self.mock_device.name = cfg.name
 
@@ -4,6 +4,8 @@ Primarily for testing the STOP command which this device is the first to use,
 and the lawn_mower platform.
 """
 
+from unittest.mock import Mock, patch
+
 from homeassistant.components.lawn_mower.const import (
     LawnMowerActivity,
     LawnMowerEntityFeature,
@@ -44,6 +46,9 @@ class TestMoebot(TuyaDeviceTestCase):
                 "binary_sensor_problem",
                 "select_mowing_mode",
                 "sensor_problem_state",
+                "sensor_schedule",
+                "sensor_work_log",
+                "sensor_zones",
                 "switch_backward_blade_stop",
                 "switch_rain_mode",
                 "number_running_time",
@@ -117,3 +122,92 @@ class TestMoebot(TuyaDeviceTestCase):
             {COMMAND_DP: "StartReturnStation"},
         ):
             await self.mower.async_dock()
+
+    def test_stopping_the_mower_is_urgent(self):
+        command = self.mower._command_dp
+        self.assertEqual(
+            command.urgent_values,
+            {"PauseWork", "CancelWork", "StartReturnStation"},
+        )
+        # the button sends the same command, so is urgent too
+        cancel = self.entities.get("button_cancel_mowing")
+        self.assertEqual(cancel._button_dp.urgent_values, {"CancelWork"})
+        self.assertEqual(self.start_button._button_dp.urgent_values, frozenset())
+
+    def test_payloads_are_decoded_into_sensors(self):
+        self.dps[ZONES_DP] = '{"MowingDistance": [0, 12], "ZoneRatio": [60, 40]}'
+        zones = self.entities.get("sensor_zones")
+        self.assertEqual(zones.native_value, 2)
+        self.assertEqual(
+            zones.extra_state_attributes,
+            {
+                "zones": [
+                    {"zone": 1, "MowingDistance": 0, "ZoneRatio": 60},
+                    {"zone": 2, "MowingDistance": 12, "ZoneRatio": 40},
+                ]
+            },
+        )
+        self.dps[WORKLOG_DP] = None
+        self.assertIsNone(self.entities.get("sensor_work_log").native_value)
+
+    def test_payloads_are_not_mower_attributes(self):
+        self.dps[SCHEDULE_DP] = '[{"day": 1, "start": "09:00"}]'
+        self.assertNotIn("schedule", self.mower.extra_state_attributes)
+
+    def test_battery_changes_are_throttled(self):
+        battery = self.entities.get("sensor_battery")
+
+        def report(battery_level, now):
+            self.dps[BATTERY_DP] = battery_level
+            clock.return_value = now
+            battery.prepare_state_write()
+            return battery.native_value
+
+        with patch("custom_components.tuya_local_lawnmowers.entity.monotonic") as clock:
+            self.assertEqual(report(80, 0), 80)
+            self.assertEqual(report(79, 10), 80)
+            # falling below the low battery threshold is shown at once
+            self.assertEqual(report(19, 20), 19)
+            self.assertEqual(report(18, 30), 19)
+            self.assertEqual(report(18, 80), 18)
+
+    def test_reading_the_state_does_not_move_the_throttle(self):
+        battery = self.entities.get("sensor_battery")
+        with patch("custom_components.tuya_local_lawnmowers.entity.monotonic") as clock:
+            clock.return_value = 0
+            self.dps[BATTERY_DP] = 80
+            battery.prepare_state_write()
+            self.dps[BATTERY_DP] = 79
+            clock.return_value = 100
+            # reads without a state write still show the value last written
+            for _ in range(3):
+                self.assertEqual(battery.native_value, 80)
+            battery.prepare_state_write()
+            self.assertEqual(battery.native_value, 79)
+
+    def test_held_battery_value_is_written_later(self):
+        battery = self.entities.get("sensor_battery")
+        battery.hass = Mock()
+        with patch("custom_components.tuya_local_lawnmowers.entity.monotonic") as clock:
+            clock.return_value = 0
+            self.dps[BATTERY_DP] = 80
+            battery.prepare_state_write()
+            clock.return_value = 10
+            self.dps[BATTERY_DP] = 79
+            battery.prepare_state_write()
+            battery.hass.loop.call_later.assert_called_once_with(
+                50, battery._release_throttle
+            )
+            clock.return_value = 60
+            battery._release_throttle()
+        self.mock_device.schedule_state_write.assert_called_once_with([battery])
+        self.assertEqual(battery.native_value, 79)
+
+    def test_payloads_and_secrets_are_not_recorded(self):
+        self.assertTrue(
+            {"raw_activity", "password"} <= type(self.mower)._unrecorded_attributes
+        )
+        self.assertTrue(
+            {"zones", "raw"}
+            <= type(self.entities["sensor_zones"])._unrecorded_attributes
+        )
@@ -43,6 +43,9 @@ class TestParksidePMower(TuyaDeviceTestCase):
                 "binary_sensor_problem",
                 "select_mowing_mode",
                 "sensor_problem_state",
+                "sensor_schedule",
+                "sensor_work_log",
+                "sensor_zones",
                 "switch_backward_blade_stop",
                 "switch_rain_mode",
                 "number_running_time",
@@ -0,0 +1,229 @@
+"""
+A fake Tuya device listening on localhost, for exercising the transport.
+
+It speaks enough of protocols 3.1, 3.3, 3.4 and 3.5 to answer status
+queries, accept commands and push status updates, including the session
+key negotiation used by 3.4 and later.  Given sub devices, it acts as a
+gateway, ignoring requests for sub devices it does not know about.
+"""
+
+import asyncio
+import hmac
+import json
+import struct
+from hashlib import sha256
+
+from tinytuya.core import command_types as CT
+from tinytuya.core import header as H
+from tinytuya.core.crypto_helper import AESCipher
+from tinytuya.core.message_helper import TuyaMessage, pack_message
+
+from custom_components.tuya_local_lawnmowers.transport import TuyaFrameReader
+
+QUERY_CMDS = (CT.DP_QUERY, CT.DP_QUERY_NEW)
+CONTROL_CMDS = (CT.CONTROL, CT.CONTROL_NEW)
+
+
+class FakeTuyaDevice:
+    def __init__(self, dev_id, local_key, version=3.3, dps=None, sub_devices=None):
+        self.dev_id = dev_id
+        self.real_key = local_key.encode("latin1")
+        self.version = version
+        self.version_header = str(version).encode("latin1") + H.PROTOCOL_3x_HEADER
+        self.dps = dict(dps or {})
+        self.sub_devices = {cid: dict(d) for cid, d in (sub_devices or {}).items()}
+        # acknowledge queries with an empty message before answering them
+        self.ack_queries = False
+        self.connections = 0
+        self.max_clients = 0
+        self.received = []
+        self.port = None
+        self._server = None
+        self._clients = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for writer in list(self._clients):
+            writer.close()
+        self._server.close()
+        await self._server.wait_closed()
+
+    def commands(self):
+        return [cmd for cmd, _ in self.received]
+
+    async def push(self, dps, cid=None):
+        """Report changed dps to all connected clients."""
+        self._state(cid).update(dps)
+        for client in list(self._clients):
+            self._send(client, CT.STATUS, self._report(dps, cid))
+            await client.drain()
+
+    def _state(self, cid):
+        return self.sub_devices[cid] if cid else self.dps
+
+    def _report(self, dps, cid):
+        return {"cid": cid, "dps": dps} if cid else {"dps": dps}
+
+    async def _handle(self, reader, writer):
+        client = _Client(writer, self.real_key)
+        self._clients.add(client)
+        self.connections += 1
+        self.max_clients = max(self.max_clients, len(self._clients))
+        frames = TuyaFrameReader()
+        try:
+            while data := await reader.read(4096):
+                frames.feed(data)
+                while msg := frames.next_message(
+                    self._unpack_key(client), no_retcode=True
+                ):
+                    await self._process(client, msg)
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.discard(client)
+            writer.close()
+
+    def _unpack_key(self, client):
+        return client.key if self.version >= 3.4 else None
+
+    async def _process(self, client, frame):
+        if frame.cmd == CT.SESS_KEY_NEG_START:
+            self._negotiate_start(client, frame)
+        elif frame.cmd == CT.SESS_KEY_NEG_FINISH:
+            self._negotiate_finish(client, frame)
+        else:
+            request = self._decrypt(client, frame.payload)
+            self.received.append((frame.cmd, request))
+            data = request.get("data", {})
+            cid = request.get("cid") or data.get("cid")
+            if cid and cid not in self.sub_devices:
+                # an offline sub device never answers
+                pass
+            elif frame.cmd in QUERY_CMDS:
+                if self.ack_queries:
+                    self._send(client, frame.cmd, None)
+                self._send(client, frame.cmd, self._report(self._state(cid), cid))
+            elif frame.cmd == CT.UPDATEDPS:
+                self._send(client, frame.cmd, None)
+                wanted = [str(dp) for dp in request.get("dpId", [])]
+                dps = {k: v for k, v in self._state(cid).items() if k in wanted}
+                self._send(client, CT.STATUS, self._report(dps, cid))
+            elif frame.cmd in CONTROL_CMDS:
+                self._send(client, frame.cmd, None)
+                dps = request.get("dps") or data.get("dps", {})
+                self._state(cid).update(dps)
+                self._send(client, CT.STATUS, self._report(dps, cid))
+            else:
+                self._send(client, frame.cmd, None)
+        await client.writer.drain()
+
+    def _negotiate_start(self, client, frame):
+        client.key = self.real_key
+        nonce = frame.payload
+        if self.version == 3.4:
+            nonce = AESCipher(self.real_key).decrypt(nonce, False, decode_text=False)
+        client.local_nonce = nonce
+        client.remote_nonce = b"fedcba9876543210"
+        response = client.remote_nonce + hmac.new(self.real_key, nonce, sha256).digest()
+        self._send_raw(client, CT.SESS_KEY_NEG_RESP, response)
+
+    def _negotiate_finish(self, client, frame):
+        payload = frame.payload
+        if self.version == 3.4:
+            payload = AESCipher(self.real_key).decrypt(
+                payload, False, decode_text=False
+            )
+        expected = hmac.new(self.real_key, client.remote_nonce, sha256).digest()
+        if payload != expected:
+            client.writer.close()
+            return
+        xor = bytes(a ^ b for a, b in zip(client.local_nonce, client.remote_nonce))
+        cipher = AESCipher(self.real_key)
+        if self.version == 3.4:
+            client.key = cipher.encrypt(xor, False, pad=False)
+        else:
+            client.key = cipher.encrypt(
+                xor,
+                use_base64=False,
+                pad=False,
+                iv=client.local_nonce[:12],
+            )[12:28]
+
+    def _decrypt(self, client, payload):
+        if not payload:
+            return {}
+        if self.version < 3.2:
+            if payload.startswith(H.PROTOCOL_VERSION_BYTES_31):
+                payload = AESCipher(client.key).decrypt(payload[19:], decode_text=False)
+        else:
+            if self.version == 3.4:
+                payload = AESCipher(client.key).decrypt(
+                    payload, False, decode_text=False
+                )
+            if payload.startswith(self.version_header[:3]):
+                payload = payload[len(self.version_header) :]
+            if self.version < 3.4:
+                payload = AESCipher(client.key).decrypt(
+                    payload, False, decode_text=False
+                )
+        return json.loads(payload)
+
+    def _send(self, client, cmd, data):
+        if data is None:
+            self._send_raw(client, cmd, b"")
+            return
+        payload = json.dumps(data).encode()
+        if self.version < 3.2:
+            self._send_raw(client, cmd, payload)
+            return
+        if self.version < 3.4:
+            payload = AESCipher(client.key).encrypt(payload, False)
+            if cmd not in H.NO_PROTOCOL_HEADER_CMDS:
+                payload = self.version_header + payload
+        else:
+            if cmd not in H.NO_PROTOCOL_HEADER_CMDS:
+                payload = self.version_header + payload
+            if self.version == 3.4:
+                payload = AESCipher(client.key).encrypt(payload, False)
+        self._send_raw(client, cmd, payload)
+
+    def _send_raw(self, client, cmd, payload):
+        client.seqno += 1
+        if self.version >= 3.5:
+            msg = TuyaMessage(
+                client.seqno, cmd, 0, payload, 0, True, H.PREFIX_6699_VALUE, True
+            )
+            client.writer.write(pack_message(msg, hmac_key=client.key))
+            return
+        if payload and self.version == 3.4 and cmd == CT.SESS_KEY_NEG_RESP:
+            payload = AESCipher(client.key).encrypt(payload, False)
+        msg = TuyaMessage(
+            client.seqno,
+            cmd,
+            None,
+            struct.pack(H.MESSAGE_RETCODE_FMT, 0) + payload,
+            0,
+            True,
+            H.PREFIX_55AA_VALUE,
+            None,
+        )
+        hmac_key = client.key if self.version >= 3.4 else None
+        client.writer.write(pack_message(msg, hmac_key=hmac_key))
+
+
+class _Client:
+    def __init__(self, writer, key):
+        self.writer = writer
+        self.key = key
+        self.seqno = 0
+        self.local_nonce = b""
+        self.remote_nonce = b""
+
+    def close(self):
+        self.writer.close()
+
+    async def drain(self):
+        await self.writer.drain()
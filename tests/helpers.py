@@ -17,7 +17,7 @@ async def assert_device_properties_set(
         provided[args[0]] = args[1]
         return result()
 
-    def generate_results(*args):
+    def generate_results(*args, **kwargs):
         result = AsyncMock()
         results.append(result)
         provided.update(args[0])
@@ -54,7 +54,7 @@ async def assert_device_properties_set_optional(
         provided[args[0]] = args[1]
         return result()
 
-    def generate_results(*args):
+    def generate_results(*args, **kwargs):
         result = AsyncMock()
         results.append(result)
         provided.update(args[0])
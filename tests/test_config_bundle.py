@@ -0,0 +1,75 @@
+import json
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from custom_components.tuya_local_lawnmowers.helpers.config_bundle import (
+    BUNDLE_FILE,
+    BUNDLE_SCHEMA,
+    build_bundle,
+    check_bundle,
+    load_bundle,
+)
+
+SOURCES = {
+    "a.yaml": b"name: A\n",
+    "b.yaml": b"name: B\n",
+}
+PARSED = {
+    "a.yaml": {"name": "A"},
+    "b.yaml": {"name": "B"},
+}
+
+
+class TestConfigBundle(TestCase):
+    def setUp(self):
+        self.bundle, self.skipped = build_bundle(SOURCES, PARSED.get)
+
+    def write(self, bundle):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with open(join(tmp.name, BUNDLE_FILE), "w") as f:
+            json.dump(bundle, f)
+        return tmp.name
+
+    def test_round_trip(self):
+        self.assertEqual(self.skipped, [])
+        configs = load_bundle(self.write(self.bundle))
+        self.assertEqual(configs["a.yaml"]["config"], {"name": "A"})
+        self.assertEqual(check_bundle(self.bundle, SOURCES), [])
+
+    def test_configs_not_representable_in_json_are_left_out(self):
+        bundle, skipped = build_bundle(
+            SOURCES,
+            {"a.yaml": {"name": "A"}, "b.yaml": {1: "int key"}}.get,
+        )
+        self.assertEqual(skipped, ["b.yaml"])
+        self.assertEqual(list(bundle["configs"]), ["a.yaml"])
+        self.assertEqual(check_bundle(bundle, SOURCES), ["b.yaml is missing"])
+
+    def test_check_finds_changed_added_and_removed_configs(self):
+        sources = {"a.yaml": b"name: A2\n", "c.yaml": b"name: C\n"}
+        self.assertEqual(
+            check_bundle(self.bundle, sources),
+            ["a.yaml has changed", "c.yaml is missing", "b.yaml no longer exists"],
+        )
+
+    def test_missing_bundle_is_empty(self):
+        with TemporaryDirectory() as tmp:
+            self.assertEqual(load_bundle(tmp), {})
+
+    def test_other_schema_is_ignored(self):
+        bundle = self.bundle | {"schema": BUNDLE_SCHEMA + 1}
+        self.assertEqual(load_bundle(self.write(bundle)), {})
+        self.assertEqual(len(check_bundle(bundle, SOURCES)), 1)
+
+    def test_tampered_bundle_is_ignored(self):
+        self.bundle["configs"]["a.yaml"]["config"]["name"] = "Changed"
+        self.bundle["configs"]["c.yaml"] = {"hash": "0", "config": {}}
+        self.assertEqual(load_bundle(self.write(self.bundle)), {})
+
+    def test_unreadable_bundle_is_ignored(self):
+        with TemporaryDirectory() as tmp:
+            with open(join(tmp, BUNDLE_FILE), "w") as f:
+                f.write("{not json")
+            self.assertEqual(load_bundle(tmp), {})
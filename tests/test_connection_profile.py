@@ -0,0 +1,81 @@
+"""Tests for the persisted connection profiles."""
+
+from unittest.mock import Mock
+
+import pytest
+
+from custom_components.tuya_local_lawnmowers import async_remove_entry
+from custom_components.tuya_local_lawnmowers.const import (
+    CONF_DEVICE_ID,
+    DATA_CONNECTION_PROFILES,
+    DOMAIN,
+)
+from custom_components.tuya_local_lawnmowers.helpers.connection_profile import (
+    STORAGE_KEY,
+    async_get_connection_profiles,
+)
+
+
+@pytest.mark.asyncio
+async def test_profiles_are_loaded_from_storage(hass, hass_storage):
+    hass_storage[STORAGE_KEY] = {
+        "version": 1,
+        "data": {"dummy": {"version": 3.4, "device22": False, "failures": 0}},
+    }
+    profiles = await async_get_connection_profiles(hass)
+
+    assert hass.data[DOMAIN][DATA_CONNECTION_PROFILES] is profiles
+    assert await async_get_connection_profiles(hass) is profiles
+    assert profiles.preferred_version("dummy") == 3.4
+    assert profiles.preferred_version("unknown") is None
+
+
+@pytest.mark.asyncio
+async def test_device22_detection_is_remembered(hass):
+    profiles = await async_get_connection_profiles(hass)
+
+    profiles.record_success("detected", 3.22, True)
+    profiles.record_success("not_detected", 3.22, False)
+
+    assert profiles.preferred_version("detected") == 3.22
+    assert profiles.preferred_version("not_detected") == 3.3
+
+
+@pytest.mark.asyncio
+async def test_failures_are_counted_until_success(hass):
+    profiles = await async_get_connection_profiles(hass)
+
+    profiles.record_failure("dummy")
+    profiles.record_failure("dummy")
+    assert profiles.get("dummy")["failures"] == 2
+    assert "last_failure" in profiles.get("dummy")
+
+    profiles.record_success("dummy", 3.5, False)
+    assert profiles.get("dummy")["failures"] == 0
+    assert profiles.get("dummy")["version"] == 3.5
+    assert profiles.preferred_version("dummy") == 3.5
+
+
+@pytest.mark.asyncio
+async def test_profiles_are_saved(hass, hass_storage, freezer):
+    profiles = await async_get_connection_profiles(hass)
+
+    profiles.record_success("dummy", 3.4, False)
+    profiles.remove("other")
+    await hass.async_block_till_done()
+    freezer.tick(60)
+    await profiles._store._async_handle_write_data()
+
+    assert hass_storage[STORAGE_KEY]["data"]["dummy"]["version"] == 3.4
+
+
+@pytest.mark.asyncio
+async def test_removing_an_entry_forgets_its_profile(hass):
+    profiles = await async_get_connection_profiles(hass)
+    profiles.record_success("dummy", 3.4, False)
+    profiles.record_success("other", 3.5, False)
+
+    await async_remove_entry(hass, Mock(data={CONF_DEVICE_ID: "dummy"}))
+
+    assert profiles.preferred_version("dummy") is None
+    assert profiles.preferred_version("other") == 3.5
@@ -1,3 +1,5 @@
+import asyncio
+from contextlib import asynccontextmanager
 from time import time
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import ANY, AsyncMock, Mock, call, patch
@@ -5,6 +7,11 @@ from unittest.mock import ANY, AsyncMock, Mock, call, patch
 from homeassistant.const import EVENT_HOMEASSISTANT_STARTED, EVENT_HOMEASSISTANT_STOP
 
 from custom_components.tuya_local_lawnmowers.device import TuyaLocalDevice
+from custom_components.tuya_local_lawnmowers.helpers.device_config import (
+    TuyaDeviceConfig,
+    TuyaEntityConfig,
+    get_config,
+)
 
 from .const import MOEBOT_PAYLOAD
 
@@ -34,9 +41,13 @@ class TestDevice(IsolatedAsyncioTestCase):
         self.addCleanup(sleep_patcher.stop)
         self.mock_sleep = sleep_patcher.start()
 
-        lock_patcher = patch("custom_components.tuya_local_lawnmowers.device.Lock")
-        self.addCleanup(lock_patcher.stop)
-        self.mock_lock = lock_patcher.start()
+        # probing finds nothing, leaving protocol rotation to the tests
+        probe_patcher = patch(
+            "custom_components.tuya_local_lawnmowers.device.async_probe_protocol",
+            AsyncMock(return_value=None),
+        )
+        self.addCleanup(probe_patcher.stop)
+        self.mock_probe = probe_patcher.start()
 
         self.subject = TuyaLocalDevice(
             "Some name",
@@ -85,6 +96,47 @@ class TestDevice(IsolatedAsyncioTestCase):
         self.subject._cached_state = {"updated_at": 0}
         self.assertFalse(self.subject.has_returned_state)
 
+    def make_restored_device(self):
+        snapshots = Mock()
+        snapshots.get.return_value = {"dps": {"6": 80}, "saved_at": 100}
+        self.hass().data["tuya_local_lawnmowers"]["state_snapshots"] = snapshots
+        device = TuyaLocalDevice(
+            "Some name",
+            "some_dev_id",
+            "some.ip.address",
+            "some_local_key",
+            "3.3",
+            None,
+            self.hass(),
+        )
+        return device, snapshots
+
+    def test_saved_state_is_shown_as_stale(self):
+        subject, snapshots = self.make_restored_device()
+        snapshots.get.assert_called_once_with(subject.unique_id)
+        self.assertTrue(subject.stale)
+        self.assertTrue(subject.available)
+        # so that the first poll is still made at once
+        self.assertFalse(subject.has_returned_state)
+        self.assertEqual(subject.get_property("6"), 80)
+
+    def test_first_frame_replaces_stale_state(self):
+        subject, snapshots = self.make_restored_device()
+        subject._nonpersistent_dps.add("103")
+        subject._sensitive_dps.add("106")
+
+        subject._handle_frame({"6": 79}, True)
+        self.assertFalse(subject.stale)
+        self.assertTrue(subject.has_returned_state)
+        self.assertEqual(subject.get_property("6"), 79)
+        snapshots.record.assert_called_once_with(
+            subject.unique_id, subject._cached_state, {"103", "106"}
+        )
+
+    def test_no_saved_state_leaves_device_unavailable(self):
+        self.assertFalse(self.subject.stale)
+        self.assertFalse(self.subject.available)
+
     async def test_refreshes_state_if_no_cached_state_exists(self):
         self.subject._cached_state = {}
         self.subject.async_refresh = AsyncMock()
@@ -223,6 +275,114 @@ class TestDevice(IsolatedAsyncioTestCase):
         await self.subject.async_refresh()
         self.assertEqual(self.subject._api_protocol_version_index, 3)
 
+    async def test_api_protocol_version_starts_from_connection_profile(self):
+        self.subject._profiles = Mock()
+        self.subject._profiles.preferred_version.return_value = 3.4
+        self.subject._api_protocol_version_index = None
+        self.subject._api_protocol_working = False
+        self.mock_api().dev_type = "default"
+        self.mock_api().status.side_effect = [{"dps": {"1": False}}]
+
+        await self.subject.async_refresh()
+
+        self.mock_api().set_version.assert_called_once_with(3.4)
+        self.subject._profiles.preferred_version.assert_called_once_with(
+            self.subject.unique_id
+        )
+        self.subject._profiles.record_success.assert_called_once_with(
+            self.subject.unique_id, 3.4, False
+        )
+
+    async def test_connection_profile_is_retried_after_repeated_failures(self):
+        self.subject._profiles = Mock()
+        self.subject._profiles.preferred_version.return_value = 3.4
+        self.subject._api_protocol_version_index = 4
+        self.subject._api_protocol_working = True
+        self.subject._api_working_protocol_failures = (
+            self.subject._AUTO_FAILURE_RESET_COUNT
+        )
+        self.mock_api().status.side_effect = Exception("Error")
+
+        await self.subject.async_refresh()
+
+        self.assertFalse(self.subject._api_protocol_working)
+        self.subject._profiles.record_failure.assert_called_once_with(
+            self.subject.unique_id
+        )
+        self.mock_api().set_version.assert_called_with(3.4)
+
+    async def test_api_protocol_version_is_probed_in_auto_mode(self):
+        self.subject._api_protocol_version_index = None
+        self.subject._api_protocol_working = False
+        self.mock_probe.return_value = 3.5
+        self.mock_api().status.side_effect = [Exception("Error"), {"dps": {}}]
+
+        await self.subject.async_refresh()
+
+        self.mock_probe.assert_awaited_once_with(
+            self.hass(), self.subject._api, [3.3, 3.1, 3.2, 3.4, 3.5, 3.22]
+        )
+        self.assertEqual(self.subject._api_protocol_version_index, 4)
+        self.assertTrue(self.subject._api_protocol_working)
+        self.mock_api().set_version.assert_called_with(3.5)
+        # only the probed version is retried
+        self.assertEqual(self.mock_api().set_version.call_count, 2)
+
+    async def test_api_protocol_version_is_not_probed_when_working(self):
+        self.subject._api_protocol_version_index = 0
+        self.subject._api_protocol_working = True
+        self.mock_api().status.return_value = {"dps": {}}
+
+        await self.subject.async_refresh()
+
+        self.mock_probe.assert_not_awaited()
+
+    async def test_repeated_failures_open_circuit_breaker(self):
+        self.subject._api_protocol_version_index = 0
+        self.subject._api_protocol_working = True
+        self.subject._cached_state = {"1": True, "updated_at": time()}
+        entity = Mock()
+        self.subject._children = [entity]
+        self.mock_api().status.side_effect = Exception("Error")
+
+        for _ in range(3):
+            await self.subject.async_refresh()
+
+        self.assertTrue(self.subject._supervisor.is_open)
+        self.assertFalse(self.subject.available)
+        self.subject._renders.flush()
+        entity.async_write_ha_state.assert_called()
+
+        # no more connection attempts are made while it is open
+        self.mock_api().status.reset_mock()
+        await self.subject.async_refresh()
+        self.mock_api().status.assert_not_called()
+
+    async def test_success_closes_circuit_breaker(self):
+        self.subject._api_protocol_version_index = 0
+        self.subject._api_protocol_working = True
+        self.subject._supervisor._state = "half_open"
+        self.mock_api().status.return_value = {"dps": {"1": True}}
+
+        await self.subject.async_refresh()
+
+        self.assertEqual(self.subject._supervisor.state, "closed")
+        self.assertTrue(self.subject.available)
+
+    async def test_reachability_check_ends_wait_early(self):
+        self.subject._running = True
+        self.subject._supervisor._state = "open"
+        self.subject._supervisor._retry_at = time() + 600
+        with patch(
+            "custom_components.tuya_local_lawnmowers.device.async_reachable",
+            AsyncMock(side_effect=[False, True]),
+        ) as reachable:
+            await self.subject._async_wait_for_retry()
+
+        self.assertEqual(reachable.await_count, 2)
+        self.assertEqual(self.subject._supervisor.state, "half_open")
+        self.mock_sleep.assert_called_with(30)
+
     def test_reset_cached_state_clears_cached_state_and_pending_updates(self):
         self.subject._cached_state = {"1": True, "updated_at": time()}
         self.subject._pending_updates = {
@@ -274,6 +434,35 @@ class TestDevice(IsolatedAsyncioTestCase):
         await self.subject.async_set_property("1", False)
         self.assertFalse(self.subject.get_property("1"))
 
+    async def test_set_properties_merges_writes_within_flush_window(self):
+        self.subject._cached_state = {"1": True, "2": 1, "updated_at": time()}
+        self.subject._poll_only = False
+        await asyncio.gather(
+            self.subject.async_set_properties({"2": 3}),
+            self.subject.async_set_property("1", False),
+        )
+        self.mock_api().set_multiple_values.assert_called_once_with(
+            {"1": False, "2": 3}, nowait=True
+        )
+        self.mock_sleep.assert_awaited_once_with(0.1)
+
+    async def test_urgent_properties_are_sent_ahead_of_routine_writes(self):
+        self.subject._cached_state = {"1": True, "updated_at": time()}
+        self.subject._poll_only = False
+        self.subject._urgent_values = {"115": {"PauseWork"}}
+        routine = asyncio.ensure_future(self.subject.async_set_property("2", 3))
+        await asyncio.sleep(0)
+        # urgent because of the value, whichever entity sets it
+        await self.subject.async_set_properties({"115": "PauseWork"})
+        await routine
+        self.assertEqual(
+            self.mock_api().set_multiple_values.call_args_list,
+            [
+                call({"115": "PauseWork"}, nowait=True),
+                call({"2": 3}, nowait=True),
+            ],
+        )
+
     async def test_set_properties_takes_no_action_when_nothing_provided(self):
         with patch("asyncio.sleep") as mock:
             await self.subject.async_set_properties({})
@@ -303,13 +492,13 @@ class TestDevice(IsolatedAsyncioTestCase):
             "fb",
         )
 
-    def test_refresh_cached_state(self):
+    async def test_refresh_cached_state(self):
         # set up preconditions
         self.mock_api().status.return_value = {"dps": {"1": "CHANGED"}}
         self.subject._cached_state = {"1": "UNCHANGED", "updated_at": 123}
 
         # call the function under test
-        self.subject._refresh_cached_state()
+        await self.subject._async_refresh_cached_state()
 
         # Did it call the API as expected?
         self.mock_api().status.assert_called_once()
@@ -325,14 +514,95 @@ class TestDevice(IsolatedAsyncioTestCase):
             delta=2,
         )
 
-    def test_set_values(self):
+    def test_state_view_is_reused_until_state_changes(self):
+        self.subject._cached_state = {"1": True, "2": 3, "updated_at": time()}
+        view = self.subject._state_view()
+        version = self.subject.state_version
+        self.assertIs(self.subject._state_view(), view)
+        self.assertEqual(self.subject.get_property("2"), 3)
+
+        self.subject._pending_updates.add({"2": 4})
+        self.assertGreater(self.subject.state_version, version)
+        self.assertEqual(self.subject.get_property("2"), 4)
+
+        version = self.subject.state_version
+        self.subject._cached_state["1"] = False
+        self.assertGreater(self.subject.state_version, version)
+        self.assertFalse(self.subject.get_property("1"))
+
+        self.subject._cached_state = self.subject._cached_state | {"3": "new"}
+        self.assertEqual(self.subject.get_property("3"), "new")
+        # callers of _get_cached_state may change what they are given
+        self.subject._get_cached_state()["3"] = "changed"
+        self.assertEqual(self.subject.get_property("3"), "new")
+
+    def test_decoded_values_are_cached_until_state_changes(self):
+        self.subject._cached_state = MOEBOT_PAYLOAD | {"updated_at": time()}
+        dp = next(
+            dp
+            for entity in get_config("moebot_s_mower").all_entities()
+            for dp in entity.dps()
+            if dp.name == "activity"
+        )
+        activity = dp.get_value(self.subject)
+        misses = self.subject.decode_cache.misses
+        self.assertEqual(dp.get_value(self.subject), activity)
+        self.assertEqual(self.subject.decode_cache.misses, misses)
+        self.assertGreater(self.subject.decode_cache.hits, 0)
+
+        self.subject._pending_updates.add({dp.id: "Standby"})
+        self.assertNotEqual(dp.get_value(self.subject), activity)
+        self.assertGreater(self.subject.decode_cache.misses, misses)
+
+    def test_packed_dps_share_one_decoding_per_frame(self):
+        entity = TuyaEntityConfig(
+            self.subject,
+            {
+                "entity": "sensor",
+                "dps": [
+                    {"id": 150, "name": "low", "type": "hex", "mask": "00FF"},
+                    {
+                        "id": 150,
+                        "name": "high",
+                        "type": "hex",
+                        "mask": "FF00",
+                        "mask_signed": True,
+                    },
+                ],
+            },
+        )
+        fromhex = Mock(wraps=bytes.fromhex)
+        with patch.dict(
+            "custom_components.tuya_local_lawnmowers.helpers.device_config"
+            "._BLOB_DECODERS",
+            {"hex": fromhex},
+        ):
+            self.subject._cached_state = {"150": "FE05", "updated_at": time()}
+            self.assertEqual(entity.find_dps("low").get_value(self.subject), 5)
+            self.assertEqual(entity.find_dps("high").get_value(self.subject), -2)
+            fromhex.assert_called_once_with("FE05")
+
+            self.subject._cached_state["150"] = "0107"
+            self.assertEqual(entity.find_dps("low").get_value(self.subject), 7)
+            self.assertEqual(entity.find_dps("high").get_value(self.subject), 1)
+            self.assertEqual(fromhex.call_count, 2)
+
+    def test_state_view_drops_expired_pending_values(self):
+        now = time()
+        self.subject._cached_state = {"1": True, "updated_at": now}
+        self.subject._pending_updates = {
+            "1": {"value": False, "updated_at": now - 10, "sent": True},
+        }
+        self.assertTrue(self.subject.get_property("1"))
+
+    async def test_set_values(self):
         # set up preconditions
         self.subject._pending_updates = {
             "1": {"value": "sample", "updated_at": time() - 2, "sent": False},
         }
 
         # call the function under test
-        self.subject._set_values({"1": "sample"})
+        await self.subject._async_set_values({"1": "sample"})
 
         # did it send what it was asked?
         self.mock_api().set_multiple_values.assert_called_once_with(
@@ -346,9 +616,9 @@ class TestDevice(IsolatedAsyncioTestCase):
             time(),
             delta=2,
         )
-        # did it lock and unlock when sending
-        self.subject._lock.acquire.assert_called_once()
-        self.subject._lock.release.assert_called_once()
+        # did it send through the connection's owner?
+        operations = self.subject._io.as_dict()["operations"]
+        self.assertEqual(sum(op["count"] for op in operations.values()), 1)
 
     def test_pending_updates_cleared_on_receipt(self):
         # Set up the preconditions
@@ -391,6 +661,21 @@ class TestDevice(IsolatedAsyncioTestCase):
         # did it schedule the loop?
         # self.hass().async_create_task.assert_called_once()
 
+    def test_actually_start_spreads_out_startup(self):
+        self.subject.receive_loop = Mock()
+        self.subject._startup = Mock()
+        self.subject._startup.start_delay.return_value = 1.5
+
+        # started by EVENT_HOMEASSISTANT_STARTED, along with other devices
+        self.subject.actually_start(Mock())
+        self.subject.receive_loop.assert_called_once_with(1.5)
+
+        self.subject._refresh_task = None
+        self.subject.receive_loop.reset_mock()
+        # added once Home Assistant is running
+        self.subject.actually_start()
+        self.subject.receive_loop.assert_called_once_with(0)
+
     def test_start_starts_when_ha_running(self):
         # Set up preconditions
         self.hass().is_running = True
@@ -497,6 +782,85 @@ class TestDevice(IsolatedAsyncioTestCase):
         # Did we start the loop?
         self.subject.start.assert_called_once()
 
+    def subscribe_moebot_entities(self):
+        entities = {}
+        for config in TuyaDeviceConfig("moebot_s_mower.yaml").all_entities():
+            entity = Mock()
+            entity._config = config
+            entities[config.config_id] = entity
+            self.subject._children.append(entity)
+            self.subject._subscribe(entity)
+        return entities
+
+    def test_frame_updates_only_entities_using_changed_dps(self):
+        entities = self.subscribe_moebot_entities()
+        self.subject._cached_state = MOEBOT_PAYLOAD | {
+            "115": "PauseWork",
+            "updated_at": time(),
+        }
+
+        self.subject._handle_frame({"6": 40, "115": "PauseWork"}, False)
+        self.subject._renders.flush()
+        # the battery changed, the command was a repeat
+        updated = [
+            e for e, entity in entities.items() if entity.async_write_ha_state.called
+        ]
+        self.assertEqual(updated, ["sensor_battery"])
+        # but entities using a received dp still see it
+        entities["lawn_mower"].on_receive.assert_called_once_with(
+            {"6": 40, "115": "PauseWork"}, False
+        )
+        entities["button_cancel_mowing"].on_receive.assert_called_once()
+        entities["switch_rain_mode"].on_receive.assert_not_called()
+        self.assertEqual(self.subject.get_property("6"), 40)
+
+    def test_full_poll_clears_missing_nonpersistent_dps(self):
+        entities = self.subscribe_moebot_entities()
+        self.subject._cached_state = MOEBOT_PAYLOAD | {"updated_at": time()}
+
+        poll = {k: v for k, v in MOEBOT_PAYLOAD.items() if k != "103"}
+        self.subject._handle_frame(poll, True)
+        self.subject._renders.flush()
+        self.assertNotIn("103", self.subject._cached_state)
+        entities["sensor_problem_state"].async_write_ha_state.assert_called_once()
+        entities["sensor_battery"].async_write_ha_state.assert_not_called()
+
+    def test_first_frame_updates_all_entities(self):
+        entities = self.subscribe_moebot_entities()
+        self.subject._handle_frame({"6": 40}, False)
+        self.subject._renders.flush()
+        for entity in entities.values():
+            entity.async_write_ha_state.assert_called_once()
+
+    def test_burst_of_frames_writes_each_entity_once(self):
+        entities = self.subscribe_moebot_entities()
+        self.subject._cached_state = MOEBOT_PAYLOAD | {"updated_at": time()}
+
+        for battery in (40, 41, 42):
+            self.subject._handle_frame({"6": battery}, False)
+        self.subject._renders.flush()
+        entities["sensor_battery"].async_write_ha_state.assert_called_once()
+        self.assertEqual(self.subject._renders.coalesced, 2)
+
+    def test_unchanged_render_is_not_written(self):
+        entities = self.subscribe_moebot_entities()
+        self.subject._cached_state = MOEBOT_PAYLOAD | {"updated_at": time()}
+        battery = entities["sensor_battery"]
+        battery.state = 40
+
+        self.subject._handle_frame({"6": 40}, False)
+        self.subject._renders.flush()
+        # a change the entity does not show, such as a rounded away digit
+        self.subject._handle_frame({"6": 40.2}, False)
+        self.subject._renders.flush()
+        battery.async_write_ha_state.assert_called_once()
+        self.assertEqual(self.subject._renders.suppressed, 1)
+
+        battery.state = 41
+        self.subject._handle_frame({"6": 41}, False)
+        self.subject._renders.flush()
+        self.assertEqual(battery.async_write_ha_state.call_count, 2)
+
     def test_register_subsequent_entity_ha_running(self):
         # Set up preconditions
         first = AsyncMock()
@@ -613,7 +977,87 @@ class TestDevice(IsolatedAsyncioTestCase):
             pass
         self.mock_api().set_socketPersistent.assert_called_once_with(False)
 
-    def test_should_poll(self):
+    async def test_async_receive_waits_on_socket_not_timer(self):
+        self.mock_api().receive.return_value = {"1": "UPDATED"}
+        self.subject._running = True
+        self.subject._cached_state = {"1": "INIT", "updated_at": time()}
+        loop = self.subject.async_receive()
+
+        for _ in range(3):
+            result = await loop.__anext__()
+            self.assertDictEqual(result, {"1": "UPDATED", "full_poll": False})
+        # updates are not spaced out by sleeping between them
+        self.mock_sleep.assert_not_called()
+        # and a heartbeat is only sent once it is due
+        self.mock_api().heartbeat.assert_called_once()
+        self.assertEqual(self.mock_api().receive.call_count, 3)
+
+        self.subject._running = False
+        await loop.aclose()
+
+    async def test_async_receive_backs_off_after_read_errors(self):
+        self.mock_api().receive.return_value = {
+            "Error": "Network Error: Unable to Connect",
+            "Err": "901",
+        }
+        self.subject._running = True
+        self.subject._cached_state = {"1": "INIT", "updated_at": time()}
+
+        def stop_after_two(delay):
+            if self.mock_sleep.call_count == 2:
+                self.subject._running = False
+
+        self.mock_sleep.side_effect = stop_after_two
+        async for poll in self.subject.async_receive():
+            self.fail(f"Unexpected poll {poll}")
+
+        # each failed read is followed by a wait before reading again
+        self.assertEqual(self.mock_api().receive.call_count, 2)
+        for delay in self.mock_sleep.call_args_list:
+            self.assertGreater(delay.args[0], 0)
+        self.assertEqual(self.subject._supervisor.as_dict()["failures"], 2)
+
+    async def test_restored_device_connects_in_its_startup_turn(self):
+        subject, _ = self.make_restored_device()
+        events = []
+
+        @asynccontextmanager
+        async def turn(device_id, name):
+            events.append(("turn", device_id))
+            yield
+            events.append(("done", device_id))
+
+        def status():
+            events.append(("status", subject.unique_id))
+            return {"dps": {"6": 79}}
+
+        subject._startup = Mock()
+        subject._startup.turn.side_effect = turn
+        self.mock_api().status.side_effect = status
+        self.mock_api().receive.return_value = {"6": 78}
+        subject._running = True
+        loop = subject.async_receive()
+
+        result = await loop.__anext__()
+        self.assertEqual(result["6"], 79)
+        self.assertEqual(
+            events,
+            [
+                ("turn", subject.unique_id),
+                ("status", subject.unique_id),
+                ("done", subject.unique_id),
+            ],
+        )
+
+        # later polls do not wait for a turn
+        subject._handle_frame(result, True)
+        await loop.__anext__()
+        subject._startup.turn.assert_called_once()
+
+        subject._running = False
+        await loop.aclose()
+
+    async def test_should_poll(self):
         self.subject._cached_state = {"1": "sample", "updated_at": time()}
         self.subject._poll_only = False
         self.subject._temporary_poll = False
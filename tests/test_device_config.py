@@ -1,26 +1,55 @@
 """Test the config parser"""
 
+import json
+import random
+from os import stat
+from os.path import dirname, join
 from unittest import IsolatedAsyncioTestCase
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 import voluptuous as vol
 from fuzzywuzzy import fuzz
 from homeassistant.components.sensor import SensorDeviceClass
+from homeassistant.util.yaml import load_yaml
 
+import custom_components.tuya_local_lawnmowers.devices as config_dir
+from custom_components.tuya_local_lawnmowers.binary_sensor import (
+    TuyaLocalBinarySensor,
+)
+from custom_components.tuya_local_lawnmowers.button import TuyaLocalButton
+from custom_components.tuya_local_lawnmowers.event import TuyaLocalEvent
 from custom_components.tuya_local_lawnmowers.helpers.config import get_device_id
+from custom_components.tuya_local_lawnmowers.helpers.config_bundle import (
+    BUNDLE_FILE,
+    check_bundle,
+)
 from custom_components.tuya_local_lawnmowers.helpers.device_config import (
+    DetectionIndex,
     TuyaDeviceConfig,
     TuyaDpsConfig,
     TuyaEntityConfig,
     _bytes_to_fmt,
     _typematch,
     available_configs,
+    clear_config_cache,
+    detection_index,
     get_config,
+    load_config,
+    possible_matches,
+    scored_matches,
 )
+from custom_components.tuya_local_lawnmowers.helpers.payload import attribute_names
+from custom_components.tuya_local_lawnmowers.helpers.state_store import DecodeCache
+from custom_components.tuya_local_lawnmowers.lawn_mower import TuyaLocalLawnMower
+from custom_components.tuya_local_lawnmowers.number import TuyaLocalNumber
+from custom_components.tuya_local_lawnmowers.select import TuyaLocalSelect
 from custom_components.tuya_local_lawnmowers.sensor import TuyaLocalSensor
+from custom_components.tuya_local_lawnmowers.switch import TuyaLocalSwitch
 
 from .const import MOEBOT_PAYLOAD
 
+CONFIG_DIR = dirname(config_dir.__file__)
+
 PRODUCT_SCHEMA = vol.Schema(
     {
         vol.Required("id"): str,
@@ -66,6 +95,7 @@ MAPPING_SCHEMA = CONDMAP_SCHEMA.extend(
     {
         vol.Optional("constraint"): str,
         vol.Optional("conditions"): [COND_SCHEMA],
+        vol.Optional("urgent"): True,
     }
 )
 FORMAT_SCHEMA = vol.Schema(
@@ -120,6 +150,8 @@ DP_SCHEMA = vol.Schema(
         vol.Optional("mask"): str,
         vol.Optional("endianness"): vol.In(["little"]),
         vol.Optional("mask_signed"): True,
+        vol.Optional("decoder"): vol.In(["schedule", "work_log", "zones"]),
+        vol.Optional("unrecorded"): True,
     }
 )
 ENTITY_SCHEMA = vol.Schema(
@@ -146,6 +178,9 @@ ENTITY_SCHEMA = vol.Schema(
         vol.Optional("deprecated"): str,
         vol.Optional("mode"): vol.In(["box", "slider"]),
         vol.Optional("hidden"): vol.In([True, "unavailable"]),
+        vol.Optional("deadband"): vol.Any(int, float),
+        vol.Optional("min_interval"): vol.Any(int, float),
+        vol.Optional("thresholds"): [vol.Any(int, float)],
         vol.Required("dps"): [DP_SCHEMA],
     }
 )
@@ -158,6 +193,17 @@ YAML_SCHEMA = vol.Schema(
     }
 )
 
+PLATFORM_CLASSES = {
+    "binary_sensor": TuyaLocalBinarySensor,
+    "button": TuyaLocalButton,
+    "event": TuyaLocalEvent,
+    "lawn_mower": TuyaLocalLawnMower,
+    "number": TuyaLocalNumber,
+    "select": TuyaLocalSelect,
+    "sensor": TuyaLocalSensor,
+    "switch": TuyaLocalSwitch,
+}
+
 KNOWN_DPS = {
     "binary_sensor": {"required": ["sensor"], "optional": []},
     "button": {"required": ["button"], "optional": []},
@@ -368,6 +414,20 @@ class TestDeviceConfig(IsolatedAsyncioTestCase):
                     f"{cfg} {e} has a device class of enum, but has no mapped values",
                 )
 
+        # Check that unrecorded attributes are declared by the platform,
+        # which Home Assistant reads them from
+        platform = PLATFORM_CLASSES[entity.entity]
+        instance = platform(MagicMock(), entity)
+        names = {dp.name for dp in instance._attr_dps if dp.unrecorded}
+        for dp in entity.dps():
+            if dp.decoder:
+                names.update(attribute_names(dp.decoder))
+        self.assertLessEqual(
+            names,
+            platform._unrecorded_attributes,
+            f"{cfg} {e} has unrecorded attributes not declared by {platform.__name__}",
+        )
+
     def test_config_files_parse(self):
         """
         All configs should be parsable and meet certain criteria
@@ -511,6 +571,32 @@ class TestDeviceConfig(IsolatedAsyncioTestCase):
             "replaced by Passed.",
         )
 
+    def test_config_graph_is_built_once(self):
+        """Test that entity and dp configs are shared between uses"""
+        cfg = get_config("moebot_s_mower")
+        entities = list(cfg.all_entities())
+        self.assertEqual(list(cfg.all_entities()), entities)
+        for entity in entities:
+            dps = list(entity.dps())
+            self.assertEqual(list(entity.dps()), dps)
+            for dp in dps:
+                self.assertIs(entity.find_dps(dp.name), dp)
+            self.assertIs(entity.config_id, entity.config_id)
+
+    def test_find_dps_returns_first_with_name(self):
+        """Test that find_dps keeps the first dp when names repeat"""
+        cfg = TuyaEntityConfig(
+            MagicMock(),
+            {
+                "entity": "sensor",
+                "dps": [
+                    {"id": 1, "name": "sensor", "type": "integer"},
+                    {"id": 2, "name": "sensor", "type": "integer"},
+                ],
+            },
+        )
+        self.assertEqual(cfg.find_dps("sensor").id, "1")
+
     def test_format_with_none_defined(self):
         """Test that format returns None when there is none configured."""
         mock_entity = MagicMock()
@@ -614,6 +700,27 @@ class TestDeviceConfig(IsolatedAsyncioTestCase):
             ["unmirrored", "map_one", "map_two"],
         )
 
+    def test_memoised_values_and_range_are_not_shared(self):
+        """Test that callers changing a result do not affect later calls"""
+        mock_entity = MagicMock()
+        mock_config = {
+            "id": "1",
+            "type": "integer",
+            "name": "test",
+            "range": {"min": 0, "max": 10},
+            "mapping": [{"dps_val": 1, "value": "one"}],
+        }
+        device = MagicMock()
+        device.decode_cache = DecodeCache()
+        device.state_version = 1
+        device.get_property.return_value = 1
+        cfg = TuyaDpsConfig(mock_entity, mock_config)
+
+        cfg.values(device).append("changed")
+        self.assertEqual(cfg.values(device), ["one"])
+        self.assertEqual(cfg.range(device), (0, 10))
+        self.assertIs(cfg.range(device), cfg.range(device))
+
     def test_get_device_id(self):
         """Test that check if device id is correct"""
         self.assertEqual("my-device-id", get_device_id({"device_id": "my-device-id"}))
@@ -637,6 +744,43 @@ class TestDeviceConfig(IsolatedAsyncioTestCase):
             0xBA,
         )
 
+    def test_configs_are_read_only(self):
+        """Test that configs shared between devices cannot be changed"""
+        cfg = get_config("moebot_s_mower")
+        entity = next(cfg.all_entities())
+        dp = next(entity.dps())
+        with self.assertRaisesRegex(AttributeError, "read only"):
+            entity.config_id = "changed"
+        for attr in ("id", "name", "urgent_values", "_mapping_table"):
+            with self.subTest(attr=attr):
+                before = getattr(dp, attr)
+                with self.assertRaisesRegex(AttributeError, "read only"):
+                    setattr(dp, attr, None)
+                self.assertIs(getattr(dp, attr), before)
+        # nor can results memoised for a device be changed through a caller
+        device = MagicMock()
+        device.decode_cache = DecodeCache()
+        device.state_version = 1
+        device.get_property.return_value = "StartMowing"
+        command = entity.find_dps("command")
+        command.values(device).clear()
+        self.assertIn("start_mowing", command.values(device))
+
+    def test_values_are_set_in_the_form_each_device_sends(self):
+        """Test that decoding for one device does not affect another"""
+        mock_entity = MagicMock()
+        mock_config = {"id": "1", "name": "test", "type": "integer"}
+        cfg = TuyaDpsConfig(mock_entity, mock_config)
+        as_string = MagicMock()
+        as_string.get_property.return_value = "5"
+        as_int = MagicMock()
+        as_int.get_property.return_value = 5
+
+        self.assertEqual(cfg.get_value(as_string), 5)
+        self.assertEqual(cfg.get_values_to_set(as_int, 6), {"1": 6})
+        self.assertEqual(cfg.get_value(as_int), 5)
+        self.assertEqual(cfg.get_values_to_set(as_string, 6), {"1": "6"})
+
     def test_setting_masked_hex(self):
         """Test that get_values_to_set works with masked hex encoding."""
         mock_entity = MagicMock()
@@ -661,6 +805,155 @@ class TestDeviceConfig(IsolatedAsyncioTestCase):
         cfg = TuyaDpsConfig(mock_entity, mock_config)
         self.assertIsNone(cfg.default)
 
+    def test_config_is_parsed_once(self):
+        """Test that configs are shared until the cache is cleared"""
+        clear_config_cache()
+        with (
+            patch(
+                "custom_components.tuya_local_lawnmowers.helpers.device_config.load_bundle",
+                return_value={},
+            ),
+            patch(
+                "custom_components.tuya_local_lawnmowers.helpers.device_config.load_yaml",
+                wraps=load_yaml,
+            ) as parse,
+        ):
+            cfg = get_config("moebot_s_mower")
+            self.assertIs(get_config("moebot_s_mower"), cfg)
+            parse.assert_called_once()
+            clear_config_cache()
+            self.assertIsNot(get_config("moebot_s_mower"), cfg)
+            self.assertEqual(parse.call_count, 2)
+
+    def test_changed_config_is_parsed_again(self):
+        """Test that a config file changed on disk is parsed again"""
+        cfg = get_config("moebot_s_mower")
+        mtime = stat(join(CONFIG_DIR, cfg.config)).st_mtime_ns
+        with patch(
+            "custom_components.tuya_local_lawnmowers.helpers.device_config.stat",
+        ) as mock_stat:
+            mock_stat.return_value.st_mtime_ns = mtime
+            self.assertIs(get_config("moebot_s_mower"), cfg)
+            mock_stat.return_value.st_mtime_ns = mtime + 1
+            self.assertIsNot(get_config("moebot_s_mower"), cfg)
+
+    def test_configs_are_loaded_from_bundle(self):
+        """Test that configs come from the bundle without parsing YAML"""
+        clear_config_cache()
+        with patch(
+            "custom_components.tuya_local_lawnmowers.helpers.device_config.load_yaml",
+        ) as parse:
+            cfg = get_config("moebot_s_mower")
+            parse.assert_not_called()
+        self.assertEqual(cfg.name, "Lawnmower")
+        clear_config_cache()
+
+    def test_changed_config_is_parsed_from_yaml(self):
+        """Test that a config changed since the bundle was built is parsed"""
+        clear_config_cache()
+        with patch(
+            "custom_components.tuya_local_lawnmowers.helpers.device_config.source_hash",
+            return_value="changed",
+        ):
+            cfg = get_config("moebot_s_mower")
+        clear_config_cache()
+        self.assertEqual(cfg._config, get_config("moebot_s_mower")._config)
+
+    def test_config_bundle_is_up_to_date(self):
+        """Test that the bundle was rebuilt after the configs changed"""
+        with open(join(CONFIG_DIR, BUNDLE_FILE), encoding="utf-8") as f:
+            bundle = json.load(f)
+        sources = {}
+        for fname in available_configs():
+            with open(join(CONFIG_DIR, fname), "rb") as f:
+                sources[fname] = f.read()
+        self.assertEqual(
+            check_bundle(bundle, sources),
+            [],
+            "Run util/config_bundle.py to rebuild the bundle",
+        )
+
+    def test_detection_index_agrees_with_linear_matching(self):
+        """Test the index against matching each config in turn"""
+        rng = random.Random(14)
+        dp_ids = [str(i) for i in range(1, 13)]
+        dp_types = ["boolean", "integer", "string", "float", "bitfield"]
+        values = [True, False, 0, 7, 1.5, "text", "12", None]
+        configs = [load_config(fname) for fname in available_configs()]
+        for n in range(40):
+            configs.append(
+                TuyaDeviceConfig(
+                    f"synthetic_{n}.yaml",
+                    {
+                        "name": f"Synthetic {n}",
+                        "products": [{"id": f"p{rng.randrange(10)}"}],
+                        "entities": [
+                            {
+                                "entity": "sensor",
+                                "dps": [
+                                    {
+                                        "id": dp_id,
+                                        "name": f"dp{dp_id}",
+                                        "type": rng.choice(dp_types),
+                                        "optional": rng.random() < 0.3,
+                                    }
+                                    for dp_id in rng.sample(dp_ids, rng.randint(1, 4))
+                                ],
+                            }
+                            for _ in range(rng.randint(1, 3))
+                        ],
+                    },
+                )
+            )
+        index = DetectionIndex(configs)
+
+        payloads = [{}, {"updated_at": 0}, MOEBOT_PAYLOAD]
+        for _ in range(300):
+            payloads.append(
+                {
+                    dp_id: rng.choice(values)
+                    for dp_id in rng.sample(dp_ids, rng.randint(1, len(dp_ids)))
+                }
+            )
+        for dps in payloads:
+            for product_ids in (None, [], [f"p{rng.randrange(10)}"]):
+                expected = [c for c in configs if c.matches(dps, product_ids)]
+                self.assertEqual(index.matches(dps, product_ids), expected)
+                self.assertEqual(
+                    index.scored_matches(dps, product_ids),
+                    [(c, c.match_quality(dps, product_ids)) for c in expected],
+                )
+
+    def test_detection_index_is_shared_until_configs_change(self):
+        """Test that the index is only rebuilt when a config changes"""
+        index = detection_index()
+        self.assertIs(detection_index(), index)
+        self.assertEqual(
+            [c.config for c in index.configs],
+            list(available_configs()),
+        )
+        cfg = get_config("moebot_s_mower")
+        mtime = stat(join(CONFIG_DIR, cfg.config)).st_mtime_ns
+        with patch(
+            "custom_components.tuya_local_lawnmowers.helpers.device_config.stat",
+        ) as mock_stat:
+            mock_stat.return_value.st_mtime_ns = mtime + 1
+            self.assertIsNot(detection_index(), index)
+        clear_config_cache()
+
+    def test_scored_matches_detect_moebot(self):
+        """Test detection through the shared index"""
+        self.assertIn(get_config("moebot_s_mower"), possible_matches(MOEBOT_PAYLOAD))
+        scored = dict(
+            (c.config_type, q)
+            for c, q in scored_matches({**MOEBOT_PAYLOAD, "updated_at": 0})
+        )
+        self.assertEqual(scored["moebot_s_mower"], 100)
+
+    def test_missing_config_falls_back_to_legacy_type(self):
+        """Test that a type without a config file is looked up as legacy"""
+        self.assertIsNone(get_config("no_such_mower"))
+
     def test_matching_with_product_id(self):
         """Test that matching with product id works"""
         cfg = get_config("moebot_s_mower")
@@ -0,0 +1,142 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+import tinytuya
+
+from custom_components.tuya_local_lawnmowers.device import TuyaLocalDevice
+from custom_components.tuya_local_lawnmowers.gateway import TuyaGatewayTransport
+
+from .fake_tuya_device import FakeTuyaDevice
+
+GATEWAY_ID = "0123456789abcdef0123"
+LOCAL_KEY = "0123456789abcdef"
+SUB_DEVICES = {
+    "mower_one": {"6": 95, "101": "MOWING"},
+    "mower_two": {"6": 40, "101": "CHARGING"},
+}
+
+
+@pytest.mark.usefixtures("socket_enabled")
+class TestTuyaGatewayTransport(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.fake = FakeTuyaDevice(GATEWAY_ID, LOCAL_KEY, 3.4, sub_devices=SUB_DEVICES)
+        await self.fake.start()
+        self.addAsyncCleanup(self.fake.stop)
+        self.parent = tinytuya.Device(GATEWAY_ID, "127.0.0.1", LOCAL_KEY, version=3.4)
+        self.parent.port = self.fake.port
+        self.gateway = TuyaGatewayTransport(self.parent, timeout=0.5)
+        self.addCleanup(self.gateway.close)
+
+    def sub_device(self, cid):
+        api = tinytuya.Device(cid, cid=cid, parent=self.parent)
+        return self.gateway.sub_device(api)
+
+    async def test_status_per_sub_device(self):
+        one = self.sub_device("mower_one")
+        two = self.sub_device("mower_two")
+        self.assertEqual((await one.async_status())["dps"], SUB_DEVICES["mower_one"])
+        self.assertEqual((await two.async_status())["dps"], SUB_DEVICES["mower_two"])
+        self.assertEqual(self.fake.connections, 1)
+
+    async def test_updates_routed_by_cid(self):
+        one = self.sub_device("mower_one")
+        two = self.sub_device("mower_two")
+        await one.async_status()
+        await two.async_status()
+        await self.fake.push({"101": "PARK"}, cid="mower_two")
+        await self.fake.push({"6": 94}, cid="mower_one")
+        self.assertEqual(
+            await two.async_receive(1), {"cid": "mower_two", "dps": {"101": "PARK"}}
+        )
+        self.assertEqual(
+            await one.async_receive(1), {"cid": "mower_one", "dps": {"6": 94}}
+        )
+
+    async def test_concurrent_writes_are_serialised(self):
+        one = self.sub_device("mower_one")
+        two = self.sub_device("mower_two")
+        await asyncio.gather(
+            one.async_set_values({"101": "PARK"}),
+            two.async_set_values({"101": "MOWING"}),
+            one.async_status(),
+            two.async_status(),
+        )
+        self.assertEqual(self.fake.sub_devices["mower_one"]["101"], "PARK")
+        self.assertEqual(self.fake.sub_devices["mower_two"]["101"], "MOWING")
+        self.assertEqual(self.fake.connections, 1)
+
+    async def test_receive_and_requests_share_one_connection(self):
+        one = self.sub_device("mower_one")
+        two = self.sub_device("mower_two")
+        receiver = asyncio.create_task(one.async_receive(0.2))
+        self.assertEqual((await two.async_status())["dps"], SUB_DEVICES["mower_two"])
+        await receiver
+        self.assertEqual(self.fake.connections, 1)
+
+    async def test_unresponsive_sub_device_does_not_disconnect_others(self):
+        one = self.sub_device("mower_one")
+        offline = self.sub_device("mower_offline")
+        await one.async_status()
+        with self.assertRaises(asyncio.TimeoutError):
+            await offline.async_status()
+        self.assertTrue(one.connected)
+        self.assertEqual((await one.async_status())["dps"], SUB_DEVICES["mower_one"])
+        self.assertEqual(self.fake.connections, 1)
+
+    async def test_connection_closed_when_last_sub_device_closes(self):
+        one = self.sub_device("mower_one")
+        two = self.sub_device("mower_two")
+        await one.async_status()
+        await two.async_status()
+        one.close()
+        self.assertTrue(two.connected)
+        two.close()
+        self.assertFalse(self.gateway.connected)
+
+    async def test_close_wakes_only_that_sub_device(self):
+        one = self.sub_device("mower_one")
+        two = self.sub_device("mower_two")
+        await one.async_status()
+        await two.async_status()
+        reader_one = asyncio.create_task(one.async_receive(5))
+        reader_two = asyncio.create_task(two.async_receive(5))
+        await asyncio.sleep(0)
+        one.close()
+        self.assertIsNone(await reader_one)
+        self.assertFalse(reader_two.done())
+        await self.fake.push({"6": 39}, cid="mower_two")
+        self.assertEqual((await reader_two)["dps"], {"6": 39})
+
+
+class TestGatewaySubDevices(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.hass = MagicMock()
+        self.hass.data = {"tuya_local_lawnmowers": {}}
+        self.hass.is_stopping = False
+        self.hass.async_add_executor_job = AsyncMock()
+
+    def create(self, name, cid):
+        return TuyaLocalDevice(
+            name, GATEWAY_ID, "127.0.0.1", LOCAL_KEY, 3.4, cid, self.hass
+        )
+
+    def test_sub_devices_share_gateway(self):
+        one = self.create("One", "mower_one")
+        two = self.create("Two", "mower_two")
+        gateway = self.hass.data["tuya_local_lawnmowers"][GATEWAY_ID]["gateway"]
+        self.assertIs(one._transport._gateway, gateway)
+        self.assertIs(two._transport._gateway, gateway)
+        self.assertIsNot(one._transport, two._transport)
+
+    def test_test_device_uses_private_gateway(self):
+        one = self.create("One", "mower_one")
+        test = self.create("Test", "mower_one")
+        self.assertIsNot(test._transport._gateway, one._transport._gateway)
+
+    async def test_stop_does_not_touch_parent_socket(self):
+        one = self.create("One", "mower_one")
+        one._api.parent.set_socketPersistent = MagicMock()
+        one.pause()
+        one._api.parent.set_socketPersistent.assert_not_called()
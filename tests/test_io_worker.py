@@ -0,0 +1,119 @@
+import asyncio
+import socket
+import threading
+from time import monotonic, sleep
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import MagicMock
+
+import pytest
+
+from custom_components.tuya_local_lawnmowers.io_worker import TuyaIOWorker
+
+
+class TestTuyaIOWorker(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        loop = asyncio.get_running_loop()
+        self.hass = MagicMock()
+
+        async def job(func, *args):
+            return await loop.run_in_executor(None, func, *args)
+
+        self.hass.async_add_executor_job = job
+        self.api = MagicMock()
+        self.api.socket = None
+        self.subject = TuyaIOWorker(self.hass, self.api)
+        self.addCleanup(self.subject.close)
+
+    async def test_calls_never_overlap(self):
+        running = []
+        overlapped = []
+        lock = threading.Lock()
+
+        def operation(n):
+            with lock:
+                running.append(n)
+                overlapped.append(len(running) > 1)
+            sleep(0.01)
+            with lock:
+                running.remove(n)
+            return n
+
+        results = await asyncio.gather(
+            *(self.subject.async_call(operation, n) for n in range(5))
+        )
+        self.assertEqual(results, [0, 1, 2, 3, 4])
+        self.assertFalse(any(overlapped))
+        self.assertEqual(self.subject.as_dict()["max_queue_depth"], 5)
+        self.assertEqual(self.subject.queue_depth, 0)
+
+    async def test_errors_are_returned_to_the_caller(self):
+        def status():
+            raise ConnectionError("gone")
+
+        with self.assertRaises(ConnectionError):
+            await self.subject.async_call(status)
+        self.assertEqual(await self.subject.async_call(lambda: "next"), "next")
+        stats = self.subject.as_dict()["operations"]["status"]
+        self.assertEqual(stats["count"], 1)
+        self.assertEqual(stats["errors"], 1)
+
+    async def test_cancelled_call_is_skipped(self):
+        ran = []
+        first = self.subject.submit(sleep, 0.05)
+        second = self.subject.submit(ran.append, 2)
+        second.cancel()
+        await first
+        await self.subject.async_call(ran.append, 3)
+        self.assertEqual(ran, [3])
+
+    async def test_receive_without_connection_uses_tinytuya(self):
+        self.api.receive.return_value = {"dps": {"1": True}}
+        self.assertEqual(await self.subject.async_receive(), {"dps": {"1": True}})
+        self.api.receive.assert_called_once()
+
+
+@pytest.mark.usefixtures("socket_enabled")
+class TestTuyaIOWorkerReceive(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        loop = asyncio.get_running_loop()
+        self.hass = MagicMock()
+
+        async def job(func, *args):
+            return await loop.run_in_executor(None, func, *args)
+
+        self.hass.async_add_executor_job = job
+        self.api = MagicMock()
+        self.device_end, self.api.socket = socket.socketpair()
+        self.addCleanup(self.device_end.close)
+        self.addCleanup(self.api.socket.close)
+        self.api.connection_timeout = 5
+        self.subject = TuyaIOWorker(self.hass, self.api)
+        self.addCleanup(self.subject.close)
+
+    async def test_receive_returns_device_report(self):
+        self.api.receive.return_value = {"dps": {"1": True}}
+        self.device_end.send(b"report")
+        self.assertEqual(await self.subject.async_receive(), {"dps": {"1": True}})
+
+    async def test_queued_call_interrupts_receive(self):
+        receive = asyncio.ensure_future(self.subject.async_receive())
+        # let the receive start waiting on the socket
+        await asyncio.sleep(0.1)
+        started = monotonic()
+        self.assertEqual(await self.subject.async_call(lambda: "sent"), "sent")
+        self.assertLess(monotonic() - started, 1)
+        self.assertIsNone(await receive)
+        self.api.receive.assert_not_called()
+
+    async def test_earlier_wake_up_does_not_cut_later_receive_short(self):
+        self.api.connection_timeout = 0.2
+        await self.subject.async_receive()
+        # the second call is queued while the first runs, leaving a wake up
+        # behind that the next receive must not take as a new call
+        await asyncio.gather(
+            self.subject.async_call(lambda: None),
+            self.subject.async_call(lambda: None),
+        )
+        started = monotonic()
+        self.assertIsNone(await self.subject.async_receive())
+        self.assertGreaterEqual(monotonic() - started, 0.2)
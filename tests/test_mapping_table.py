@@ -0,0 +1,282 @@
+"""
+Differential tests of the compiled mapping lookups.
+
+The reference functions below are the linear searches the lookups replaced,
+kept as they were.  Random mappings, conditions and device states are run
+through both, and the mapping or condition found must be the same object.
+"""
+
+import random
+from math import nan
+from numbers import Number
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from custom_components.tuya_local_lawnmowers.helpers.device_config import (
+    TuyaEntityConfig,
+    _equal_or_in,
+)
+from custom_components.tuya_local_lawnmowers.helpers.mapping_table import (
+    ConditionTable,
+    MappingTable,
+)
+
+from .const import MOEBOT_PAYLOAD
+
+
+def reference_find_map_for_dps(dp, value, device):
+    default = None
+    for m in dp._config.get("mapping", {}):
+        if not dp.mapping_available(m, device) and "conditions" not in m:
+            continue
+        if "dps_val" not in m:
+            default = m
+        elif dp._match(m["dps_val"], value):
+            return m
+    return default
+
+
+def reference_find_map_for_value(dp, value, device):
+    default = None
+    nearest = None
+    distance = float("inf")
+    for m in dp._config.get("mapping", {}):
+        ignore = m.get("hidden", False) or not dp.mapping_available(m, device)
+        if "dps_val" not in m and not ignore:
+            default = m
+        if m.get("dps_val") is None:
+            ignore = True
+        if "value" in m and str(m["value"]) == str(value) and not ignore:
+            return m
+        if (
+            "value" in m
+            and isinstance(m["value"], Number)
+            and isinstance(value, Number)
+            and not ignore
+        ):
+            d = abs(m["value"] - value)
+            if d < distance:
+                distance = d
+                nearest = m
+        if "value" not in m and "value_mirror" in m and not ignore:
+            r_dps = dp._entity.find_dps(m["value_mirror"])
+            if r_dps and str(r_dps.get_value(device)) == str(value):
+                return m
+        for c in m.get("conditions", {}):
+            if c.get("hidden", False) or not dp.mapping_available(c, device):
+                continue
+            if "value" in c and str(c["value"]) == str(value):
+                c_dp = dp._entity.find_dps(m.get("constraint", dp.name))
+                if (c_dp and c_dp.id != dp.id and not c_dp.readonly) or (
+                    _equal_or_in(device.get_property(c_dp.id), c.get("dps_val"))
+                ):
+                    return m
+            if "value" not in c and "value_mirror" in c:
+                r_dps = dp._entity.find_dps(c["value_mirror"])
+                if r_dps and str(r_dps.get_value(device)) == str(value):
+                    return m
+    if nearest:
+        return nearest
+    return default
+
+
+def reference_active_condition(dp, mapping, device, value=None):
+    constraint = mapping.get("constraint", dp.name)
+    conditions = mapping.get("conditions")
+    c_match = None
+    if constraint and conditions:
+        c_dps = dp._entity.find_dps(constraint)
+        c_val = (
+            None
+            if c_dps is None
+            else (
+                c_dps.get_value(device)
+                if c_dps.rawtype == "base64" or c_dps.rawtype == "hex"
+                else device.get_property(c_dps.id)
+            )
+        )
+        for cond in conditions:
+            if not dp.mapping_available(cond, device):
+                continue
+            if c_val is not None and (_equal_or_in(c_val, cond.get("dps_val"))):
+                c_match = cond
+            elif (
+                c_val is None
+                and c_dps is not None
+                and "dps_val" in cond
+                and cond.get("dps_val") is None
+            ):
+                c_match = cond
+            if value is not None and value == cond.get("value"):
+                return cond
+    return c_match
+
+
+class FakeDevice:
+    name = "Fake"
+
+    def __init__(self, dps):
+        self._dps = dps
+
+    def get_property(self, dp_id):
+        return self._dps.get(dp_id)
+
+
+# values that dps and mappings are drawn from, with near misses of each other
+VALUES = [None, True, False, 0, 1, 2, 3, 4.0, 2.5, -1, 10, "1", "a", "b", "on"]
+DP_TYPES = ["integer", "string", "boolean", "bitfield", "float"]
+
+
+class TestMappingLookups(TestCase):
+    def assertSameResult(self, compiled, reference, *args):
+        """Assert both return the same object, or raise the same error."""
+        try:
+            expected = reference(*args)
+        except Exception as e:
+            with self.assertRaises(type(e)):
+                compiled(*args[1:])
+        else:
+            self.assertIs(compiled(*args[1:]), expected)
+
+    def random_entry(self, rng, in_condition=False):
+        entry = {}
+        if rng.random() < 0.85:
+            if rng.random() < 0.15:
+                entry["dps_val"] = rng.sample([v for v in VALUES if v is not None], 2)
+            else:
+                entry["dps_val"] = rng.choice(VALUES)
+        if rng.random() < 0.75:
+            entry["value"] = rng.choice(VALUES[1:])
+        elif rng.random() < 0.5:
+            entry["value_mirror"] = "mirror"
+        if rng.random() < 0.15:
+            entry["hidden"] = True
+        if rng.random() < 0.3:
+            entry["available"] = rng.choice(["avail", "missing"])
+        if not in_condition and rng.random() < 0.4:
+            if rng.random() < 0.5:
+                entry["constraint"] = rng.choice(["mode", "hexmode", "missing"])
+            entry["conditions"] = [
+                self.random_entry(rng, True) for _ in range(rng.randint(1, 4))
+            ]
+        return entry
+
+    def random_entity(self, rng):
+        mapping = [self.random_entry(rng) for _ in range(rng.randint(0, 8))]
+        return TuyaEntityConfig(
+            MagicMock(),
+            {
+                "entity": "sensor",
+                "dps": [
+                    {
+                        "id": "1",
+                        "name": "main",
+                        "type": rng.choice(DP_TYPES),
+                        "mapping": mapping,
+                    },
+                    {"id": "2", "name": "avail", "type": "boolean"},
+                    {"id": "3", "name": "mirror", "type": "string"},
+                    {
+                        "id": "4",
+                        "name": "mode",
+                        "type": "string",
+                        "readonly": rng.random() < 0.5,
+                    },
+                    {"id": "5", "name": "hexmode", "type": "hex"},
+                ],
+            },
+        )
+
+    def random_device(self, rng):
+        return FakeDevice(
+            {
+                "1": rng.choice(VALUES),
+                "2": rng.choice([True, False, None]),
+                "3": rng.choice(VALUES),
+                "4": rng.choice(VALUES),
+                "5": rng.choice(["01", "ff", None]),
+            }
+        )
+
+    def test_lookups_match_linear_search(self):
+        rng = random.Random(16)
+        for _ in range(400):
+            entity = self.random_entity(rng)
+            dp = entity.find_dps("main")
+            for _ in range(10):
+                device = self.random_device(rng)
+                value = rng.choice(VALUES + [nan, 2.4, "x"])
+                self.assertSameResult(
+                    dp._find_map_for_dps, reference_find_map_for_dps, dp, value, device
+                )
+                self.assertSameResult(
+                    dp._find_map_for_value,
+                    reference_find_map_for_value,
+                    dp,
+                    value,
+                    device,
+                )
+                for m in dp._config["mapping"]:
+                    for v in (None, value):
+                        self.assertSameResult(
+                            dp._active_condition,
+                            reference_active_condition,
+                            dp,
+                            m,
+                            device,
+                            v,
+                        )
+
+    def test_moebot_lookups_match_linear_search(self):
+        from custom_components.tuya_local_lawnmowers.helpers.device_config import (
+            get_config,
+        )
+
+        device = FakeDevice(MOEBOT_PAYLOAD)
+        for entity in get_config("moebot_s_mower").all_entities():
+            for dp in entity.dps():
+                values = [device.get_property(dp.id), None]
+                values += [m.get("value") for m in dp._config.get("mapping", [])]
+                for value in values:
+                    self.assertIs(
+                        dp._find_map_for_dps(value, device),
+                        reference_find_map_for_dps(dp, value, device),
+                    )
+                    self.assertIs(
+                        dp._find_map_for_value(value, device),
+                        reference_find_map_for_value(dp, value, device),
+                    )
+
+
+class TestMappingTable(TestCase):
+    def test_bitfield_values_are_matched_as_masks(self):
+        table = MappingTable(
+            [{"dps_val": 1}, {"dps_val": 2}, {"dps_val": 0}, {"value": "x"}],
+            bitfield=True,
+        )
+        self.assertEqual(list(table.dps_candidates(3)), [0, 1])
+        self.assertEqual(list(table.dps_candidates(0)), [2])
+        self.assertEqual(list(table.dps_candidates("bad")), [])
+        self.assertEqual(table.dps_defaults, [3])
+
+    def test_nearest_groups_by_distance_in_mapping_order(self):
+        table = MappingTable(
+            [
+                {"dps_val": "a", "value": 10},
+                {"dps_val": "b", "value": 20},
+                {"dps_val": "c", "value": 0},
+                {"dps_val": "d", "value": 30, "hidden": True},
+                {"dps_val": None, "value": 19},
+            ]
+        )
+        self.assertEqual(list(table.nearest(15)), [[0, 1], [2]])
+        self.assertEqual(list(table.nearest(nan)), [])
+        self.assertEqual(list(table.nearest("15")), [])
+
+    def test_unhashable_conditions_are_always_candidates(self):
+        table = ConditionTable(
+            [{"dps_val": [1, 2]}, {"dps_val": {"x": 1}}, {"dps_val": 3}]
+        )
+        self.assertEqual(list(table.candidates(2)), [0, 1])
+        self.assertEqual(list(table.candidates(3)), [1, 2])
+        self.assertEqual(list(table.candidates([3])), [0, 1, 2])
@@ -0,0 +1,76 @@
+"""Tests for the structured payload decoders."""
+
+import json
+from base64 import b64encode
+from unittest import TestCase
+from unittest.mock import patch
+
+from custom_components.tuya_local_lawnmowers.helpers import payload
+from custom_components.tuya_local_lawnmowers.helpers.payload import decode_payload
+
+
+class TestDecodePayload(TestCase):
+    def setUp(self):
+        decode_payload.cache_clear()
+
+    def test_schedule_slots_from_a_list(self):
+        raw = json.dumps([{"day": 1, "start": "09:00"}, {"day": 3, "start": "10:30"}])
+        p = decode_payload("schedule", raw)
+        self.assertEqual(p.summary, 2)
+        self.assertEqual(
+            p.attributes,
+            {"slots": [{"day": 1, "start": "09:00"}, {"day": 3, "start": "10:30"}]},
+        )
+
+    def test_zones_from_parallel_lists(self):
+        raw = json.dumps({"MowingDistance": [0, 12], "ZoneRatio": [60, 40]})
+        p = decode_payload("zones", raw)
+        self.assertEqual(
+            p.records,
+            (
+                {"zone": 1, "MowingDistance": 0, "ZoneRatio": 60},
+                {"zone": 2, "MowingDistance": 12, "ZoneRatio": 40},
+            ),
+        )
+
+    def test_records_from_an_object_holding_one_list(self):
+        raw = json.dumps({"count": 1, "slots": [{"day": 2}]})
+        self.assertEqual(decode_payload("schedule", raw).records, ({"day": 2},))
+
+    def test_work_sessions_have_durations(self):
+        raw = json.dumps(
+            {
+                "log": [
+                    {"startTime": 1700000000, "endTime": 1700003600},
+                    {"start": "23:30", "end": "00:15"},
+                    {"start": "2024-05-01T10:00:00", "end": "2024-05-01T10:20:30"},
+                    {"start": "10:00"},
+                ]
+            }
+        )
+        sessions = decode_payload("work_log", raw).records
+        self.assertEqual(sessions[0]["start"], 1700000000)
+        self.assertEqual(sessions[0]["end"], 1700003600)
+        self.assertEqual(sessions[0]["duration"], 3600)
+        self.assertEqual(sessions[1]["duration"], 45 * 60)
+        self.assertEqual(sessions[2]["duration"], 20 * 60 + 30)
+        self.assertNotIn("duration", sessions[3])
+
+    def test_base64_wrapped_json(self):
+        raw = b64encode(json.dumps([{"day": 5}]).encode()).decode()
+        self.assertEqual(decode_payload("schedule", raw).records, ({"day": 5},))
+
+    def test_undecodable_payload_is_kept_raw(self):
+        p = decode_payload("zones", "not a payload")
+        self.assertIsNone(p.records)
+        self.assertIsNone(p.summary)
+        self.assertEqual(p.attributes, {"raw": "not a payload"})
+
+    def test_payload_is_decoded_once_per_raw_value(self):
+        raw = json.dumps([{"day": 1}])
+        with patch.object(payload, "_parse", wraps=payload._parse) as parse:
+            first = decode_payload("schedule", raw)
+            self.assertIs(decode_payload("schedule", raw), first)
+            self.assertEqual(parse.call_count, 1)
+            decode_payload("schedule", json.dumps([{"day": 2}]))
+            self.assertEqual(parse.call_count, 2)
@@ -0,0 +1,74 @@
+from unittest import TestCase
+
+from custom_components.tuya_local_lawnmowers.helpers.poll_scheduler import (
+    CHANGE_WINDOW,
+    DEFAULT_POLL_INTERVAL,
+    PollScheduler,
+)
+
+
+class TestPollScheduler(TestCase):
+    def setUp(self):
+        self.subject = PollScheduler(min_interval=10, max_interval=300)
+
+    def test_unknown_activity_uses_default_interval(self):
+        self.assertEqual(self.subject.poll_interval(), DEFAULT_POLL_INTERVAL)
+        self.assertEqual(self.subject.mode, "normal")
+
+    def test_active_mower_polled_aggressively(self):
+        for activity in ("mowing", "returning"):
+            self.subject.set_activity(activity)
+            self.assertEqual(self.subject.mode, "active")
+            self.assertEqual(self.subject.poll_interval(), 10)
+
+    def test_resting_mower_polled_rarely(self):
+        for activity in ("standby", "charging", "docked"):
+            self.subject.set_activity(activity)
+            self.assertEqual(self.subject.mode, "resting")
+            self.assertEqual(self.subject.poll_interval(), 300)
+
+    def test_recent_changes_shorten_interval(self):
+        self.subject.set_activity("docked")
+        self.subject.record_changes(5, now=1000)
+        self.assertEqual(self.subject.poll_interval(now=1000), 150)
+        # changes older than the window no longer count
+        self.assertEqual(
+            self.subject.poll_interval(now=1001 + CHANGE_WINDOW),
+            300,
+        )
+
+    def test_failures_back_off_within_bounds(self):
+        self.subject.set_activity("mowing")
+        self.subject.record_failure()
+        self.assertEqual(self.subject.poll_interval(), 20)
+        for _ in range(10):
+            self.subject.record_failure()
+        self.assertEqual(self.subject.poll_interval(), 160)
+        self.subject.record_success()
+        self.assertEqual(self.subject.poll_interval(), 10)
+
+    def test_full_poll_interval(self):
+        self.assertEqual(self.subject.full_poll_interval(), 2 * DEFAULT_POLL_INTERVAL)
+        self.subject.set_activity("docked")
+        self.assertEqual(self.subject.full_poll_interval(), 300)
+
+    def test_bounds_are_ordered(self):
+        subject = PollScheduler(min_interval=60, max_interval=20)
+        self.assertEqual(subject.min_interval, 20)
+        self.assertEqual(subject.max_interval, 60)
+
+    def test_as_dict(self):
+        self.subject.set_activity("mowing")
+        self.assertEqual(
+            self.subject.as_dict(),
+            {
+                "activity": "mowing",
+                "mode": "active",
+                "poll_interval": 10,
+                "full_poll_interval": 20,
+                "change_rate": 0,
+                "failures": 0,
+                "min_interval": 10,
+                "max_interval": 300,
+            },
+        )
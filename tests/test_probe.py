@@ -0,0 +1,99 @@
+import asyncio
+from time import monotonic
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+import tinytuya
+
+from custom_components.tuya_local_lawnmowers.probe import async_probe_protocol
+
+from .fake_tuya_device import FakeTuyaDevice
+
+DEV_ID = "0123456789abcdef0123"
+LOCAL_KEY = "0123456789abcdef"
+DPS = {"6": 95, "101": "MOWING"}
+
+
+@pytest.mark.usefixtures("socket_enabled")
+class TestProbeProtocol(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.hass = MagicMock()
+
+        async def job(func, *args):
+            return func(*args)
+
+        self.hass.async_add_executor_job = AsyncMock(side_effect=job)
+
+    async def start_fake(self, version):
+        fake = FakeTuyaDevice(DEV_ID, LOCAL_KEY, version, DPS)
+        await fake.start()
+        self.addAsyncCleanup(fake.stop)
+        api = tinytuya.Device(DEV_ID, "127.0.0.1", LOCAL_KEY)
+        api.port = fake.port
+        return fake, api
+
+    async def test_finds_version(self):
+        for version in (3.1, 3.3, 3.4, 3.5):
+            with self.subTest(version=version):
+                fake, api = await self.start_fake(version)
+                found = await async_probe_protocol(
+                    self.hass,
+                    api,
+                    [3.3, 3.1, 3.4, 3.5],
+                    fan_out=2,
+                    timeout=0.5,
+                )
+                self.assertEqual(found, version)
+                # the device's own connection is not touched
+                self.assertEqual(api.version, 3.1)
+
+    async def test_preferred_version_wins_over_faster_answer(self):
+        fake, api = await self.start_fake(3.3)
+
+        async def job(func, *args):
+            # delay the 3.3 probe, so 3.22 answers first
+            if getattr(func, "__self__", None) and func.__self__.disabledetect:
+                await asyncio.sleep(0.2)
+            return func(*args)
+
+        self.hass.async_add_executor_job.side_effect = job
+        found = await async_probe_protocol(
+            self.hass, api, [3.3, 3.22], fan_out=2, timeout=1
+        )
+        self.assertEqual(found, 3.3)
+
+    async def test_preferred_answer_cancels_slower_probes(self):
+        fake, api = await self.start_fake(3.3)
+        start = monotonic()
+        found = await async_probe_protocol(
+            self.hass, api, [3.3, 3.4, 3.5], fan_out=3, timeout=5
+        )
+        self.assertEqual(found, 3.3)
+        self.assertLess(monotonic() - start, 2)
+
+    async def test_later_answer_waits_for_preferred_probes(self):
+        fake, api = await self.start_fake(3.3)
+        start = monotonic()
+        found = await async_probe_protocol(
+            self.hass, api, [3.4, 3.5, 3.3], fan_out=3, timeout=0.5
+        )
+        self.assertEqual(found, 3.3)
+        # no longer than the preferred probes take to time out
+        self.assertLess(monotonic() - start, 2)
+
+    async def test_fan_out_is_bounded(self):
+        fake, api = await self.start_fake(3.5)
+        await async_probe_protocol(
+            self.hass, api, [3.3, 3.1, 3.4, 3.5], fan_out=1, timeout=0.5
+        )
+        self.assertEqual(fake.connections, 4)
+        self.assertEqual(fake.max_clients, 1)
+
+    async def test_unreachable_device(self):
+        fake, api = await self.start_fake(3.3)
+        await fake.stop()
+        found = await async_probe_protocol(
+            self.hass, api, [3.3, 3.4], fan_out=2, timeout=0.5
+        )
+        self.assertIsNone(found)
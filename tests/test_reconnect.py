@@ -0,0 +1,81 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+import pytest
+
+from custom_components.tuya_local_lawnmowers.helpers.reconnect import (
+    BREAKER_CLOSED,
+    BREAKER_HALF_OPEN,
+    BREAKER_OPEN,
+    ReconnectSupervisor,
+    async_reachable,
+)
+
+
+class TestReconnectSupervisor(TestCase):
+    def setUp(self):
+        self.subject = ReconnectSupervisor(
+            base_delay=5, max_delay=60, failure_threshold=3
+        )
+
+    def test_backoff_grows_exponentially_with_jitter(self):
+        self.assertEqual(self.subject.backoff(), 0)
+        for failures, delay in ((1, 5), (2, 10), (3, 20), (4, 40), (5, 60), (9, 60)):
+            self.subject._failures = failures
+            for _ in range(20):
+                backoff = self.subject.backoff()
+                self.assertGreaterEqual(backoff, delay / 2)
+                self.assertLessEqual(backoff, delay)
+
+    def test_breaker_opens_after_threshold(self):
+        self.assertFalse(self.subject.record_failure(now=100))
+        self.assertFalse(self.subject.record_failure(now=100))
+        self.assertEqual(self.subject.state, BREAKER_CLOSED)
+        self.assertTrue(self.subject.record_failure(now=100))
+        self.assertEqual(self.subject.state, BREAKER_OPEN)
+        self.assertTrue(self.subject.is_open)
+        self.assertFalse(self.subject.allow_attempt(now=100))
+
+    def test_half_open_after_delay(self):
+        with patch("random.uniform", return_value=20):
+            for _ in range(3):
+                self.subject.record_failure(now=100)
+        self.assertEqual(self.subject.retry_delay(now=110), 10)
+        self.assertFalse(self.subject.allow_attempt(now=110))
+        self.assertTrue(self.subject.allow_attempt(now=120))
+        self.assertEqual(self.subject.state, BREAKER_HALF_OPEN)
+
+    def test_failure_when_half_open_reopens(self):
+        for _ in range(3):
+            self.subject.record_failure(now=100)
+        self.subject.reachable()
+        self.assertEqual(self.subject.state, BREAKER_HALF_OPEN)
+        self.assertTrue(self.subject.allow_attempt(now=100))
+        self.assertTrue(self.subject.record_failure(now=100))
+        self.assertEqual(self.subject.state, BREAKER_OPEN)
+
+    def test_success_closes(self):
+        for _ in range(3):
+            self.subject.record_failure()
+        self.assertTrue(self.subject.record_success())
+        self.assertEqual(self.subject.state, BREAKER_CLOSED)
+        self.assertEqual(self.subject.retry_delay(), 0)
+        self.assertFalse(self.subject.record_success())
+
+    def test_as_dict(self):
+        self.assertEqual(
+            self.subject.as_dict(),
+            {"state": "closed", "failures": 0, "retry_in": 0, "opened_at": None},
+        )
+
+
+@pytest.mark.usefixtures("socket_enabled")
+class TestReachable(IsolatedAsyncioTestCase):
+    async def test_reachable(self):
+        server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        self.assertTrue(await async_reachable("127.0.0.1", port))
+        server.close()
+        await server.wait_closed()
+        self.assertFalse(await async_reachable("127.0.0.1", port))
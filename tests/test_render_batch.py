@@ -0,0 +1,108 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+from custom_components.tuya_local_lawnmowers.helpers.render_batch import RenderBatch
+
+
+def make_entity(state):
+    entity = Mock()
+    entity.available = True
+    entity.state = state
+    entity.icon = None
+    entity.capability_attributes = None
+    entity.state_attributes = None
+    entity.extra_state_attributes = {"attr": 1}
+    return entity
+
+
+class TestRenderBatch(TestCase):
+    def setUp(self):
+        self.hass = Mock()
+        self.subject = RenderBatch(self.hass)
+
+    def test_batch_is_written_on_the_next_pass_of_the_loop(self):
+        entity = make_entity("on")
+        self.subject.mark([entity])
+        self.subject.mark([entity])
+        self.hass.loop.call_soon.assert_called_once_with(self.subject.flush)
+        entity.async_write_ha_state.assert_not_called()
+
+        self.subject.flush()
+        entity.async_write_ha_state.assert_called_once()
+        self.assertEqual(self.subject.coalesced, 1)
+
+    def test_entities_are_prepared_once_per_write(self):
+        entity = make_entity("on")
+        self.subject.mark([entity])
+        self.subject.mark([entity])
+        self.subject.flush()
+        entity.prepare_state_write.assert_called_once()
+
+    def test_window_delays_the_batch(self):
+        subject = RenderBatch(self.hass, window=250)
+        subject.mark([make_entity("on")])
+        self.hass.loop.call_later.assert_called_once_with(0.25, subject.flush)
+        self.hass.loop.call_soon.assert_not_called()
+
+    def test_attribute_changes_are_written(self):
+        entity = make_entity("on")
+        self.subject.mark([entity])
+        self.subject.flush()
+        self.subject.mark([entity])
+        self.subject.flush()
+        self.assertEqual(self.subject.suppressed, 1)
+
+        entity.extra_state_attributes = {"attr": 2}
+        self.subject.mark([entity])
+        self.subject.flush()
+        self.assertEqual(entity.async_write_ha_state.call_count, 2)
+
+    def test_availability_changes_are_written(self):
+        entity = make_entity("on")
+        self.subject.mark([entity])
+        self.subject.flush()
+        entity.available = False
+        self.subject.mark([entity])
+        self.subject.flush()
+        entity.available = True
+        self.subject.mark([entity])
+        self.subject.flush()
+        self.assertEqual(entity.async_write_ha_state.call_count, 3)
+
+    def test_failed_entity_does_not_stop_the_batch(self):
+        broken = make_entity("on")
+        broken.async_write_ha_state.side_effect = RuntimeError("no hass")
+        entity = make_entity("off")
+        self.subject.mark([broken, entity])
+        with self.assertLogs(
+            "custom_components.tuya_local_lawnmowers.helpers.render_batch",
+            "ERROR",
+        ):
+            self.subject.flush()
+        entity.async_write_ha_state.assert_called_once()
+        # nothing was written, so it is tried again next time
+        self.subject.mark([broken])
+        with self.assertLogs(
+            "custom_components.tuya_local_lawnmowers.helpers.render_batch",
+            "ERROR",
+        ):
+            self.subject.flush()
+        self.assertEqual(broken.async_write_ha_state.call_count, 2)
+
+    def test_forgotten_entity_is_written_again(self):
+        entity = make_entity("on")
+        self.subject.mark([entity])
+        self.subject.flush()
+        self.subject.forget(entity)
+        self.subject.mark([entity])
+        self.subject.flush()
+        self.assertEqual(entity.async_write_ha_state.call_count, 2)
+
+    def test_cancel_drops_the_batch(self):
+        entity = make_entity("on")
+        self.subject.mark([entity])
+        self.subject.cancel()
+        self.hass.loop.call_soon.return_value.cancel.assert_called_once()
+        self.subject.flush()
+        entity.async_write_ha_state.assert_not_called()
+        self.assertEqual(self.subject.as_dict()["flushes"], 0)
@@ -120,3 +120,35 @@ def test_sensor_suggested_display_precision():
     )
     sensor = TuyaLocalSensor(mock_device, config)
     assert sensor.suggested_display_precision is None
+
+
+def test_long_attributes_are_kept_out_of_the_recorder():
+    mock_device = Mock()
+    config = TuyaEntityConfig(
+        mock_device,
+        {
+            "entity": "sensor",
+            "dps": [
+                {"id": 1, "name": "sensor", "type": "integer"},
+                {"id": 2, "name": "note", "type": "string"},
+                {"id": 5, "name": "code", "type": "string", "unrecorded": True},
+            ],
+        },
+    )
+    dps = {"1": 5, "2": "x" * 300, "5": "y" * 300}
+    mock_device.get_property.side_effect = dps.get
+    sensor = TuyaLocalSensor(mock_device, config)
+
+    attributes = sensor.extra_state_attributes
+    assert attributes["note"].startswith("sha256:")
+    assert len(attributes["note"]) == 23
+    # unrecorded attributes are kept in full for the state machine
+    assert attributes["code"] == "y" * 300
+    dps["2"] = "short"
+    assert sensor.extra_state_attributes["note"] == "short"
+
+
+def test_payload_attributes_are_not_recorded():
+    assert {"slots", "sessions", "zones", "raw"} <= (
+        TuyaLocalSensor._unrecorded_attributes
+    )
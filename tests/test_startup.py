@@ -0,0 +1,99 @@
+"""Tests for the staggered startup of devices."""
+
+import asyncio
+
+import pytest
+
+from custom_components.tuya_local_lawnmowers.const import (
+    DATA_STARTUP_QUEUE,
+    DOMAIN,
+)
+from custom_components.tuya_local_lawnmowers.helpers.connection_profile import (
+    async_get_connection_profiles,
+)
+from custom_components.tuya_local_lawnmowers.helpers.startup import (
+    StartupQueue,
+    get_startup_queue,
+)
+
+
+async def set_up(queue, device_id, order, hold):
+    async with queue.turn(device_id, device_id):
+        order.append(device_id)
+        await hold.wait()
+
+
+@pytest.mark.asyncio
+async def test_queue_is_shared(hass):
+    queue = get_startup_queue(hass)
+    assert hass.data[DOMAIN][DATA_STARTUP_QUEUE] is queue
+    assert get_startup_queue(hass) is queue
+
+
+@pytest.mark.asyncio
+async def test_turns_are_limited_and_recent_devices_go_first(hass, hass_storage):
+    hass_storage["tuya_local_lawnmowers.connection_profiles"] = {
+        "version": 1,
+        "data": {
+            "old": {"version": 3.3, "failures": 0, "last_success": 100},
+            "recent": {"version": 3.3, "failures": 0, "last_success": 200},
+        },
+    }
+    await async_get_connection_profiles(hass)
+    queue = StartupQueue(hass, limit=2)
+    order = []
+    hold = asyncio.Event()
+
+    tasks = [
+        hass.async_create_task(set_up(queue, device_id, order, hold))
+        for device_id in ("unknown", "old", "other", "recent")
+    ]
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert order == ["recent", "old"]
+    assert queue.as_dict() == {"limit": 2, "active": 2, "waiting": 2}
+
+    hold.set()
+    await asyncio.gather(*tasks)
+    # devices never seen keep the order they arrived in
+    assert order == ["recent", "old", "unknown", "other"]
+    assert queue.as_dict()["active"] == 0
+    assert queue.timings("recent")["waited"] is not None
+    assert queue.timings("missing") == {"waited": None, "took": None}
+
+
+@pytest.mark.asyncio
+async def test_cancelled_wait_gives_up_its_turn(hass):
+    queue = StartupQueue(hass, limit=1)
+    order = []
+    hold = asyncio.Event()
+
+    first = hass.async_create_task(set_up(queue, "first", order, hold))
+    waiting = hass.async_create_task(set_up(queue, "waiting", order, hold))
+    last = hass.async_create_task(set_up(queue, "last", order, hold))
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    waiting.cancel()
+    hold.set()
+    await asyncio.gather(first, last)
+
+    assert order == ["first", "last"]
+    assert queue.as_dict()["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_setup_gives_up_its_turn(hass):
+    queue = StartupQueue(hass, limit=1)
+
+    with pytest.raises(RuntimeError):
+        async with queue.turn("broken", "broken"):
+            raise RuntimeError("offline")
+
+    assert queue.as_dict()["active"] == 0
+    assert queue.timings("broken")["took"] is not None
+
+
+def test_start_delay_is_within_jitter():
+    queue = StartupQueue(None, jitter=2.0)
+    for _ in range(20):
+        assert 0 <= queue.start_delay() <= 2.0
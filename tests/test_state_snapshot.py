@@ -0,0 +1,81 @@
+"""Tests for the persisted state snapshots."""
+
+from unittest.mock import Mock
+
+import pytest
+
+from custom_components.tuya_local_lawnmowers import async_remove_entry
+from custom_components.tuya_local_lawnmowers.const import (
+    CONF_DEVICE_ID,
+    DATA_STATE_SNAPSHOTS,
+    DOMAIN,
+)
+from custom_components.tuya_local_lawnmowers.helpers.state_snapshot import (
+    SAVE_DELAY,
+    STORAGE_KEY,
+    async_get_state_snapshots,
+)
+
+
+@pytest.mark.asyncio
+async def test_snapshots_are_loaded_from_storage(hass, hass_storage):
+    hass_storage[STORAGE_KEY] = {
+        "version": 1,
+        "data": {"dummy": {"dps": {"6": 80}, "saved_at": 100}},
+    }
+    snapshots = await async_get_state_snapshots(hass)
+
+    assert hass.data[DOMAIN][DATA_STATE_SNAPSHOTS] is snapshots
+    assert await async_get_state_snapshots(hass) is snapshots
+    assert snapshots.get("dummy") == {"dps": {"6": 80}, "saved_at": 100}
+    assert snapshots.get("unknown") is None
+
+
+@pytest.mark.asyncio
+async def test_excluded_dps_are_not_kept(hass):
+    snapshots = await async_get_state_snapshots(hass)
+
+    state = {"6": 80, "103": "MOWER_LEAN", "106": 1234, "updated_at": 100}
+    snapshots.record("dummy", state, {"103", "106"})
+    state["6"] = 79
+
+    assert snapshots.get("dummy") == {"dps": {"6": 79}, "saved_at": 100}
+
+
+@pytest.mark.asyncio
+async def test_snapshots_are_saved_without_being_put_off(hass, hass_storage, freezer):
+    snapshots = await async_get_state_snapshots(hass)
+
+    snapshots.record("dummy", {"6": 80, "updated_at": 100})
+    freezer.tick(SAVE_DELAY - 10)
+    # a later change joins the save already waiting
+    snapshots.record("dummy", {"6": 79, "updated_at": 200})
+    freezer.tick(10)
+    await snapshots._store._async_handle_write_data()
+
+    assert hass_storage[STORAGE_KEY]["data"]["dummy"] == {
+        "dps": {"6": 79},
+        "saved_at": 200,
+    }
+
+
+@pytest.mark.asyncio
+async def test_removing_an_entry_forgets_its_snapshot(hass, hass_storage, freezer):
+    hass_storage[STORAGE_KEY] = {
+        "version": 1,
+        "data": {
+            "dummy": {"dps": {"6": 80}, "saved_at": 100},
+            "other": {"dps": {"6": 50}, "saved_at": 100},
+        },
+    }
+    snapshots = await async_get_state_snapshots(hass)
+    snapshots.record("dummy", {"6": 79, "updated_at": 200})
+
+    await async_remove_entry(hass, Mock(data={CONF_DEVICE_ID: "dummy"}))
+    freezer.tick(SAVE_DELAY)
+    await snapshots._store._async_handle_write_data()
+
+    assert snapshots.get("dummy") is None
+    assert hass_storage[STORAGE_KEY]["data"] == {
+        "other": {"dps": {"6": 50}, "saved_at": 100}
+    }
@@ -0,0 +1,69 @@
+from unittest import TestCase
+
+from custom_components.tuya_local_lawnmowers.helpers.state_store import (
+    DecodeCache,
+    VersionedDict,
+)
+
+
+class TestVersionedDict(TestCase):
+    def setUp(self):
+        self.subject = VersionedDict({"1": True, "2": 3})
+
+    def assertChanges(self, change):
+        before = self.subject.version
+        change(self.subject)
+        self.assertGreater(self.subject.version, before)
+
+    def test_every_change_takes_a_new_version(self):
+        self.assertChanges(lambda d: d.__setitem__("1", False))
+        self.assertChanges(lambda d: d.__delitem__("1"))
+        self.assertChanges(lambda d: d.update({"3": "a"}))
+        self.assertChanges(lambda d: d.__ior__({"4": 1}))
+        self.assertChanges(lambda d: d.setdefault("5", 0))
+        self.assertChanges(lambda d: d.pop("5"))
+        self.assertChanges(lambda d: d.popitem())
+        self.assertChanges(lambda d: d.clear())
+
+    def test_reads_keep_the_version(self):
+        before = self.subject.version
+        self.subject.get("1")
+        self.subject.pop("9", None)
+        self.subject.setdefault("1", False)
+        self.assertEqual(self.subject.version, before)
+
+    def test_versions_are_unique_across_dicts(self):
+        other = VersionedDict()
+        self.assertGreater(other.version, self.subject.version)
+        self.subject["1"] = False
+        self.assertGreater(self.subject.version, other.version)
+
+
+class TestDecodeCache(TestCase):
+    def setUp(self):
+        self.subject = DecodeCache()
+        self.computed = 0
+
+    def compute(self):
+        self.computed += 1
+        return self.computed
+
+    def test_results_are_reused_within_a_version(self):
+        self.assertEqual(self.subject.get(1, "a", self.compute), 1)
+        self.assertEqual(self.subject.get(1, "a", self.compute), 1)
+        self.assertEqual(self.subject.get(1, "b", self.compute), 2)
+        self.assertEqual(self.subject.as_dict(), {"hits": 1, "misses": 2, "entries": 2})
+
+    def test_a_new_version_drops_results(self):
+        self.subject.get(1, "a", self.compute)
+        self.assertEqual(self.subject.get(2, "a", self.compute), 2)
+        self.assertEqual(self.subject.as_dict()["entries"], 1)
+
+    def test_result_from_an_older_version_is_not_kept(self):
+        def compute_across_versions():
+            # a nested lookup sees the state move on
+            self.subject.get(2, "b", self.compute)
+            return "stale"
+
+        self.subject.get(1, "a", compute_across_versions)
+        self.assertEqual(self.subject.get(2, "a", self.compute), 2)
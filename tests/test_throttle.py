@@ -0,0 +1,76 @@
+from unittest import TestCase
+
+from custom_components.tuya_local_lawnmowers.helpers.throttle import (
+    QUIET_PERIOD,
+    Throttle,
+)
+
+
+class TestThrottle(TestCase):
+    def test_min_interval_holds_values_back(self):
+        t = Throttle(min_interval=60)
+        self.assertEqual(t.filter(80, now=0), 80)
+        self.assertEqual(t.filter(79, now=10), 80)
+        self.assertEqual(t.filter(78, now=20), 80)
+        self.assertEqual(t.release_at(), 60)
+        self.assertEqual(t.filter(77, now=61), 77)
+        self.assertIsNone(t.release_at())
+
+    def test_deadband_holds_small_changes_back(self):
+        t = Throttle(deadband=2)
+        self.assertEqual(t.filter(10, now=0), 10)
+        self.assertEqual(t.filter(11, now=1), 10)
+        self.assertEqual(t.filter(9.5, now=2), 10)
+        self.assertEqual(t.filter(12, now=3), 12)
+
+    def test_held_value_is_released_after_quiet_period(self):
+        t = Throttle(deadband=2)
+        t.filter(10, now=0)
+        t.filter(11, now=5)
+        self.assertEqual(t.release_at(), 5 + QUIET_PERIOD)
+        self.assertFalse(t.release(now=QUIET_PERIOD))
+        self.assertTrue(t.release(now=5 + QUIET_PERIOD))
+        self.assertEqual(t.filter(11, now=5 + QUIET_PERIOD), 11)
+        self.assertIsNone(t.release_at())
+
+    def test_newer_held_value_restarts_quiet_period(self):
+        t = Throttle(deadband=2, min_interval=30)
+        t.filter(10, now=0)
+        t.filter(11, now=40)
+        t.filter(10.5, now=50)
+        self.assertEqual(t.release_at(), 80)
+
+    def test_returning_to_shown_value_drops_held_value(self):
+        t = Throttle(min_interval=60)
+        t.filter(80, now=0)
+        t.filter(79, now=10)
+        t.filter(80, now=20)
+        self.assertIsNone(t.release_at())
+        self.assertFalse(t.release(now=100))
+
+    def test_threshold_crossings_bypass_throttle(self):
+        t = Throttle(deadband=5, min_interval=60, thresholds=[20])
+        t.filter(21, now=0)
+        self.assertEqual(t.filter(20, now=1), 21)
+        self.assertEqual(t.filter(19, now=2), 19)
+        self.assertEqual(t.filter(20, now=3), 20)
+
+    def test_non_numbers_are_always_shown(self):
+        t = Throttle(deadband=5, min_interval=60)
+        t.filter(10, now=0)
+        self.assertIsNone(t.filter(None, now=1))
+        self.assertEqual(t.filter(11, now=2), 11)
+
+    def test_reset_shows_next_value(self):
+        t = Throttle(min_interval=60)
+        t.filter(10, now=0)
+        t.reset()
+        self.assertEqual(t.filter(11, now=1), 11)
+
+    def test_shown_value_is_not_moved_by_reading(self):
+        t = Throttle(min_interval=60)
+        self.assertEqual(t.shown(5), 5)
+        t.filter(10, now=0)
+        t.filter(11, now=10)
+        self.assertEqual(t.shown(11), 10)
+        self.assertEqual(t.shown(), 10)
@@ -0,0 +1,241 @@
+import asyncio
+from time import time
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import tinytuya
+from tinytuya.core import command_types as CT
+
+from custom_components.tuya_local_lawnmowers.device import TuyaLocalDevice
+from custom_components.tuya_local_lawnmowers.transport import (
+    TuyaAsyncTransport,
+    TuyaFrameReader,
+)
+
+from .fake_tuya_device import FakeTuyaDevice
+
+DEV_ID = "0123456789abcdef0123"
+LOCAL_KEY = "0123456789abcdef"
+DPS = {"6": 95, "101": "MOWING", "105": 4}
+
+
+@pytest.mark.usefixtures("socket_enabled")
+class TestTuyaAsyncTransport(IsolatedAsyncioTestCase):
+    async def start_fake(self, version):
+        fake = FakeTuyaDevice(DEV_ID, LOCAL_KEY, version, DPS)
+        await fake.start()
+        self.addAsyncCleanup(fake.stop)
+        api = tinytuya.Device(DEV_ID, "127.0.0.1", LOCAL_KEY, version=version)
+        api.port = fake.port
+        transport = TuyaAsyncTransport(api, timeout=2)
+        self.addCleanup(transport.close)
+        return fake, transport
+
+    async def test_status(self):
+        for version in (3.1, 3.3, 3.4, 3.5):
+            with self.subTest(version=version):
+                fake, transport = await self.start_fake(version)
+                result = await transport.async_status()
+                self.assertEqual(result["dps"], DPS)
+
+    async def test_status_skips_empty_acknowledgement(self):
+        for version in (3.4, 3.5):
+            with self.subTest(version=version):
+                fake, transport = await self.start_fake(version)
+                fake.ack_queries = True
+                result = await transport.async_status()
+                self.assertEqual(result["dps"], DPS)
+
+    async def test_set_values_reports_new_state(self):
+        for version in (3.1, 3.3, 3.4, 3.5):
+            with self.subTest(version=version):
+                fake, transport = await self.start_fake(version)
+                await transport.async_set_values({105: 6})
+                result = await transport.async_receive(2)
+                self.assertEqual(result["dps"], {"105": 6})
+                self.assertEqual(fake.dps["105"], 6)
+
+    async def test_receive_pushed_update(self):
+        fake, transport = await self.start_fake(3.4)
+        await transport.async_status()
+        await fake.push({"101": "PARK"})
+        result = await transport.async_receive(2)
+        self.assertEqual(result["dps"], {"101": "PARK"})
+
+    async def test_updatedps_arrives_as_update(self):
+        fake, transport = await self.start_fake(3.3)
+        self.assertIsNone(await transport.async_updatedps([6]))
+        result = await transport.async_receive(2)
+        self.assertEqual(result["dps"], {"6": 95})
+
+    async def test_receive_sends_heartbeat_when_idle(self):
+        fake, transport = await self.start_fake(3.3)
+        self.assertIsNone(await transport.async_receive(0.05))
+        await asyncio.sleep(0.05)
+        self.assertIn(CT.HEART_BEAT, fake.commands())
+
+    async def test_receive_skips_heartbeat_after_recent_traffic(self):
+        fake, transport = await self.start_fake(3.3)
+        await transport.async_status()
+        self.assertIsNone(await transport.async_receive(0.05))
+        await asyncio.sleep(0.05)
+        self.assertNotIn(CT.HEART_BEAT, fake.commands())
+
+    async def test_reconnects_on_version_change(self):
+        fake, transport = await self.start_fake(3.5)
+        transport._api.set_version(3.3)
+        with self.assertRaises(Exception):
+            await transport.async_status()
+        transport._api.set_version(3.5)
+        result = await transport.async_status()
+        self.assertEqual(result["dps"], DPS)
+
+    async def test_receive_and_request_share_one_connection(self):
+        for version in (3.3, 3.5):
+            with self.subTest(version=version):
+                fake, transport = await self.start_fake(version)
+                receiver = asyncio.create_task(transport.async_receive(0.5))
+                result = await transport.async_status()
+                await receiver
+                self.assertEqual(result["dps"], DPS)
+                self.assertEqual(fake.connections, 1)
+
+    async def test_close_wakes_receiver(self):
+        fake, transport = await self.start_fake(3.3)
+        await transport.async_connect()
+        receiver = asyncio.create_task(transport.async_receive(5))
+        await asyncio.sleep(0)
+        transport.close()
+        self.assertIsNone(await receiver)
+
+    async def test_connection_lost_raises(self):
+        fake, transport = await self.start_fake(3.3)
+        await transport.async_connect()
+        receiver = asyncio.create_task(transport.async_receive(5))
+        await asyncio.sleep(0.05)
+        await fake.stop()
+        with self.assertRaises(ConnectionError):
+            await receiver
+
+
+class TestTuyaFrameReader(IsolatedAsyncioTestCase):
+    def frame(self, seqno):
+        api = tinytuya.Device(DEV_ID, "127.0.0.1", LOCAL_KEY, version=3.3)
+        api.seqno = seqno
+        return api._encode_message(api.generate_payload(CT.HEART_BEAT))
+
+    def test_split_and_garbage(self):
+        data = b"junk" + self.frame(1) + self.frame(2)
+        reader = TuyaFrameReader()
+        seen = []
+        for i in range(0, len(data), 7):
+            reader.feed(data[i : i + 7])
+            while msg := reader.next_message(no_retcode=True):
+                seen.append(msg.seqno)
+        self.assertEqual(seen, [1, 2])
+
+    def test_incomplete_message_waits(self):
+        reader = TuyaFrameReader()
+        frame = self.frame(1)
+        reader.feed(frame[:-1])
+        self.assertIsNone(reader.next_message(no_retcode=True))
+        reader.feed(frame[-1:])
+        self.assertEqual(reader.next_message(no_retcode=True).seqno, 1)
+
+
+@pytest.mark.usefixtures("socket_enabled")
+class TestNativeTransportDevice(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.fake = FakeTuyaDevice(DEV_ID, LOCAL_KEY, 3.4, DPS)
+        await self.fake.start()
+        self.addAsyncCleanup(self.fake.stop)
+
+        self.hass = MagicMock()
+        self.hass.data = {"tuya_local_lawnmowers": {}}
+        self.hass.is_running = True
+        self.hass.is_stopping = False
+
+        async def job(func, *args):
+            return func(*args)
+
+        self.hass.async_add_executor_job = AsyncMock(side_effect=job)
+        self.subject = TuyaLocalDevice(
+            "Native",
+            DEV_ID,
+            "127.0.0.1",
+            LOCAL_KEY,
+            3.4,
+            None,
+            self.hass,
+            native_transport=True,
+        )
+        self.subject._api.port = self.fake.port
+
+    async def test_refresh_uses_transport(self):
+        await self.subject.async_refresh()
+        self.assertEqual(self.subject.get_property("101"), "MOWING")
+        self.assertTrue(self.subject.has_returned_state)
+        self.assertFalse(self.subject._transport.connected)
+
+    async def test_set_property_uses_transport(self):
+        await self.subject.async_set_property("105", 7)
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.fake.dps["105"], 7)
+        self.assertTrue(self.subject._pending_updates["105"]["sent"])
+
+    async def test_receive_loop_gets_pushed_updates(self):
+        self.subject._cached_state = {"updated_at": 0}
+        self.subject._running = True
+        received = self.subject.async_receive()
+        poll = await anext(received)
+        self.assertEqual(poll, {**DPS, "full_poll": True})
+        self.subject._cached_state = {**DPS, "updated_at": time()}
+
+        pending = asyncio.create_task(anext(received))
+        await asyncio.sleep(0.3)
+        await self.fake.push({"101": "STANDBY"})
+        poll = await pending
+        self.assertEqual(poll, {"101": "STANDBY", "full_poll": False})
+        # only the protocol version is set from an executor thread
+        for job in self.hass.async_add_executor_job.await_args_list:
+            self.assertEqual(job.args[0], self.subject._api.set_version)
+        self.subject._running = False
+        await received.aclose()
+
+    async def test_refresh_survives_empty_reply(self):
+        self.subject._transport.async_status = AsyncMock(return_value=None)
+        await self.subject.async_refresh()
+        self.assertFalse(self.subject.has_returned_state)
+
+    def test_tinytuya_without_native_members_uses_its_socket(self):
+        with patch(
+            "custom_components.tuya_local_lawnmowers.transport.NATIVE_API_MEMBERS",
+            ("_no_such_member",),
+        ):
+            device = TuyaLocalDevice(
+                "Fallback",
+                DEV_ID,
+                "127.0.0.1",
+                LOCAL_KEY,
+                3.4,
+                None,
+                self.hass,
+                native_transport=True,
+            )
+        self.assertIsNone(device._transport)
+
+    def test_sub_devices_share_gateway_connection(self):
+        device = TuyaLocalDevice(
+            "Child",
+            DEV_ID,
+            "127.0.0.1",
+            LOCAL_KEY,
+            3.4,
+            "child_cid",
+            self.hass,
+        )
+        self.assertIs(
+            device._transport._gateway,
+            self.hass.data["tuya_local_lawnmowers"][DEV_ID]["gateway"],
+        )
@@ -0,0 +1,71 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from custom_components.tuya_local_lawnmowers.helpers.write_queue import (
+    PendingUpdates,
+)
+
+
+class TestPendingUpdates(TestCase):
+    def setUp(self):
+        self.subject = PendingUpdates(timeout=5)
+
+    def test_unsent_in_dp_order(self):
+        self.subject.add({"115": "PauseWork", "2": 3, "10": True}, now=100)
+        self.assertEqual(list(self.subject.unsent()), ["2", "10", "115"])
+
+    def test_sent_values_are_pending_but_not_unsent(self):
+        self.subject.add({"1": True, "2": 3}, now=100)
+        self.subject.mark_sent({"1": True}, now=100)
+        with patch(
+            "custom_components.tuya_local_lawnmowers.helpers.write_queue.time",
+            return_value=101,
+        ):
+            self.assertEqual(self.subject.unsent(), {"2": 3})
+            self.assertEqual(self.subject.pending_values(), {"1": True, "2": 3})
+
+    def test_newer_value_is_not_marked_sent(self):
+        self.subject.add({"1": True}, now=100)
+        self.subject.add({"1": False}, now=100.05)
+        self.subject.mark_sent({"1": True}, now=100.1)
+        self.assertFalse(self.subject["1"]["sent"])
+        self.assertEqual(self.subject.unsent(), {"1": False})
+
+    def test_sent_values_expire(self):
+        self.subject.add({"1": True, "2": 3}, now=100)
+        self.subject.mark_sent({"1": True, "2": 3}, now=100)
+        self.subject.expire(now=104.9)
+        self.assertEqual(len(self.subject), 2)
+        self.subject.expire(now=105)
+        self.assertEqual(len(self.subject), 0)
+
+    def test_unsent_values_do_not_expire(self):
+        self.subject.add({"1": True}, now=100)
+        self.subject.expire(now=1000)
+        self.assertEqual(self.subject.unsent(), {"1": True})
+
+    def test_resent_value_expires_from_latest_send(self):
+        self.subject.add({"1": True}, now=100)
+        self.subject.mark_sent({"1": True}, now=100)
+        self.subject.add({"1": False}, now=103)
+        self.subject.mark_sent({"1": False}, now=103)
+        self.subject.expire(now=106)
+        self.assertEqual(self.subject["1"]["value"], False)
+        self.subject.expire(now=108)
+        self.assertNotIn("1", self.subject)
+
+    def test_confirm_drops_matching_sent_values(self):
+        self.subject.add({"1": True, "2": 3, "3": "a"}, now=100)
+        self.subject.mark_sent({"1": True, "2": 3}, now=100)
+        self.subject.confirm({"1": True, "2": 4, "3": "a"})
+        self.assertNotIn("1", self.subject)
+        self.assertIn("2", self.subject)
+        # not sent yet, so the device reporting it is a coincidence
+        self.assertIn("3", self.subject)
+
+    def test_initial_sent_entries_expire(self):
+        subject = PendingUpdates(
+            {"1": {"value": True, "sent": True, "updated_at": 100}}, timeout=5
+        )
+        subject.expire(now=106)
+        self.assertEqual(len(subject), 0)
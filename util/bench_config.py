@@ -0,0 +1,93 @@
+"""Measure the config object graph over a synthetic fleet of devices.
+
+Run from the top of the repository:
+
+    PYTHONPATH=. python util/bench_config.py [--devices N] [--configs N]
+
+The fleet is made of devices spread over copies of the Moebot config.  Each
+device walks its entity configs the way entity setup and state writes do:
+reading the config_id and unique_id of each entity, and the id, type, format
+and mask of each dp, then looking up its available dp and reading values.
+The memory held by the configs, and allocated by one pass over the fleet,
+is reported along with the time a pass takes.
+"""
+
+import argparse
+import sys
+import tracemalloc
+from time import perf_counter
+from unittest.mock import MagicMock
+
+from custom_components.tuya_local_lawnmowers.device import TuyaLocalDevice
+from custom_components.tuya_local_lawnmowers.helpers.device_config import (
+    TuyaDeviceConfig,
+    get_config,
+)
+from tests.const import MOEBOT_PAYLOAD
+
+
+def make_device(n):
+    hass = MagicMock()
+    hass.data = {"tuya_local_lawnmowers": {}}
+    device = TuyaLocalDevice(
+        f"Bench {n}",
+        f"bench{n:016d}",
+        "127.0.0.1",
+        "0123456789abcdef",
+        3.3,
+        None,
+        hass,
+    )
+    device._cached_state = MOEBOT_PAYLOAD | {"updated_at": 1}
+    return device
+
+
+def walk(config, device):
+    for entity in config.all_entities():
+        entity.config_id
+        entity.unique_id(device.unique_id)
+        entity.available(device)
+        for dp in entity.dps():
+            dp.id, dp.type, dp.format, dp.mask
+            dp.get_value(device)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--configs", type=int, default=10)
+    args = parser.parse_args()
+
+    source = get_config("moebot_s_mower")._config
+    fleet = [make_device(n) for n in range(args.devices)]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    configs = [
+        TuyaDeviceConfig(f"synthetic_{n}.yaml", source) for n in range(args.configs)
+    ]
+    # first pass, which builds anything the configs keep
+    for n, device in enumerate(fleet):
+        walk(configs[n % args.configs], device)
+    held = tracemalloc.get_traced_memory()[0] - before
+
+    tracemalloc.reset_peak()
+    start = tracemalloc.get_traced_memory()[0]
+    for n, device in enumerate(fleet):
+        walk(configs[n % args.configs], device)
+    churn = tracemalloc.get_traced_memory()[1] - start
+    tracemalloc.stop()
+
+    start = perf_counter()
+    for _ in range(10):
+        for n, device in enumerate(fleet):
+            walk(configs[n % args.configs], device)
+    elapsed = (perf_counter() - start) / 10
+
+    print(f"held by {args.configs} configs: {held / 1024:.1f} KiB")
+    print(f"peak allocated by a pass: {churn / 1024:.1f} KiB")
+    print(f"pass over {args.devices} devices: {1000 * elapsed:.2f} ms")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""Measure decoding of bitfield and packed dps.
+
+Run from the top of the repository:
+
+    PYTHONPATH=. python util/bench_decode.py [--fields N]
+
+Three cases are timed, each as a new frame arriving followed by every dp
+of the case being read, the way a state write after an update reads them:
+
+- dp 102 of the Moebot config, the bitfield read by the problem binary
+  sensor and the fault_code attribute;
+- a hex dp split by masks into N fields, some of them signed;
+- the same fields packed into a base64 dp.
+"""
+
+import argparse
+import sys
+from base64 import b64encode
+from timeit import Timer
+from unittest.mock import MagicMock
+
+from custom_components.tuya_local_lawnmowers.device import TuyaLocalDevice
+from custom_components.tuya_local_lawnmowers.helpers.device_config import (
+    TuyaEntityConfig,
+    get_config,
+)
+from tests.const import MOEBOT_PAYLOAD
+
+
+def make_device():
+    hass = MagicMock()
+    hass.data = {"tuya_local_lawnmowers": {}}
+    device = TuyaLocalDevice(
+        "Bench",
+        "bench0000000000000000",
+        "127.0.0.1",
+        "0123456789abcdef",
+        3.3,
+        None,
+        hass,
+    )
+    device._cached_state = MOEBOT_PAYLOAD | {"updated_at": 1}
+    return device
+
+
+def packed_dps(rawtype, fields):
+    """Return the dp configs of fields packed a byte each into dp 150."""
+    entity = TuyaEntityConfig(
+        MagicMock(),
+        {
+            "entity": "sensor",
+            "dps": [
+                {
+                    "id": 150,
+                    "name": f"field_{n}",
+                    "type": rawtype,
+                    "mask": f"{0xFF << (8 * n):0{2 * fields}X}",
+                    "mask_signed": n % 2 == 1,
+                }
+                for n in range(fields)
+            ],
+        },
+    )
+    return list(entity.dps())
+
+
+def read_frame(device, dps, dp_id, raw):
+    device._cached_state[dp_id] = raw
+    for dp in dps:
+        dp.get_value(device)
+
+
+def best(stmt, number):
+    """Return the best time per run in microseconds."""
+    return min(Timer(stmt).repeat(5, number)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fields", type=int, default=8)
+    args = parser.parse_args()
+
+    device = make_device()
+    dp102 = [
+        dp
+        for entity in get_config("moebot_s_mower").all_entities()
+        for dp in entity.dps()
+        if dp.id == "102"
+    ]
+    blob = bytes(range(0x70, 0x70 + args.fields))
+    cases = [
+        ("dp 102", dp102, "102", [0, 4]),
+        ("hex", packed_dps("hex", args.fields), "150", [blob.hex()]),
+        (
+            "base64",
+            packed_dps("base64", args.fields),
+            "150",
+            [b64encode(blob).decode()],
+        ),
+    ]
+    for name, dps, dp_id, values in cases:
+        frames = iter(values * 1000000)
+        elapsed = best(
+            lambda: read_frame(device, dps, dp_id, next(frames)),
+            2000,
+        )
+        print(f"{name}: {len(dps)} dps read in {elapsed:.2f} us per frame")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""Measure the CPU used by the receive loop of idle connected devices.
+
+Run from the top of the repository:
+
+    PYTHONPATH=. python util/bench_idle.py [--devices N] [--seconds S]
+
+Each device is connected to its own fake device on localhost, which never
+reports anything, so any CPU used is the cost of waiting.
+
+Each transport is measured twice: "before" runs a copy of the idle pass of
+the receive loop as it was before it waited on the socket, sending a
+heartbeat before every tinytuya receive and sleeping 0.1s after each pass,
+and "after" runs the current receive loop.
+"""
+
+import argparse
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from time import process_time
+from unittest.mock import MagicMock
+
+from custom_components.tuya_local_lawnmowers.device import TuyaLocalDevice
+from custom_components.tuya_local_lawnmowers.transport import HEARTBEAT_INTERVAL
+from tests.fake_tuya_device import FakeTuyaDevice
+
+LOCAL_KEY = "0123456789abcdef"
+DPS = {"6": 95, "101": "STANDBY", "105": 4}
+
+
+def make_hass(loop, executor):
+    hass = MagicMock()
+    hass.data = {"tuya_local_lawnmowers": {}}
+    hass.is_running = True
+    hass.is_stopping = False
+
+    async def job(func, *args):
+        return await loop.run_in_executor(executor, func, *args)
+
+    hass.async_add_executor_job = job
+    return hass
+
+
+async def run_device(device):
+    async for _ in device.async_receive():
+        pass
+
+
+async def run_device_before(device):
+    """The idle pass of the receive loop before it waited on the socket."""
+    device._set_persistent(True)
+    while device._running:
+        if device._transport:
+            await device._transport.async_receive(HEARTBEAT_INTERVAL)
+        else:
+            await device._hass.async_add_executor_job(device._api.heartbeat, True)
+            await device._hass.async_add_executor_job(device._api.receive)
+        await asyncio.sleep(0.1)
+
+
+async def bench(count, seconds, native, before):
+    loop = asyncio.get_running_loop()
+    # one thread per device, as each blocks in receive on the executor
+    executor = ThreadPoolExecutor(max_workers=count + 4)
+    hass = make_hass(loop, executor)
+    fakes = []
+    devices = []
+    for i in range(count):
+        dev_id = f"bench{i:015d}"
+        fake = FakeTuyaDevice(dev_id, LOCAL_KEY, 3.3, DPS)
+        await fake.start()
+        fakes.append(fake)
+        device = TuyaLocalDevice(
+            f"Bench {i}",
+            dev_id,
+            "127.0.0.1",
+            LOCAL_KEY,
+            3.3,
+            None,
+            hass,
+            native_transport=native,
+            # long enough that no poll falls within the measurement
+            min_poll_interval=3600,
+            max_poll_interval=3600,
+        )
+        device._api.port = fake.port
+        # settles the protocol version and the state, as at startup
+        await device.async_refresh()
+        device._running = True
+        devices.append(device)
+
+    run = run_device_before if before else run_device
+    tasks = [asyncio.create_task(run(d)) for d in devices]
+    # let the connections settle before measuring
+    await asyncio.sleep(1)
+    cpu = process_time()
+    await asyncio.sleep(seconds)
+    cpu = process_time() - cpu
+
+    for device in devices:
+        device._running = False
+        device._set_persistent(False)
+    await asyncio.wait(tasks, timeout=10)
+    for fake in fakes:
+        await fake.stop()
+    executor.shutdown(wait=False, cancel_futures=True)
+    return cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    for native in (False, True):
+        for before in (True, False):
+            cpu = asyncio.run(bench(args.devices, args.seconds, native, before))
+            print(
+                f"{'native' if native else 'tinytuya'} transport "
+                f"{'before' if before else 'after'}: "
+                f"{1000 * cpu / args.seconds / args.devices:.3f} ms CPU "
+                f"per device per second ({args.devices} devices, {args.seconds}s)"
+            )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Measure the time from entry setup to the first entity being available.
+
+Run from the top of the repository:
+
+    PYTHONPATH=. python util/bench_restart.py [--latency S] [--offline]
+
+The device answers its first status request after --latency seconds, or
+never answers with --offline, giving up after the same time each attempt.
+Setup is timed the way async_setup_entry runs it, first with no saved
+state, then with the state saved before a restart.
+"""
+
+import argparse
+import asyncio
+import sys
+from time import perf_counter, sleep
+from unittest.mock import MagicMock, patch
+
+from custom_components.tuya_local_lawnmowers.device import TuyaLocalDevice
+from custom_components.tuya_local_lawnmowers.helpers.state_snapshot import (
+    StateSnapshots,
+)
+from tests.const import MOEBOT_PAYLOAD
+
+
+def make_hass(loop, snapshots):
+    hass = MagicMock()
+    hass.loop = loop
+    hass.is_running = True
+    hass.is_stopping = False
+    hass.data = {"tuya_local_lawnmowers": {"state_snapshots": snapshots}}
+    hass.async_add_executor_job = lambda f, *a: loop.run_in_executor(None, f, *a)
+    return hass
+
+
+def make_api(latency, offline):
+    def status():
+        sleep(latency)
+        if offline:
+            return {"Err": "905", "Error": "Network Error: Device Unreachable"}
+        return {"dps": MOEBOT_PAYLOAD}
+
+    api = MagicMock()
+    api.parent = None
+    api.status.side_effect = status
+    return api
+
+
+async def set_up(latency, offline, snapshot):
+    loop = asyncio.get_running_loop()
+    snapshots = None
+    if snapshot:
+        snapshots = MagicMock(spec=StateSnapshots)
+        snapshots.get.return_value = {"dps": MOEBOT_PAYLOAD, "saved_at": 1}
+    hass = make_hass(loop, snapshots)
+    start = perf_counter()
+    with patch("tinytuya.Device", return_value=make_api(latency, offline)):
+        device = await hass.async_add_executor_job(
+            TuyaLocalDevice,
+            "Bench",
+            "bench0000000000000",
+            "127.0.0.1",
+            "0123456789abcdef",
+            3.3,
+            None,
+            hass,
+        )
+        if not device.stale:
+            await device.async_refresh()
+    elapsed = perf_counter() - start
+    device._io.close()
+    return device.available, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=2.0)
+    parser.add_argument("--offline", action="store_true")
+    args = parser.parse_args()
+
+    for snapshot in (False, True):
+        available, elapsed = asyncio.run(set_up(args.latency, args.offline, snapshot))
+        print(
+            f"{'snapshot' if snapshot else 'no snapshot'}: "
+            f"{'available' if available else 'unavailable'} after "
+            f"{1000 * elapsed:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
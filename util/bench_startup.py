@@ -0,0 +1,71 @@
+"""Count the device configs built while setting up config entries.
+
+Run from the top of the repository:
+
+    PYTHONPATH=. python util/bench_startup.py [--entries N] [--type TYPE]
+
+Each entry looks its config up the way Home Assistant startup does: once
+in async_setup_entry, then once for each platform it forwards to.  The same
+is then done without the config cache, for comparison.  Each config built
+is counted, along with those that missed the precompiled bundle and had to
+be parsed from YAML.
+"""
+
+import argparse
+import sys
+from time import perf_counter
+from unittest.mock import patch
+
+from custom_components.tuya_local_lawnmowers.helpers import device_config
+from custom_components.tuya_local_lawnmowers.helpers.device_config import (
+    clear_config_cache,
+    get_config,
+)
+
+
+def set_up_entries(entries, conf_type, cached):
+    for _ in range(entries):
+        if not cached:
+            clear_config_cache()
+        # async_setup_entry
+        platforms = {e.entity for e in get_config(conf_type).all_entities()}
+        # async_tuya_setup_platform
+        for platform in platforms:
+            if not cached:
+                clear_config_cache()
+            for e in get_config(conf_type).all_entities():
+                e.entity == platform
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=20)
+    parser.add_argument("--type", default="moebot_s_mower")
+    args = parser.parse_args()
+
+    for cached in (True, False):
+        clear_config_cache()
+        with (
+            patch.object(
+                device_config,
+                "TuyaDeviceConfig",
+                wraps=device_config.TuyaDeviceConfig,
+            ) as build,
+            patch.object(
+                device_config,
+                "load_yaml",
+                wraps=device_config.load_yaml,
+            ) as parse,
+        ):
+            start = perf_counter()
+            set_up_entries(args.entries, args.type, cached)
+            elapsed = perf_counter() - start
+        print(
+            f"{'cached' if cached else 'uncached'}: {build.call_count} builds, "
+            f"{parse.call_count} bundle misses, "
+            f"{1000 * elapsed:.1f} ms for {args.entries} entries"
+        )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
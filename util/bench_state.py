@@ -0,0 +1,90 @@
+"""Measure reading device state, as entities do when their state is written.
+
+Run from the top of the repository:
+
+    PYTHONPATH=. python util/bench_state.py [--entities N] [--pending N]
+
+A device is set up with the Moebot config and payload, and every entity
+config is read the way entities read them to build their state.  Entity
+configs are repeated to reach the requested number of entities.  State
+writes are measured both with the state unchanged since the last write, and
+after a change to the state.
+"""
+
+import argparse
+import sys
+from itertools import cycle, islice
+from timeit import Timer
+from unittest.mock import MagicMock
+
+from custom_components.tuya_local_lawnmowers.device import TuyaLocalDevice
+from custom_components.tuya_local_lawnmowers.helpers.device_config import (
+    TuyaDeviceConfig,
+)
+from tests.const import MOEBOT_PAYLOAD
+
+
+def make_device(pending):
+    hass = MagicMock()
+    hass.data = {"tuya_local_lawnmowers": {}}
+    device = TuyaLocalDevice(
+        "Bench",
+        "bench0000000000000000",
+        "127.0.0.1",
+        "0123456789abcdef",
+        3.3,
+        None,
+        hass,
+    )
+    device._cached_state = MOEBOT_PAYLOAD | {"updated_at": 1}
+    # writes waiting to be confirmed, which are laid over the cached state
+    for dp in list(MOEBOT_PAYLOAD)[:pending]:
+        device._pending_updates.add({dp: MOEBOT_PAYLOAD[dp]})
+    return device
+
+
+def write_states(device, entities):
+    for config in entities:
+        config.available(device)
+        for dp in config.dps():
+            dp.get_value(device)
+        device.has_returned_state
+
+
+def write_states_after_change(device, entities):
+    device._cached_state["updated_at"] += 1
+    write_states(device, entities)
+
+
+def best(stmt, number):
+    """Return the best time per run in microseconds."""
+    return min(Timer(stmt).repeat(5, number)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entities", type=int, default=20)
+    parser.add_argument("--pending", type=int, default=2)
+    args = parser.parse_args()
+
+    device = make_device(args.pending)
+    configs = list(TuyaDeviceConfig("moebot_s_mower.yaml").all_entities())
+    entities = list(islice(cycle(configs), args.entities))
+
+    print(f"get_property: {best(lambda: device.get_property('101'), 20000):.3f} us")
+    print(
+        f"has_returned_state: {best(lambda: device.has_returned_state, 20000):.3f} us"
+    )
+    print(
+        f"state writes of {args.entities} entities: "
+        f"{best(lambda: write_states(device, entities), 200):.1f} us"
+    )
+    print(
+        f"state writes of {args.entities} entities after a change: "
+        f"{best(lambda: write_states_after_change(device, entities), 200):.1f} us"
+    )
+    print(f"decode cache: {device.decode_cache.as_dict()}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,7 @@ import sys
 from common_funcs import FakeDevice
 
 from custom_components.tuya_local_lawnmowers.helpers.device_config import (
-    possible_matches,
+    scored_matches,
 )
 
 
@@ -16,17 +16,17 @@ def main() -> int:
     best = 0
     best_matches = set()
 
-    for m in possible_matches(dps):
-        if m.match_quality(dps) > best:
+    for m, quality in scored_matches(dps):
+        if quality > best:
             best_matches.clear()
-            best = m.match_quality(dps)
+            best = quality
 
-        if m.match_quality(dps) == best:
+        if quality == best:
             best_matches.add(m)
 
     for m in best_matches:
         dps_seen = set(dps.keys())
-        print(f"{m.config_type} matched {m.match_quality(dps)}%")
+        print(f"{m.config_type} matched {best}%")
         for entity in m.all_entities():
             print(f"  {entity.config_id}:")
             for dp in entity.dps():
@@ -0,0 +1,84 @@
+"""Build or check the precompiled bundle of device configs.
+
+Run from the top of the repository after changing any device config:
+
+    PYTHONPATH=. python util/config_bundle.py
+
+or, to check that the bundle matches the configs without changing it:
+
+    PYTHONPATH=. python util/config_bundle.py --check
+"""
+
+import argparse
+import json
+import sys
+from os.path import dirname, join
+
+from homeassistant.util.yaml import load_yaml
+
+import custom_components.tuya_local_lawnmowers.devices as config_dir
+from custom_components.tuya_local_lawnmowers.helpers.config_bundle import (
+    BUNDLE_FILE,
+    build_bundle,
+    check_bundle,
+)
+from custom_components.tuya_local_lawnmowers.helpers.device_config import (
+    available_configs,
+)
+
+CONFIG_DIR = dirname(config_dir.__file__)
+
+
+def read_sources():
+    sources = {}
+    for fname in available_configs():
+        with open(join(CONFIG_DIR, fname), "rb") as f:
+            sources[fname] = f.read()
+    return sources
+
+
+def check(sources):
+    try:
+        with open(join(CONFIG_DIR, BUNDLE_FILE), encoding="utf-8") as f:
+            bundle = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"{BUNDLE_FILE}: {e}")
+        return 1
+    problems = check_bundle(bundle, sources)
+    for problem in problems:
+        print(f"{BUNDLE_FILE}: {problem}")
+    if problems:
+        print("Run util/config_bundle.py to rebuild it.")
+        return 1
+    print(f"{BUNDLE_FILE} matches {len(sources)} configs")
+    return 0
+
+
+def build(sources):
+    bundle, skipped = build_bundle(
+        sources,
+        lambda fname: load_yaml(join(CONFIG_DIR, fname)),
+    )
+    for fname in skipped:
+        print(f"{fname} cannot be stored as JSON, it will be parsed at runtime")
+    with open(join(CONFIG_DIR, BUNDLE_FILE), "w", encoding="utf-8") as f:
+        json.dump(bundle, f, separators=(",", ":"))
+        f.write("\n")
+    print(f"{BUNDLE_FILE} built from {len(bundle['configs'])} configs")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="check the bundle against the configs instead of building it",
+    )
+    args = parser.parse_args()
+    sources = read_sources()
+    return check(sources) if args.check else build(sources)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,7 @@ import sys
 from common_funcs import FakeDevice
 
 from custom_components.tuya_local_lawnmowers.helpers.device_config import (
-    possible_matches,
+    scored_matches,
 )
 
 
@@ -14,9 +14,9 @@ def main() -> int:
     dps = json.loads(" ".join(sys.argv[1:]))
     device = FakeDevice(dps)
 
-    for match in possible_matches(dps):
+    for match, quality in scored_matches(dps):
         dps_seen = set(dps.keys())
-        print(f"{match.config_type} matched {match.match_quality(dps)}%")
+        print(f"{match.config_type} matched {quality}%")
         for entity in match.all_entities():
             print(f"  {entity.config_id}:")
             for dp in entity.dps():
@@ -5,7 +5,7 @@ import sys
 from common_funcs import load_config, make_sample_dps
 
 from custom_components.tuya_local_lawnmowers.helpers.device_config import (
-    possible_matches,
+    scored_matches,
 )
 
 
@@ -18,13 +18,11 @@ def main():
         sample_dps = make_sample_dps(config)
 
         # device = FakeDevice(sample_dps)
-        for m in possible_matches(sample_dps):
+        for m, quality in scored_matches(sample_dps):
             if m.config_type == config.config_type:
                 continue
-            if m.match_quality(sample_dps) > 50:
-                print(
-                    f"{m.config_type} matched {filename} {m.match_quality(sample_dps)}%"
-                )
+            if quality > 50:
+                print(f"{m.config_type} matched {filename} {quality}%")
 
 
 if __name__ == "__main__":